@@ -1,12 +1,25 @@
-# app/__init__.py
 import os
+import time
+from pathlib import Path
 from flask import Flask
 from dotenv import load_dotenv
-from flask_login import LoginManager
-from werkzeug.security import generate_password_hash
-from .db import init_db_if_needed, get_db
+from flask_login import LoginManager, login_required
+from .db import (init_db_if_needed, get_db, close_db, open_report_db, report_db_path, central_db_path,
+                 _db_path_from_url)
+
+def _fast_start() -> bool:
+    return os.getenv("FAST_START", "0").lower() in ("1", "true", "yes", "on")
 
 def create_app():
+    # Tiempos de arranque por etapa (ms); launcher.py los muestra
+    tiempos = []
+    t = time.perf_counter()
+    def marca(etapa):
+        nonlocal t
+        ahora = time.perf_counter()
+        tiempos.append((etapa, (ahora - t) * 1000.0))
+        t = ahora
+
     load_dotenv()
     BASE_DIR = os.path.abspath(os.path.dirname(__file__))  # carpeta app/
 
@@ -18,14 +31,65 @@ def create_app():
     )
     app.config["SECRET_KEY"]   = os.getenv("SECRET_KEY", "dev-key")
     app.config["DATABASE_URL"] = os.getenv("DATABASE_URL", "sqlite:///data/app.db")
+    app.config["STARTUP_TIMINGS"] = tiempos
+    marca("flask")
 
     # Rutas (Blueprint)
     from .routes import bp as routes_bp
     app.register_blueprint(routes_bp)
+    # API JSON de los tableros (/api/finanzas/*)
+    from .reports import api_blueprint
+    # (conexiones de sólo lectura: no compiten con las escrituras)
+    app.register_blueprint(api_blueprint(open_report_db, login_required, db_path=report_db_path))
+    marca("blueprints")
 
-    # DB garantizada
+    # DB garantizada (migraciones pendientes; el admin por defecto es una de ellas)
     os.makedirs("data", exist_ok=True)
     init_db_if_needed(app)
+    close_db()
+    marca("migraciones")
+
+    # Multi-tienda (TIENDAS): cada request va a la base de su tienda (ver app/stores.py)
+    from . import stores
+    if stores.activo():
+        app.before_request(stores.elegir)
+        app.context_processor(stores.contexto)
+    bases = list(dict.fromkeys([central_db_path(), *stores.configuradas().values()]))
+
+    # Backups en caliente si BACKUP_INTERVAL > 0 (ver app/backup.py)
+    from . import backup
+    # ANALYZE/optimize, checkpoints y vacuum incremental en los ratos tranquilos
+    from . import maintenance
+    # ABC/rotación de /reportes/inventario (al arrancar: con un 304 la vista no corre)
+    from . import analytics
+    for ruta in bases:
+        backup.programar(ruta)
+        maintenance.programar(ruta)
+        analytics.programar(ruta, "app")
+    app.before_request(maintenance.registrar_pedido)
+
+    # Jinja: bytecode persistente junto a data/ (todos los workers) y {% cache %}
+    from .templating import configure_jinja, precompile_in_background
+    data_dir = Path(_db_path_from_url(app.config["DATABASE_URL"])).resolve().parent
+    configure_jinja(app, data_dir / "jinja_cache")
+    # Modo arranque rápido: además precompila todas las plantillas en segundo plano
+    if _fast_start():
+        precompile_in_background(app)
+    marca("jinja")
+
+    # Estáticos con huella (/assets) y asset_url() para las plantillas
+    from .assets import init_assets
+    init_assets(app)
+
+    # Compresión gzip/br de HTML, JSON y CSV (ver app/compress.py)
+    from .compress import Compress
+    app.wsgi_app = Compress(app.wsgi_app)
+    # Límites por clase (ventas > vistas > reportes); lo más externo, para
+    # rechazar antes de hacer trabajo (ver app/admission.py)
+    from .admission import Admission
+    app.wsgi_app = Admission(app.wsgi_app)
+    from . import metrics
+    metrics.registrar_fuente("admision", app.wsgi_app.stats)
 
     # ---- Flask-Login ----
     login_manager = LoginManager()
@@ -36,7 +100,7 @@ def create_app():
     def load_user(user_id):
         # Importamos aquí para evitar ciclos y para que PyInstaller resuelva bien
         from .user import User
-        db = get_db()
+        db = get_db(central_db_path())   # los usuarios no son de una tienda
         row = db.execute(
             "SELECT id, email, nombre FROM usuarios WHERE id=?",
             (user_id,),
@@ -45,26 +109,9 @@ def create_app():
             return None
         return User(row["id"], row["email"], row["nombre"])
 
-    # Admin por defecto si no existe (admin@example.com / admin123)
-    with app.app_context():
-        db = get_db()
-        row = db.execute(
-            "SELECT id FROM usuarios WHERE email=?",
-            ("admin@example.com",)
-        ).fetchone()
-        if not row:
-            db.execute(
-                "INSERT INTO usuarios (email, nombre, pass_hash) VALUES (?,?,?)",
-                ("admin@example.com", "Admin", generate_password_hash("admin123")),
-            )
-            db.commit()
-
     # Cierra conexión al final del request
     @app.teardown_appcontext
     def close_connection(exception):
-        db = getattr(get_db, "_conn", None)
-        if db is not None:
-            db.close()
-            get_db._conn = None
+        close_db()
 
     return app
@@ -0,0 +1,177 @@
+# app/admission.py
+"""
+Control de admisión: límites de concurrencia por clase de request, para que
+un reporte pesado no deje sin hilos (ni sin SQLite) a las ventas de caja.
+
+Clases (ver clasificar()):
+    pos       escrituras (POST/PUT/DELETE): ventas, gastos, reposiciones...
+    heavy     reportes y exportaciones (/export/, /reportes/)
+    interactive  el resto de las vistas y la API de los tableros
+    stream    SSE (/finanzas/stream): no ocupa cupo, vive horas
+
+Cada clase tiene un máximo de requests en curso, una cola acotada y una
+espera máxima. Cola llena -> 429; espera agotada -> 503. Ambos con
+Retry-After. Las escrituras tienen prioridad: mientras haya una venta
+esperando no se admite ningún reporte, aunque haya cupo.
+
+Los límites son por proceso (cada worker de gunicorn tiene los suyos) y se
+configuran con ADMISSION_<CLASE>=limite,cola,espera  p.ej. ADMISSION_HEAVY=1,2,2
+"""
+import os
+import threading
+import time
+
+from . import metrics
+
+# clase -> (en curso, cola, espera máx. en segundos)
+DEFAULT_LIMITS = {
+    "pos": (8, 64, 10.0),
+    "interactive": (6, 32, 5.0),
+    "heavy": (1, 2, 2.0),
+}
+RETRY_AFTER = {"pos": 1, "interactive": 2, "heavy": 10}
+HEAVY_PREFIXES = ("/export/", "/reportes/")
+STREAM_PATHS = ("/finanzas/stream",)
+
+def clasificar(environ) -> str:
+    path = environ.get("PATH_INFO", "")
+    if path in STREAM_PATHS:
+        return "stream"
+    if environ.get("REQUEST_METHOD", "GET") not in ("GET", "HEAD", "OPTIONS"):
+        return "pos"
+    if path.startswith(HEAVY_PREFIXES):
+        return "heavy"
+    return "interactive"
+
+def _limits_from_env() -> dict:
+    limites = dict(DEFAULT_LIMITS)
+    for clase in limites:
+        valor = os.getenv(f"ADMISSION_{clase.upper()}")
+        if valor:
+            en_curso, cola, espera = valor.split(",")
+            limites[clase] = (int(en_curso), int(cola), float(espera))
+    return limites
+
+class _Clase:
+    def __init__(self, limite, cola, espera):
+        self.limite, self.cola, self.espera = limite, cola, espera
+        self.en_curso = 0
+        self.esperando = 0
+        self.rechazos = 0
+
+class Admission:
+    def __init__(self, app, limites=None, clasificador=clasificar):
+        self.app = app
+        self.clasificar = clasificador
+        self._cond = threading.Condition()
+        self.clases = {n: _Clase(*v) for n, v in (limites or _limits_from_env()).items()}
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {n: {"en_curso": c.en_curso, "esperando": c.esperando, "rechazos": c.rechazos}
+                    for n, c in self.clases.items()}
+
+    # ---------- cupos ----------
+    def _puede_entrar(self, nombre, c) -> bool:
+        if c.en_curso >= c.limite:
+            return False
+        pos = self.clases.get("pos")
+        # Prioridad de escritura: nada que no sea pos entra con ventas en cola
+        return nombre == "pos" or pos is None or pos.esperando == 0
+
+    def _adquirir(self, nombre):
+        """None si entró; si no, el código HTTP del rechazo (429/503)."""
+        c = self.clases[nombre]
+        with self._cond:
+            if self._puede_entrar(nombre, c):
+                c.en_curso += 1
+                return None
+            if c.esperando >= c.cola:
+                c.rechazos += 1
+                return 429
+            c.esperando += 1
+            limite = time.monotonic() + c.espera
+            try:
+                while not self._puede_entrar(nombre, c):
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        c.rechazos += 1
+                        return 503
+                    self._cond.wait(restante)
+                c.en_curso += 1
+                return None
+            finally:
+                c.esperando -= 1
+                # Al salir de la cola puede liberar a los de menor prioridad
+                self._cond.notify_all()
+
+    def _liberar(self, nombre):
+        with self._cond:
+            self.clases[nombre].en_curso -= 1
+            self._cond.notify_all()
+
+    # ---------- WSGI ----------
+    def __call__(self, environ, start_response):
+        nombre = self.clasificar(environ)
+        if nombre not in self.clases:
+            return self.app(environ, start_response)
+
+        codigo = self._adquirir(nombre)
+        if codigo is not None:
+            metrics.incr(f"admision_{codigo}_{nombre}")
+            return self._rechazar(codigo, nombre, start_response)
+        bufferizado = []
+        def _start(status, headers, exc_info=None):
+            bufferizado.append(any(k.lower() == "content-length" for k, _ in headers))
+            return start_response(status, headers, exc_info)
+
+        try:
+            app_iter = self.app(environ, _start)
+        except BaseException:
+            self._liberar(nombre)
+            raise
+        if bufferizado and bufferizado[-1]:
+            # Cuerpo ya armado en memoria: el trabajo terminó, enviarlo no ocupa cupo
+            self._liberar(nombre)
+            return app_iter
+        # Streaming (CSV grande): el cupo se devuelve al terminar de enviarlo
+        return _Liberar(app_iter, lambda: self._liberar(nombre))
+
+    @staticmethod
+    def _rechazar(codigo, nombre, start_response):
+        if codigo == 429:
+            status, texto = "429 Too Many Requests", "Demasiados pedidos de este tipo en curso. Reintente en unos segundos."
+        else:
+            status, texto = "503 Service Unavailable", "El servidor está ocupado. Reintente en unos segundos."
+        cuerpo = texto.encode("utf-8")
+        start_response(status, [
+            ("Content-Type", "text/plain; charset=utf-8"),
+            ("Content-Length", str(len(cuerpo))),
+            ("Retry-After", str(RETRY_AFTER.get(nombre, 5))),
+        ])
+        return [cuerpo]
+
+class _Liberar:
+    """
+    Envuelve el iterable WSGI y llama a `al_cerrar` una sola vez: al terminar
+    de enviar el cuerpo o en close() (cliente cortado, error).
+    """
+    def __init__(self, app_iter, al_cerrar):
+        self.app_iter = app_iter
+        self.al_cerrar = al_cerrar
+
+    def __iter__(self):
+        yield from self.app_iter
+        self._soltar()
+
+    def _soltar(self):
+        if self.al_cerrar:
+            self.al_cerrar, cb = None, self.al_cerrar
+            cb()
+
+    def close(self):
+        try:
+            if hasattr(self.app_iter, "close"):
+                self.app_iter.close()
+        finally:
+            self._soltar()
@@ -0,0 +1,262 @@
+# app/analytics.py
+"""
+Analítica de inventario por SKU: clase ABC, rotación, días de cobertura y
+stock muerto, calculados con pandas sobre todo el catálogo de una vez.
+
+    python -m app.analytics data/app.db            # recalcula ya (cron)
+    python -m app.analytics inventario.db --esquema inventario
+
+- SQLite suma las ventas por producto (una fila por SKU, no por venta) y
+  pandas lee ese resultado por tandas de ANALYTICS_CHUNK filas (100000).
+  pandas/numpy se importan dentro del cálculo (hilo periódico, CLI): las
+  vistas que sólo leen analitica_inventario no los cargan.
+- Todo lo demás es vectorizado (map / groupby / operaciones por columna),
+  nada por fila: 100k SKUs y millones de ventas tardan segundos.
+- El resultado va a `analitica_inventario` (ver migrations.py), que es lo
+  que lee /reportes/inventario. Un hilo lo refresca cada
+  ANALYTICS_INTERVAL segundos (3600); con varios workers refresca uno solo.
+
+Ventana de análisis: los últimos ANALYTICS_DIAS días (90). Stock muerto =
+hay stock y no se vendió nada en la ventana.
+"""
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+
+from . import archive
+from .db import connect_readonly, tune_connection
+from .periodic import Periodico
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+log = logging.getLogger("analytics")
+
+CORTE_A, CORTE_B = 0.80, 0.95   # participación acumulada en ingresos
+
+# Cada base tiene su esquema; las consultas devuelven las mismas columnas.
+# Las ventas van por producto_id; sólo las que no lo tienen (producto
+# borrado) y las reposiciones de app.db vienen por nombre.
+#   productos: producto_id, nombre, categoria, stock, unidades_por_paquete
+#   ventas:    producto_id, nombre, modo, cantidad, importe, ultima   (fecha >= :desde)
+#   entradas:  producto_id, nombre, en_ventana, fecha_costo, costo    (todo el historial)
+# `costo` es el del último movimiento con costo: en SQLite una columna suelta
+# junto a un único MAX() sale de la fila que tiene ese máximo.
+FUENTES = {
+    # inventario.db (wsgi.py): ventas simples + ventas con detalle, kardex
+    "inventario": {
+        "productos": """SELECT id AS producto_id, nombre, categoria,
+                               COALESCE(cantidad_stock, 0) AS stock, unidades_por_paquete
+                        FROM productos""",
+        "ventas": """
+            SELECT producto_id, CASE WHEN producto_id IS NULL THEN producto END AS nombre,
+                   modo, SUM(cantidad) AS cantidad, SUM(total) AS importe, MAX(fecha) AS ultima
+            FROM ventas WHERE fecha >= :desde GROUP BY producto_id, nombre, modo
+            UNION ALL
+            SELECT vi.producto_id, NULL, 'unidad', SUM(vi.unidades), SUM(vi.subtotal), MAX(e.fecha)
+            FROM venta_items vi JOIN ventas_enc e ON e.id = vi.venta_id
+            WHERE e.fecha >= :desde AND e.origen_venta_id IS NULL   -- las copias de `ventas` ya están arriba
+            GROUP BY vi.producto_id""",
+        "entradas": """
+            SELECT producto_id, NULL AS nombre,
+                   SUM(CASE WHEN fecha >= :desde THEN cantidad_unidades ELSE 0 END) AS en_ventana,
+                   MAX(CASE WHEN costo_unit IS NOT NULL THEN fecha END) AS fecha_costo,
+                   costo_unit AS costo
+            FROM stock_movimientos WHERE tipo <> 'venta' GROUP BY producto_id""",
+    },
+    # data/app.db (create_app): scripts/schema.sql
+    "app": {
+        "productos": """SELECT id AS producto_id, nombre, categoria,
+                               COALESCE(cantidad, 0) AS stock, NULL AS unidades_por_paquete
+                        FROM productos""",
+        "ventas": """SELECT producto_id, CASE WHEN producto_id IS NULL THEN producto END AS nombre,
+                            'unidad' AS modo, SUM(cantidad) AS cantidad, SUM(total) AS importe,
+                            MAX(fecha) AS ultima
+                     FROM ventas WHERE fecha >= :desde GROUP BY producto_id, nombre""",
+        "entradas": """
+            SELECT NULL AS producto_id, producto AS nombre,
+                   SUM(CASE WHEN fecha >= :desde THEN cantidad ELSE 0 END) AS en_ventana,
+                   MAX(CASE WHEN costo_unit IS NOT NULL THEN fecha END) AS fecha_costo,
+                   costo_unit AS costo
+            FROM reposiciones GROUP BY producto""",
+    },
+}
+
+COLUMNAS = ["producto_id", "nombre", "categoria", "stock", "unidades_vendidas", "ingresos",
+            "participacion", "clase_abc", "rotacion", "dias_cobertura", "valor_stock",
+            "ultima_venta", "sin_movimiento", "calculado_en"]
+
+def _chunk() -> int:
+    return int(os.getenv("ANALYTICS_CHUNK", "100000"))
+
+def dias_ventana() -> int:
+    return int(os.getenv("ANALYTICS_DIAS", "90"))
+
+# ---------- Carga por tandas ----------
+def _leer(conn, sql, params, ids: "pd.Series") -> "pd.DataFrame":
+    """Lee `sql` por tandas y resuelve producto_id (por nombre si hace falta)."""
+    import pandas as pd
+    partes = []
+    for df in pd.read_sql_query(sql, conn, params=params, chunksize=_chunk()):
+        df["producto_id"] = pd.to_numeric(df["producto_id"]).fillna(df["nombre"].map(ids))
+        partes.append(df.dropna(subset=["producto_id"]))   # nombres que ya no existen
+    return pd.concat(partes, ignore_index=True)
+
+# ---------- Cálculo ----------
+def calcular(conn, esquema: str = "app", hoy: datetime = None) -> "pd.DataFrame":
+    """Una fila por producto con todas las métricas (columnas de COLUMNAS)."""
+    import numpy as np
+    import pandas as pd
+    fuente = FUENTES[esquema]
+    hoy = hoy or datetime.now()
+    dias = dias_ventana()
+    params = {"desde": (hoy - timedelta(days=dias)).strftime("%Y-%m-%d")}
+
+    df = pd.read_sql_query(fuente["productos"], conn).set_index("producto_id")
+    ids = pd.Series(df.index, index=df["nombre"])
+    ids = ids[~ids.index.duplicated()]
+
+    ventas = _leer(conn, fuente["ventas"], params, ids)
+    # Paquetes -> unidades con el tamaño de paquete de cada producto
+    por_paquete = pd.to_numeric(ventas["producto_id"].map(df["unidades_por_paquete"])).fillna(1)
+    ventas["unidades"] = ventas["cantidad"] * np.where(ventas["modo"] == "paquete", por_paquete, 1)
+    # datetime64: el max por grupo corre en C (sobre texto pandas cae a Python)
+    ventas["ultima"] = pd.to_datetime(ventas["ultima"].str.slice(0, 10), format="%Y-%m-%d", errors="coerce")
+    ventas = ventas.groupby("producto_id").agg(
+        unidades=("unidades", "sum"), importe=("importe", "sum"), ultima=("ultima", "max"))
+
+    entradas = _leer(conn, fuente["entradas"], params, ids)
+    entradas = entradas.sort_values("fecha_costo", na_position="first").groupby("producto_id").agg(
+        en_ventana=("en_ventana", "sum"), costo=("costo", "last"))
+
+    df = df.join(ventas, how="left").join(entradas, how="left")
+
+    vendidas = pd.to_numeric(df["unidades"]).fillna(0)
+    ingresos = pd.to_numeric(df["importe"]).fillna(0)
+    stock = df["stock"].astype(float)
+
+    # ABC por ingresos: participación acumulada sobre el total de la ventana
+    orden = ingresos.sort_values(ascending=False, kind="stable")
+    total = orden.sum()
+    acumulada = (orden.cumsum() / total) if total > 0 else orden * 0 + 1
+    # Se clasifica por la acumulada *antes* de cada producto: así el que
+    # cruza el 80% todavía es A
+    previa = (acumulada - orden / total if total > 0 else acumulada).reindex(df.index)
+    clase = np.select([(ingresos > 0) & (previa < CORTE_A), (ingresos > 0) & (previa < CORTE_B)],
+                      ["A", "B"], default="C")
+
+    # Stock promedio de la ventana: stock al inicio = actual - entradas + ventas
+    inicio = (stock - pd.to_numeric(df["en_ventana"]).fillna(0) + vendidas).clip(lower=0)
+    promedio = (stock.clip(lower=0) + inicio) / 2
+    rotacion = (vendidas / promedio).where(promedio > 0)
+    diario = vendidas / dias
+    cobertura = (stock / diario).where(diario > 0)
+
+    return pd.DataFrame({
+        "producto_id": df.index.astype(int),
+        "nombre": df["nombre"],
+        "categoria": df["categoria"],
+        "stock": stock,
+        "unidades_vendidas": vendidas,
+        "ingresos": ingresos.round(2),
+        "participacion": acumulada.reindex(df.index).fillna(1.0).round(4),
+        "clase_abc": clase,
+        "rotacion": rotacion.round(2),
+        "dias_cobertura": cobertura.round(1),
+        "valor_stock": (stock.clip(lower=0) * pd.to_numeric(df["costo"]).fillna(0)).round(2),
+        "ultima_venta": df["ultima"].dt.strftime("%Y-%m-%d"),
+        "sin_movimiento": ((stock > 0) & (vendidas == 0)).astype(int),
+        "calculado_en": hoy.strftime("%Y-%m-%d %H:%M:%S"),
+    }, columns=COLUMNAS).reset_index(drop=True)
+
+def guardar(conn, df: "pd.DataFrame") -> None:
+    """Reemplaza analitica_inventario en una sola transacción."""
+    filas = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    marcas = ",".join("?" for _ in COLUMNAS)
+    with conn:
+        conn.execute("DELETE FROM analitica_inventario")
+        conn.executemany(f"INSERT INTO analitica_inventario ({','.join(COLUMNAS)}) VALUES ({marcas})", filas)
+        # Una sola subida de versión por refresco (ETag de /reportes/inventario)
+        conn.execute("UPDATE data_versions SET version = version + 1 WHERE tabla = 'analitica_inventario'")
+
+def refresh(db_path: str, esquema: str = "app") -> int:
+    """Recalcula y guarda; devuelve la cantidad de productos analizados."""
+    t0 = time.perf_counter()
+    lectura = connect_readonly(db_path)
+    try:
+        # El último costo puede estar en un año archivado
+        with archive.rango(lectura, db_path):
+            df = calcular(lectura, esquema)
+    finally:
+        lectura.close()
+    escritura = tune_connection(sqlite3.connect(db_path), "tareas")
+    try:
+        guardar(escritura, df)
+    finally:
+        escritura.close()
+    log.info("Analítica de inventario: %d productos en %.0f ms", len(df), (time.perf_counter() - t0) * 1000)
+    return len(df)
+
+# ---------- Refresco programado ----------
+def vigente(db_path: str, intervalo: float) -> bool:
+    conn = connect_readonly(db_path)
+    try:
+        ultimo = conn.execute("SELECT MAX(calculado_en) FROM analitica_inventario").fetchone()[0]
+    finally:
+        conn.close()
+    if not ultimo:
+        return False
+    edad = datetime.now() - datetime.strptime(ultimo, "%Y-%m-%d %H:%M:%S")
+    return edad.total_seconds() < intervalo
+
+_programadores = {}
+
+def programar(db_path: str, esquema: str = "app") -> None:
+    """Arranca (una vez por proceso y base) el refresco periódico; ANALYTICS_INTERVAL=0 lo apaga."""
+    intervalo = float(os.getenv("ANALYTICS_INTERVAL", "3600"))
+    if intervalo <= 0:
+        return
+    prog = _programadores.get(db_path)
+    if prog is None:
+        tarea = lambda: not vigente(db_path, intervalo) and refresh(db_path, esquema)
+        prog = _programadores.setdefault(
+            db_path, Periodico("analytics", tarea, intervalo, db_path + ".analytics.lock"))
+    prog.start()
+
+# ---------- Lectura para el reporte ----------
+def resumen_clases(conn) -> dict:
+    """{clase: (productos, ingresos, valor_stock)} y cuántos hay sin movimiento."""
+    clases = {c: (n, ing or 0, val or 0) for c, n, ing, val in conn.execute(
+        """SELECT clase_abc, COUNT(*), SUM(ingresos), SUM(valor_stock)
+           FROM analitica_inventario GROUP BY clase_abc""")}
+    muertos, valor_muerto, calculado = conn.execute(
+        """SELECT COALESCE(SUM(sin_movimiento),0),
+                  COALESCE(SUM(CASE WHEN sin_movimiento THEN valor_stock END),0),
+                  MAX(calculado_en)
+           FROM analitica_inventario""").fetchone()
+    return {"clases": clases, "muertos": muertos, "valor_muerto": valor_muerto, "calculado_en": calculado}
+
+def filas(conn, clase: str = "", solo_muertos: bool = False, limite: int = 500):
+    where, params = [], []
+    if clase in ("A", "B", "C"):
+        where.append("clase_abc = ?"); params.append(clase)
+    if solo_muertos:
+        where.append("sin_movimiento = 1")
+    sql = "SELECT * FROM analitica_inventario"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    orden = "valor_stock DESC" if solo_muertos else "ingresos DESC"
+    sql += f" ORDER BY {orden}, nombre LIMIT ?"
+    return conn.execute(sql, (*params, limite)).fetchall()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Recalcula analitica_inventario")
+    ap.add_argument("db")
+    ap.add_argument("--esquema", choices=sorted(FUENTES), default="app")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(f"{refresh(args.db, args.esquema)} productos analizados")
@@ -0,0 +1,252 @@
+# app/archive.py
+"""
+Archivo por año: los años cerrados se mudan a un SQLite aparte y la base
+caliente queda chica (su working set entra en la caché de páginas).
+
+    python -m app.archive inventario.db 2022        # archiva ese año
+    python -m app.archive inventario.db --hasta 2023
+    python -m app.archive inventario.db --listar     # resúmenes por año y tabla
+
+Archivos: ARCHIVE_DIR (por defecto archivo/ junto a la base), uno por año:
+archivo/inventario-2022.db. Se mudan ventas, gastos, stock_movimientos y, en
+inventario.db, ventas_enc con su venta_items. Nunca el año en curso ni los
+ARCHIVE_KEEP_ANIOS (1) anteriores: las ventanas de analytics/forecast
+(90-120 días) quedan siempre en la base caliente.
+
+La mudanza es por mes y en dos pasos, cada uno atómico en su archivo:
+  1. con el lock de escritura de la base caliente tomado, se copian las
+     filas del mes al archivo marcadas con un `_lote` y se confirma;
+  2. en la base caliente se borran esas filas y se registra el lote en
+     archivo_lotes (con su resumen en archivo_resumen), en una transacción.
+Si se corta entre 1 y 2, el lote no está registrado: las vistas lo ignoran y
+la próxima corrida lo borra del archivo antes de volver a copiar.
+
+Lectura: los reportes envuelven sus consultas en
+
+    with archive.rango(conn, DB_PATH, desde, hasta):
+        ...  # `ventas`, `gastos`... incluyen los años archivados del rango
+
+que sólo si el rango toca años archivados hace ATTACH (mode=ro) y crea
+vistas TEMP con el mismo nombre que las tablas: main UNION ALL archivos.
+SQLite empuja el filtro de fecha a cada rama, así que cada archivo usa su
+índice por fecha.
+"""
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+
+from .db import tune_connection
+
+log = logging.getLogger("archive")
+
+# tabla -> (columna de fecha, medida que se resume)
+TABLAS = {
+    "ventas": ("fecha", "total"),
+    "gastos": ("fecha", "monto"),
+    "stock_movimientos": ("fecha", "cantidad_unidades"),
+    "ventas_enc": ("fecha", "total"),
+}
+# Tablas sin fecha que se mudan con su encabezado: tabla -> (encabezado, clave, medida)
+DEPENDIENTES = {"venta_items": ("ventas_enc", "venta_id", "subtotal")}
+
+def directorio(db_path: str) -> Path:
+    return Path(os.getenv("ARCHIVE_DIR") or Path(db_path).resolve().parent / "archivo")
+
+def nombre_archivo(db_path: str, anio: int) -> str:
+    return f"{Path(db_path).stem}-{int(anio)}.db"
+
+def _columnas(conn, tabla, esquema="main"):
+    return [r[1] for r in conn.execute(f"PRAGMA {esquema}.table_info({tabla})")]
+
+def _tablas(conn, esquema="main"):
+    presentes = {r[0] for r in conn.execute(f"SELECT name FROM {esquema}.sqlite_master WHERE type='table'")}
+    return [t for t in (*DEPENDIENTES, *TABLAS) if t in presentes]   # dependientes primero
+
+# ---------- Lectura: vistas sobre los años archivados ----------
+def _anios(conn, desde, hasta):
+    """Años archivados que toca [desde, hasta] (None = sin límite)."""
+    try:
+        rows = conn.execute("SELECT anio, archivo FROM archivos ORDER BY anio").fetchall()
+    except sqlite3.OperationalError:   # base sin la migración
+        return []
+    d = int(str(desde)[:4]) if desde else None
+    h = int(str(hasta)[:4]) if hasta else None
+    return [(a, f) for a, f in rows if (d is None or a >= d) and (h is None or a <= h)]
+
+@contextmanager
+def rango(conn, db_path: str, desde=None, hasta=None):
+    """
+    Dentro del bloque, las tablas archivadas incluyen los años de [desde, hasta].
+    `conn` debe estar abierta con uri=True (connect_readonly): los archivos se
+    adjuntan como file:...?mode=ro.
+    """
+    anios = _anios(conn, desde, hasta)
+    if not anios:
+        yield conn
+        return
+    carpeta = directorio(db_path)
+    adjuntos = []
+    # query_only también bloquea el esquema TEMP; los archivos van mode=ro igual
+    solo_lectura = conn.execute("PRAGMA query_only").fetchone()[0]
+    conn.execute("PRAGMA query_only=0")
+    vistas = []
+    try:
+        for anio, archivo in anios:
+            ruta = carpeta / archivo
+            if not ruta.exists():
+                log.warning("Falta el archivo del año %s: %s", anio, ruta)
+                continue
+            alias = f"arch_{anio}"
+            conn.execute("ATTACH DATABASE ? AS " + alias, (f"file:{ruta.as_posix()}?mode=ro",))
+            adjuntos.append((anio, alias))
+        for tabla in _tablas(conn):
+            cols = _columnas(conn, tabla)
+            ramas = [f"SELECT {', '.join(cols)} FROM main.{tabla}"]
+            for anio, alias in adjuntos:
+                propias = set(_columnas(conn, tabla, alias))
+                if not propias:
+                    continue
+                lista = ", ".join(c if c in propias else f"NULL AS {c}" for c in cols)
+                ramas.append(f"""SELECT {lista} FROM {alias}.{tabla}
+                    WHERE _lote IN (SELECT lote FROM main.archivo_lotes WHERE anio = {int(anio)})""")
+            if len(ramas) > 1:
+                conn.execute(f"CREATE TEMP VIEW {tabla} AS " + " UNION ALL ".join(ramas))
+                vistas.append(tabla)
+        if solo_lectura:
+            conn.execute("PRAGMA query_only=1")
+        yield conn
+    finally:
+        conn.execute("PRAGMA query_only=0")
+        for tabla in vistas:
+            conn.execute(f"DROP VIEW IF EXISTS temp.{tabla}")
+        for _, alias in adjuntos:
+            conn.execute(f"DETACH DATABASE {alias}")
+        if solo_lectura:
+            conn.execute("PRAGMA query_only=1")
+
+# ---------- Escritura: mudanza de un año ----------
+def _preparar_archivo(arch, hot_alias="hot"):
+    """Tablas del archivo con las columnas actuales de la base caliente + _lote."""
+    for tabla in _tablas(arch, hot_alias):
+        propias = set(_columnas(arch, tabla))
+        nueva = not propias
+        if nueva:
+            arch.execute(f"CREATE TABLE {tabla} (_lote INTEGER NOT NULL)")
+        for col in _columnas(arch, tabla, hot_alias):
+            if col not in propias:
+                arch.execute(f"ALTER TABLE {tabla} ADD COLUMN {col}")
+        if nueva:
+            clave = DEPENDIENTES[tabla][1] if tabla in DEPENDIENTES else TABLAS[tabla][0]
+            arch.execute(f"CREATE INDEX idx_{tabla}_{clave} ON {tabla}({clave})")
+            arch.execute(f"CREATE INDEX idx_{tabla}_lote ON {tabla}(_lote)")
+
+def _filtro(tabla):
+    """WHERE que elige las filas de un mes ([?, ?)) en la base caliente."""
+    if tabla in DEPENDIENTES:
+        enc, clave, _ = DEPENDIENTES[tabla]
+        return f"{clave} IN (SELECT id FROM {{db}}.{enc} WHERE fecha >= ? AND fecha < ?)"
+    return f"{TABLAS[tabla][0]} >= ? AND {TABLAS[tabla][0]} < ?"
+
+def _meses(anio):
+    for m in range(1, 13):
+        sig = f"{anio + 1}-01" if m == 12 else f"{anio}-{m + 1:02d}"
+        yield f"{anio}-{m:02d}", sig
+
+def archivar(db_path: str, anio: int, hoy: date = None) -> dict:
+    """Muda el año `anio` a su archivo; devuelve {tabla: filas mudadas}."""
+    hoy = hoy or date.today()
+    conservar = int(os.getenv("ARCHIVE_KEEP_ANIOS", "1"))
+    if anio >= hoy.year - conservar:
+        raise ValueError(f"{anio} no se archiva: se conservan el año en curso y {conservar} más")
+    carpeta = directorio(db_path)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    archivo = nombre_archivo(db_path, anio)
+
+    hot = tune_connection(sqlite3.connect(db_path), "tareas")
+    arch = sqlite3.connect(str(carpeta / archivo), uri=True)
+    arch.execute(f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000'))}")
+    arch.execute("ATTACH DATABASE ? AS hot", (f"file:{Path(db_path).as_posix()}?mode=ro",))
+    mudadas = {}
+    try:
+        with arch:
+            _preparar_archivo(arch)
+            tablas = _tablas(arch, "hot")
+            # Lotes copiados que la base caliente no llegó a registrar
+            for tabla in tablas:
+                arch.execute(f"DELETE FROM {tabla} WHERE _lote NOT IN "
+                             f"(SELECT lote FROM hot.archivo_lotes WHERE anio = ?)", (anio,))
+        with hot:
+            hot.execute("INSERT OR IGNORE INTO archivos (anio, archivo, creado_en) VALUES (?, ?, ?)",
+                        (anio, archivo, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+        for mes, sig in _meses(anio):
+            hot.execute("BEGIN IMMEDIATE")   # congela el mes hasta borrarlo
+            try:
+                filas = {t: hot.execute(f"SELECT COUNT(*) FROM {t} WHERE {_filtro(t).format(db='main')}",
+                                        (mes, sig)).fetchone()[0] for t in tablas}
+                if not any(filas.values()):
+                    hot.rollback()
+                    continue
+                lote = hot.execute("SELECT COALESCE(MAX(lote), 0) + 1 FROM archivo_lotes").fetchone()[0]
+                # 1) copia al archivo (se confirma primero)
+                with arch:
+                    for tabla in (t for t in tablas if filas[t]):
+                        cols = ", ".join(_columnas(arch, tabla, "hot"))
+                        arch.execute(f"""INSERT INTO {tabla} ({cols}, _lote)
+                                         SELECT {cols}, ? FROM hot.{tabla}
+                                         WHERE {_filtro(tabla).format(db='hot')}""", (lote, mes, sig))
+                # 2) borra de la base caliente y registra el lote
+                hot.execute("INSERT INTO archivo_lotes (lote, anio, mes, archivado_en) VALUES (?, ?, ?, ?)",
+                            (lote, anio, mes, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+                for tabla in (t for t in tablas if filas[t]):
+                    medida = DEPENDIENTES[tabla][2] if tabla in DEPENDIENTES else TABLAS[tabla][1]
+                    where = _filtro(tabla).format(db="main")
+                    hot.execute(f"""INSERT INTO archivo_resumen (lote, tabla, filas, total)
+                                    SELECT ?, ?, COUNT(*), COALESCE(SUM({medida}), 0) FROM {tabla}
+                                    WHERE {where}""", (lote, tabla, mes, sig))
+                    hot.execute(f"DELETE FROM {tabla} WHERE {where}", (mes, sig))
+                    mudadas[tabla] = mudadas.get(tabla, 0) + filas[tabla]
+                hot.commit()
+            except Exception:
+                hot.rollback()
+                raise
+            log.info("Archivado %s (lote %d): %s", mes, lote, filas)
+    finally:
+        arch.close()
+        hot.close()
+    return mudadas
+
+def resumen(conn) -> list:
+    """[(anio, tabla, filas, total)] de lo archivado, sin abrir los archivos."""
+    return conn.execute(
+        """SELECT l.anio, r.tabla, SUM(r.filas), ROUND(SUM(r.total), 2)
+           FROM archivo_resumen r JOIN archivo_lotes l ON l.lote = r.lote
+           GROUP BY l.anio, r.tabla ORDER BY l.anio, r.tabla""").fetchall()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Archivo por año de ventas, gastos y kardex")
+    ap.add_argument("db")
+    ap.add_argument("anio", type=int, nargs="?")
+    ap.add_argument("--hasta", type=int, help="archiva todos los años hasta éste inclusive")
+    ap.add_argument("--listar", action="store_true")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.listar:
+        conn = sqlite3.connect(args.db)
+        for fila in resumen(conn):
+            print(*fila, sep="\t")
+        conn.close()
+    elif args.hasta:
+        conn = sqlite3.connect(args.db)
+        primero = conn.execute("SELECT MIN(substr(fecha, 1, 4)) FROM ventas").fetchone()[0]
+        conn.close()
+        for anio in range(int(primero or args.hasta), args.hasta + 1):
+            print(anio, archivar(args.db, anio))
+    elif args.anio:
+        print(archivar(args.db, args.anio))
+    else:
+        ap.error("indicá un año, --hasta o --listar")
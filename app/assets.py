@@ -0,0 +1,91 @@
+# app/assets.py
+"""
+Estáticos propios con huella de contenido (fingerprint) y caché larga.
+
+scripts/build_assets.py deja en app/static/dist/:
+  - archivos con el hash en el nombre (p.ej. tailwind.3f2a9c1e.css)
+  - variantes precomprimidas .gz (y .br si está instalado brotli)
+  - manifest.json: nombre lógico -> nombre con huella
+
+En plantillas:  {{ asset_url('chart.umd.min.js') }}
+Si aún no se corrió el build (desarrollo), asset_url() cae al CDN original
+para no dejar la página rota; en producción no hay pedidos externos.
+"""
+import json
+import mimetypes
+import os
+
+from flask import Blueprint, request, send_from_directory, url_for
+
+STATIC_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST = os.path.join(DIST_DIR, "manifest.json")
+
+ONE_YEAR = 365 * 24 * 3600
+
+# Sólo para desarrollo sin build
+CDN_FALLBACK = {
+    "flowbite.min.js": "https://cdn.jsdelivr.net/npm/flowbite@2.5.1/dist/flowbite.min.js",
+    "chart.umd.min.js": "https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js",
+    "inter.css": "https://rsms.me/inter/inter.css",
+    "login-bg.jpg": "https://images.pexels.com/photos/2523959/pexels-photo-2523959.jpeg",
+}
+
+bp = Blueprint("assets", __name__)
+
+_manifest_cache = {"mtime": None, "data": {}}
+
+def _manifest() -> dict:
+    try:
+        mtime = os.path.getmtime(MANIFEST)
+    except OSError:
+        return {}
+    if _manifest_cache["mtime"] != mtime:
+        with open(MANIFEST, encoding="utf-8") as f:
+            _manifest_cache["data"] = json.load(f)
+        _manifest_cache["mtime"] = mtime
+    return _manifest_cache["data"]
+
+def asset_built(nombre: str) -> bool:
+    return nombre in _manifest()
+
+def asset_url(nombre: str) -> str:
+    fingerprinted = _manifest().get(nombre)
+    if fingerprinted:
+        return url_for("assets.file", filename=f"dist/{fingerprinted}")
+    if nombre in CDN_FALLBACK:
+        return CDN_FALLBACK[nombre]
+    return url_for("assets.file", filename=nombre)
+
+def _accepts(encoding: str) -> bool:
+    return encoding in (request.headers.get("Accept-Encoding") or "").lower()
+
+@bp.route("/assets/<path:filename>", endpoint="file")
+def serve(filename):
+    inmutable = filename.startswith("dist/")
+    enviar, encoding = filename, None
+    if inmutable:
+        # Variante precomprimida si el cliente la acepta (br > gzip)
+        for enc, ext in (("br", ".br"), ("gzip", ".gz")):
+            if _accepts(enc) and os.path.isfile(os.path.join(STATIC_DIR, filename + ext)):
+                enviar, encoding = filename + ext, enc
+                break
+
+    resp = send_from_directory(STATIC_DIR, enviar, max_age=ONE_YEAR if inmutable else 300)
+    if encoding:
+        # send_from_directory infiere el tipo por la extensión .gz/.br: corregirlo
+        resp.mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        resp.headers["Content-Encoding"] = encoding
+    if inmutable:
+        resp.headers["Cache-Control"] = f"public, max-age={ONE_YEAR}, immutable"
+        resp.vary.add("Accept-Encoding")
+    return resp
+
+def init_assets(app) -> None:
+    """
+    Registra /assets y los helpers de plantilla. Se usa en create_app() y wsgi.py,
+    siempre DESPUÉS de configure_jinja(): tocar app.jinja_env lo crea y las
+    opciones de Jinja ya no se podrían cambiar.
+    """
+    app.register_blueprint(bp)
+    app.jinja_env.globals.update(asset_url=asset_url, asset_built=asset_built)
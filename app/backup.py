@@ -0,0 +1,181 @@
+# app/backup.py
+"""
+Backups en caliente con la API de backup de SQLite, sin parar la caja.
+
+    python -m app.backup inventario.db                       # backup ya
+    python -m app.backup inventario.db --listar
+    python -m app.backup inventario.db --restaurar backups/inventario-20240601-120000.db.gz
+
+Con BACKUP_INTERVAL (segundos; 0 = apagado) cada worker arranca un hilo
+periódico y uno solo a la vez hace el backup (flock, ver app/periodic.py).
+
+- Copia por tandas de BACKUP_PAGINAS páginas (256) y duerme entre tandas para
+  no pasar de BACKUP_MB_S (20 MB/s): la E/S de las ventas no se nota.
+- La fuente mantiene abierta una transacción de lectura durante toda la
+  copia: en WAL es una foto fija, y las escrituras de la caja no obligan a
+  la API de backup a empezar de nuevo (sin eso, con ventas entrando, un
+  backup lento no termina nunca). Mientras dura, el WAL no se recorta.
+- La copia se verifica con PRAGMA integrity_check, se comprime con gzip
+  (<base>-AAAAMMDD-HHMMSS.db.gz en BACKUP_DIR, por defecto backups/ junto a
+  la base) y se conservan los últimos BACKUP_CONSERVAR (7).
+
+Restaurar también usa la API de backup sobre la base viva (no reemplaza el
+archivo, que rompería el WAL de los procesos abiertos); antes deja un backup
+de lo que había.
+"""
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+
+from . import metrics
+from .db import tune_connection
+from .periodic import Periodico
+
+log = logging.getLogger("backup")
+
+def directorio(db_path: str) -> Path:
+    return Path(os.getenv("BACKUP_DIR") or Path(db_path).resolve().parent / "backups")
+
+def backups(db_path: str) -> list:
+    """Backups de `db_path`, del más viejo al más nuevo."""
+    carpeta = directorio(db_path)
+    if not carpeta.exists():
+        return []
+    # Por fecha de escritura: el nombre no ordena bien dos backups del mismo segundo
+    return sorted(carpeta.glob(f"{Path(db_path).stem}-*.db.gz"), key=lambda r: (r.stat().st_mtime_ns, r.name))
+
+# ---------- Copia ----------
+def _copiar(origen: sqlite3.Connection, destino: sqlite3.Connection) -> int:
+    """backup() por tandas con tope de MB/s; devuelve las páginas copiadas."""
+    paginas = int(os.getenv("BACKUP_PAGINAS", "256"))
+    tope = float(os.getenv("BACKUP_MB_S", "20")) * 1024 * 1024
+    tam_pagina = origen.execute("PRAGMA page_size").fetchone()[0]
+    t0 = time.monotonic()
+    copiadas = [0]
+
+    def avance(_estado, restantes, total):
+        copiadas[0] = total - restantes
+        if tope > 0:
+            # backup(sleep=) sólo duerme si la base está ocupada: el ritmo va acá
+            atraso = copiadas[0] * tam_pagina / tope - (time.monotonic() - t0)
+            if atraso > 0:
+                time.sleep(atraso)
+
+    origen.backup(destino, pages=paginas, progress=avance)
+    return copiadas[0]
+
+def verificar(ruta) -> None:
+    conn = sqlite3.connect(ruta)
+    try:
+        resultado = [r[0] for r in conn.execute("PRAGMA integrity_check")]
+    finally:
+        conn.close()
+    if resultado != ["ok"]:
+        raise sqlite3.DatabaseError(f"backup corrupto {ruta}: {'; '.join(resultado[:5])}")
+
+def hacer_backup(db_path: str, sufijo: str = "") -> Path:
+    """Backup verificado y comprimido de `db_path`; devuelve la ruta del .db.gz."""
+    t0 = time.perf_counter()
+    carpeta = directorio(db_path)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    nombre = f"{Path(db_path).stem}-{datetime.now():%Y%m%d-%H%M%S}{sufijo}.db"
+    tmp = carpeta / (nombre + ".tmp")
+
+    origen = sqlite3.connect(f"file:{Path(db_path).as_posix()}?mode=ro", uri=True)
+    destino = sqlite3.connect(tmp)
+    try:
+        origen.execute("BEGIN")
+        origen.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()   # fija la foto
+        paginas = _copiar(origen, destino)
+        origen.rollback()
+        # Sin WAL: el backup es un único archivo autocontenido
+        destino.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        destino.close()
+        origen.close()
+    try:
+        verificar(tmp)
+        final = carpeta / (nombre + ".gz")
+        with open(tmp, "rb") as f, gzip.open(final.with_suffix(".gz.tmp"), "wb",
+                                            compresslevel=int(os.getenv("BACKUP_GZIP", "6"))) as gz:
+            shutil.copyfileobj(f, gz, 1024 * 1024)
+        os.replace(final.with_suffix(".gz.tmp"), final)
+    finally:
+        tmp.unlink(missing_ok=True)
+    rotar(db_path)
+    ms = (time.perf_counter() - t0) * 1000
+    metrics.evento("backup", archivo=final.name, paginas=paginas, ms=round(ms))
+    log.info("Backup %s: %d páginas en %.0f ms", final.name, paginas, ms)
+    return final
+
+def rotar(db_path: str) -> list:
+    """Borra los backups que exceden BACKUP_CONSERVAR; devuelve los borrados."""
+    conservar = max(int(os.getenv("BACKUP_CONSERVAR", "7")), 1)
+    viejos = backups(db_path)[:-conservar]
+    for ruta in viejos:
+        ruta.unlink(missing_ok=True)
+    return viejos
+
+# ---------- Restauración ----------
+def restaurar(origen_gz, db_path: str, copia_previa: bool = True) -> None:
+    """Vuelca `origen_gz` sobre la base viva con la API de backup."""
+    origen_gz = Path(origen_gz)
+    tmp = origen_gz.with_name(origen_gz.name + ".restaurar.tmp")
+    with gzip.open(origen_gz, "rb") as gz, open(tmp, "wb") as f:
+        shutil.copyfileobj(gz, f, 1024 * 1024)
+    try:
+        verificar(tmp)
+        if copia_previa and Path(db_path).exists():
+            hacer_backup(db_path, sufijo="-previo")
+        fuente = sqlite3.connect(tmp)
+        viva = tune_connection(sqlite3.connect(db_path))
+        try:
+            # De una vez: los demás procesos esperan (busy_timeout) y ven la base restaurada
+            fuente.backup(viva)
+        finally:
+            viva.close()
+            fuente.close()
+    finally:
+        tmp.unlink(missing_ok=True)
+    log.info("Base %s restaurada desde %s", db_path, origen_gz.name)
+
+# ---------- Programación ----------
+def vigente(db_path: str, intervalo: float) -> bool:
+    todos = backups(db_path)
+    return bool(todos) and time.time() - todos[-1].stat().st_mtime < intervalo
+
+_programadores = {}
+
+def programar(db_path: str) -> None:
+    """Backup cada BACKUP_INTERVAL segundos; no hace nada si es 0 (por defecto)."""
+    intervalo = float(os.getenv("BACKUP_INTERVAL", "0"))
+    if intervalo <= 0:
+        return
+    prog = _programadores.get(db_path)
+    if prog is None:
+        tarea = lambda: not vigente(db_path, intervalo) and bool(hacer_backup(db_path))
+        prog = _programadores.setdefault(
+            db_path, Periodico("backup", tarea, intervalo, db_path + ".backup.lock"))
+    prog.start()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Backups en caliente de la base SQLite")
+    ap.add_argument("db")
+    ap.add_argument("--listar", action="store_true")
+    ap.add_argument("--restaurar", metavar="BACKUP_GZ")
+    ap.add_argument("--sin-copia-previa", action="store_true")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.listar:
+        for ruta in backups(args.db):
+            print(ruta, f"{ruta.stat().st_size / 1048576:.1f} MB", sep="\t")
+    elif args.restaurar:
+        restaurar(args.restaurar, args.db, copia_previa=not args.sin_copia_previa)
+    else:
+        print(hacer_backup(args.db))
@@ -0,0 +1,145 @@
+# app/budget.py
+"""
+Presupuesto de tiempo por request para las consultas SQLite.
+
+    @app.route('/reportes/reposiciones')
+    @login_required
+    @query_budget('heavy')
+    def reportes_reposiciones(): ...
+
+Mientras corre la vista, toda conexión que pase por attach() (get_db y
+get_conn lo llaman) tiene un progress handler que aborta la consulta en
+curso si:
+  - se acabó el presupuesto de la vista, o
+  - el cliente cerró la conexión (se mira el socket como mucho cada 0,5 s).
+
+Presupuesto agotado -> 503 "acote el rango" (JSON en /api). Cliente
+desconectado -> 499 sin cuerpo. Los dos quedan en app/metrics.py.
+
+Presupuestos (segundos) por clase, configurables: QUERY_BUDGET_HEAVY,
+QUERY_BUDGET_INTERACTIVE.
+
+Las consultas que corren fuera del hilo del request (pool de procesos de
+report_engine, hilos de stores) reciben limite_reloj(): su propio progress
+handler aborta al pasar esa hora. Un 'interrupted' que llega después del
+límite cuenta como presupuesto agotado aunque no lo haya cortado el handler
+de este hilo.
+"""
+import logging
+import os
+import select
+import socket
+import sqlite3
+import time
+from functools import wraps
+
+from flask import g, has_request_context, jsonify, make_response, request
+
+from . import metrics
+
+log = logging.getLogger("budget")
+
+DEFAULT_BUDGETS = {"interactive": 5.0, "heavy": 20.0}
+PROGRESS_STEPS = 10000      # instrucciones de la VM de SQLite entre chequeos
+SOCKET_CHECK_EVERY = 0.5    # segundos
+
+def budget_seconds(clase: str) -> float:
+    return float(os.getenv(f"QUERY_BUDGET_{clase.upper()}", DEFAULT_BUDGETS.get(clase, 5.0)))
+
+def _client_socket(environ):
+    # Werkzeug (dev y fallback) y gunicorn exponen el socket del cliente
+    return environ.get("werkzeug.socket") or environ.get("gunicorn.socket")
+
+def _client_gone(sock) -> bool:
+    try:
+        legible, _, _ = select.select([sock], [], [], 0)
+        if not legible:
+            return False
+        # Legible sin datos = el cliente cerró (con keep-alive puede haber otro request)
+        return sock.recv(1, socket.MSG_PEEK) == b""
+    except (OSError, ValueError):
+        return True
+
+class Presupuesto:
+    def __init__(self, segundos, sock=None):
+        self.segundos = segundos
+        self.limite = time.monotonic() + segundos
+        self.sock = sock
+        self.motivo = None
+        self.conexiones = []
+        self._prox_socket = 0.0
+
+    def handler(self) -> int:
+        """Progress handler de SQLite: distinto de 0 aborta la consulta."""
+        ahora = time.monotonic()
+        if ahora > self.limite:
+            self.motivo = "presupuesto"
+            return 1
+        if self.sock is not None and ahora >= self._prox_socket:
+            self._prox_socket = ahora + SOCKET_CHECK_EVERY
+            if _client_gone(self.sock):
+                self.motivo = "cliente"
+                return 1
+        return 0
+
+    def liberar(self) -> None:
+        for conn in self.conexiones:
+            try:
+                conn.set_progress_handler(None, 0)
+            except sqlite3.ProgrammingError:   # ya cerrada
+                pass
+        self.conexiones.clear()
+
+def limite_reloj():
+    """Fin del presupuesto del request actual en time.time() (vale en otros procesos), o None."""
+    p = g.get("_presupuesto") if has_request_context() else None
+    return None if p is None else time.time() + max(p.limite - time.monotonic(), 0.0)
+
+def attach(conn):
+    """Aplica el presupuesto del request actual (si lo hay) a `conn`."""
+    p = g.get("_presupuesto") if has_request_context() else None
+    if p is not None and not any(c is conn for c in p.conexiones):
+        conn.set_progress_handler(p.handler, PROGRESS_STEPS)
+        p.conexiones.append(conn)
+    return conn
+
+def _respuesta_excedida(p):
+    mensaje = (f"La consulta superó el tiempo permitido ({p.segundos:.0f} s). "
+               "Acote el rango de fechas o los filtros e intente de nuevo.")
+    if request.path.startswith("/api/"):
+        resp = jsonify(error="presupuesto_excedido", mensaje=mensaje)
+    else:
+        resp = make_response(mensaje)
+        resp.mimetype = "text/plain"
+    resp.status_code = 503
+    return resp
+
+def query_budget(clase: str = "interactive"):
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            p = Presupuesto(budget_seconds(clase), _client_socket(request.environ))
+            g._presupuesto = p
+            t0 = time.monotonic()
+            try:
+                return view(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if "interrupted" not in str(e):
+                    raise
+                if p.motivo is None:
+                    if time.monotonic() < p.limite:
+                        raise
+                    p.motivo = "presupuesto"   # lo cortó un proceso/hilo del reporte
+                datos = {"endpoint": request.endpoint, "path": request.full_path,
+                         "segundos": round(time.monotonic() - t0, 2)}
+                if p.motivo == "cliente":
+                    metrics.evento("cliente_desconectado", **datos)
+                    return make_response("", 499)
+                metrics.evento("presupuesto_excedido", presupuesto=p.segundos, **datos)
+                log.warning("Presupuesto de %ss excedido en %s", p.segundos, request.full_path)
+                return _respuesta_excedida(p)
+            finally:
+                p.liberar()
+                g._presupuesto = None
+        return wrapped
+    return decorator
@@ -0,0 +1,180 @@
+# app/compress.py
+"""
+Middleware WSGI de compresión (gzip, y brotli si está instalado).
+
+- Negocia por Accept-Encoding con sus q (br > gzip a igual q; q=0 es "no").
+- Sólo comprime tipos de texto (lista permitida) y cuerpos >= COMPRESS_MIN_SIZE.
+- Respuestas con Content-Length conocido se comprimen de una vez; las que
+  vienen en streaming (sin Content-Length) se comprimen por trozos con flush,
+  así el navegador recibe cada trozo sin esperar al final.
+- Si la respuesta trae ETag, el cuerpo comprimido se guarda en un LRU por
+  (ruta, ETag, encoding): un refresh sin cambios no vuelve a comprimir.
+- No toca respuestas ya codificadas (p.ej. /assets precomprimidos), HEAD,
+  pedidos con Range ni 'Cache-Control: no-transform'.
+
+Uso:  app.wsgi_app = Compress(app.wsgi_app)
+"""
+import gzip
+import os
+import zlib
+from threading import Lock
+
+from jinja2.utils import LRUCache
+
+try:
+    import brotli
+except ImportError:  # opcional
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/css", "text/csv", "text/plain", "text/javascript",
+    "application/javascript", "application/json", "image/svg+xml",
+}
+
+class Compress:
+    def __init__(self, app, min_size=None, level=None, cache_size=64):
+        self.app = app
+        self.min_size = int(min_size if min_size is not None else os.getenv("COMPRESS_MIN_SIZE", "1024"))
+        self.level = int(level if level is not None else os.getenv("COMPRESS_LEVEL", "6"))
+        self.cache = LRUCache(cache_size)
+        self._lock = Lock()
+
+    # ---------- negociación ----------
+    @staticmethod
+    def _calidades(accept):
+        """'gzip;q=0.5, br' -> {'gzip': 0.5, 'br': 1.0}; un q ilegible cuenta como 0."""
+        q = {}
+        for parte in accept.lower().split(","):
+            token, *params = [p.strip() for p in parte.split(";")]
+            if not token:
+                continue
+            valor = 1.0
+            for p in params:
+                nombre, _, v = p.partition("=")
+                if nombre.strip() == "q":
+                    try:
+                        valor = float(v)
+                    except ValueError:
+                        valor = 0.0
+            q[token] = valor
+        return q
+
+    def _encoding(self, environ):
+        if environ.get("REQUEST_METHOD") == "HEAD" or environ.get("HTTP_RANGE"):
+            return None
+        q = self._calidades(environ.get("HTTP_ACCEPT_ENCODING") or "")
+        comodin = q.get("*", 0.0)
+        opciones = ["br", "gzip"] if brotli is not None else ["gzip"]
+        # Lo nombrado explícitamente manda sobre "*"; a igual q gana el primero (br)
+        mejor = max(opciones, key=lambda e: q.get(e, comodin))
+        return mejor if q.get(mejor, comodin) > 0 else None
+
+    def _eligible(self, status, headers):
+        if not status.startswith("200"):
+            return False
+        h = {k.lower(): v for k, v in headers}
+        if "content-encoding" in h or "no-transform" in h.get("cache-control", ""):
+            return False
+        ctype = h.get("content-type", "").split(";")[0].strip().lower()
+        if ctype not in COMPRESSIBLE_TYPES:
+            return False
+        length = h.get("content-length")
+        return length is None or int(length) >= self.min_size
+
+    # ---------- compresores ----------
+    def _compress_all(self, data, encoding):
+        if encoding == "br":
+            return brotli.compress(data, quality=min(self.level, 11))
+        return gzip.compress(data, compresslevel=self.level)
+
+    def _stream(self, app_iter, encoding):
+        try:
+            if encoding == "br":
+                c = brotli.Compressor(quality=min(self.level, 11))
+                for chunk in app_iter:
+                    if chunk:
+                        yield c.process(chunk) + c.flush()
+                yield c.finish()
+            else:
+                c = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # formato gzip
+                for chunk in app_iter:
+                    if chunk:
+                        yield c.compress(chunk) + c.flush(zlib.Z_SYNC_FLUSH)
+                yield c.flush()
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
+
+    # ---------- WSGI ----------
+    def __call__(self, environ, start_response):
+        encoding = self._encoding(environ)
+        if encoding is None:
+            return self.app(environ, start_response)
+
+        captured = {}
+        def _start(status, headers, exc_info=None):
+            captured["status"], captured["headers"], captured["exc_info"] = status, headers, exc_info
+            return lambda data: captured.setdefault("written", []).append(data)
+
+        app_iter = self.app(environ, _start)
+        first = []
+        if "status" not in captured:
+            # Apps que llaman a start_response recién al iterar
+            for chunk in app_iter:
+                first.append(chunk)
+                break
+        if "status" not in captured:
+            # Cuerpo vacío sin start_response: no hay nada que comprimir
+            if hasattr(app_iter, "close"):
+                app_iter.close()
+            return first
+        status, headers = captured["status"], list(captured["headers"])
+        prefix = captured.get("written", []) + first
+
+        if not self._eligible(status, headers):
+            start_response(status, headers, captured["exc_info"])
+            if not prefix:
+                return app_iter
+            return self._chain(prefix, app_iter)
+
+        headers = [(k, v) for k, v in headers if k.lower() not in ("content-length", "vary")]
+        vary = [v for k, v in captured["headers"] if k.lower() == "vary"]
+        headers.append(("Vary", ", ".join(vary + ["Accept-Encoding"])))
+        headers.append(("Content-Encoding", encoding))
+        length = next((v for k, v in captured["headers"] if k.lower() == "content-length"), None)
+
+        if length is None:
+            # Streaming: se comprime trozo a trozo
+            start_response(status, headers, captured["exc_info"])
+            return self._stream(self._chain(prefix, app_iter), encoding)
+
+        etag = next((v for k, v in captured["headers"] if k.lower() == "etag"), None)
+        key = (environ.get("PATH_INFO"), environ.get("QUERY_STRING"), etag, encoding) if etag else None
+        body = self.cache.get(key) if key else None
+        if body is None:
+            try:
+                raw = b"".join(prefix) + b"".join(app_iter)
+            finally:
+                if hasattr(app_iter, "close"):
+                    app_iter.close()
+            body = self._compress_all(raw, encoding)
+            if key:
+                with self._lock:
+                    self.cache[key] = body
+        elif hasattr(app_iter, "close"):
+            app_iter.close()
+
+        headers.append(("Content-Length", str(len(body))))
+        start_response(status, headers, captured["exc_info"])
+        return [body]
+
+    @staticmethod
+    def _chain(prefix, app_iter):
+        try:
+            for chunk in prefix:
+                yield chunk
+            for chunk in app_iter:
+                yield chunk
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
@@ -1,9 +1,13 @@
 # app/db.py
 import os
+import queue
 import sys
 import sqlite3
+import threading
 from pathlib import Path
 
+from .budget import attach
+
 # -------------------------------
 # Utilidades de rutas (PyInstaller + fuente)
 # -------------------------------
@@ -44,24 +48,165 @@ def _db_path_from_url(url: str) -> str:
     # fallback: si te pasan sólo un path
     return url
 
-def get_db() -> sqlite3.Connection:
+def tune_connection(conn: sqlite3.Connection, rol: str = "escritura") -> sqlite3.Connection:
     """
-    Retorna una conexión global (por proceso) con row_factory a dict (sqlite3.Row)
-    y foreign_keys activado.
+    PRAGMAs para varios workers sobre un mismo archivo SQLite:
+    - WAL: los lectores no bloquean al escritor (queda guardado en el archivo).
+    - busy_timeout: con un solo escritor a la vez, los demás esperan en vez
+      de fallar con 'database is locked'.
+    - synchronous=NORMAL: seguro con WAL y mucho más rápido que FULL.
+    - auto_vacuum=INCREMENTAL en una base nueva (después ya no se puede
+      cambiar en WAL): app/maintenance.py devuelve las páginas libres.
+    Los valores salen del perfil del rol (SQLITE_PERFIL_*, ver app/storage.py).
     """
-    conn = getattr(get_db, "_conn", None)
-    if conn is None:
-        db_url = os.getenv("DATABASE_URL", "sqlite:///data/app.db")
-        db_path = _db_path_from_url(db_url)
-        # Asegura carpeta
-        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-
-        conn = sqlite3.connect(db_path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON")
-        get_db._conn = conn
+    from .storage import aplicar   # acá: python -m app.storage no debe encontrarlo ya importado
+    aplicar(conn, rol)
+    conn.execute("PRAGMA foreign_keys = ON")
     return conn
 
+# Una conexión por hilo y por archivo: los workers con hilos no comparten transacciones
+_local = threading.local()
+# Al terminar el request la conexión vuelve al pool de su archivo (uno por
+# tienda con TIENDAS, ver app/stores.py) en vez de cerrarse: el próximo
+# request no paga abrirla ni los PRAGMAs
+_pools = {}
+_pools_lock = threading.Lock()
+
+def central_db_path() -> str:
+    """La base de DATABASE_URL: la única sin TIENDAS; con TIENDAS, la de los usuarios."""
+    return _db_path_from_url(os.getenv("DATABASE_URL", "sqlite:///data/app.db"))
+
+def _pool(db_path: str) -> queue.LifoQueue:
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = queue.LifoQueue(maxsize=int(os.getenv("DB_POOL_SIZE", "8")))
+        return pool
+
+def _abrir(db_path: str) -> sqlite3.Connection:
+    # Asegura carpeta
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return tune_connection(conn)
+
+def get_db(db_path: str = None) -> sqlite3.Connection:
+    """
+    Retorna la conexión del hilo actual con row_factory a dict (sqlite3.Row)
+    y foreign_keys activado. Sin `db_path`, la base del request
+    (report_db_path: la de la tienda con TIENDAS).
+    """
+    db_path = db_path or report_db_path()
+    abiertas = getattr(_local, "conns", None)
+    if abiertas is None:
+        abiertas = _local.conns = {}
+    conn = abiertas.get(db_path)
+    if conn is None:
+        try:
+            conn = _pool(db_path).get_nowait()
+        except queue.Empty:
+            conn = _abrir(db_path)
+        abiertas[db_path] = conn
+    # Presupuesto de tiempo del request en curso, si la vista lo declara
+    return attach(conn)
+
+def close_db() -> None:
+    """Devuelve al pool las conexiones del hilo (fin de request o de arranque)."""
+    abiertas = getattr(_local, "conns", None) or {}
+    for db_path, conn in abiertas.items():
+        if conn.in_transaction:
+            conn.rollback()
+        conn.set_progress_handler(None, 0)   # el presupuesto era del request que terminó
+        try:
+            _pool(db_path).put_nowait(conn)
+        except queue.Full:
+            conn.close()
+    abiertas.clear()
+
+def _reset_after_fork() -> None:
+    # Un hijo de fork() no debe usar conexiones SQLite heredadas del padre
+    global _local, _pools
+    _local = threading.local()
+    _pools = {}
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+# -------------------------------
+# Conexiones de sólo lectura (reportes)
+# -------------------------------
+
+def connect_readonly(db_path: str, row_factory=None, copia=False) -> sqlite3.Connection:
+    """
+    Conexión `mode=ro` para reportes. Sobre WAL lee una foto consistente de
+    la base sin bloquear al escritor ni ser bloqueada por él; query_only
+    impide que un reporte escriba por error.
+    Con `copia` (reportes pesados) usa la copia de report_copy.py si
+    REPORT_COPY está activo; esa se abre `immutable=1`: sin locks en absoluto.
+    """
+    from .report_copy import report_path
+    ruta = report_path(db_path) if copia else db_path
+    inmutable = "&immutable=1" if ruta != db_path else ""
+    conn = sqlite3.connect(f"file:{Path(ruta).as_posix()}?mode=ro{inmutable}", uri=True,
+                           check_same_thread=False)
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    # busy_timeout, caché y mmap del perfil de lectura (app/storage.py)
+    from .storage import aplicar
+    aplicar(conn, "lectura")
+    conn.execute("PRAGMA query_only=1")
+    # Presupuesto de tiempo del request en curso, si la vista lo declara
+    return attach(conn)
+
+def report_db_path() -> str:
+    """Ruta de la base de create_app(): la de la tienda del request con TIENDAS."""
+    from .stores import ruta_actual
+    return ruta_actual() or central_db_path()
+
+def open_report_db(copia=False) -> sqlite3.Connection:
+    """Conexión de sólo lectura de create_app(); la cierra quien la abre."""
+    return connect_readonly(report_db_path(), row_factory=sqlite3.Row, copia=copia)
+
+def data_version(conn: sqlite3.Connection, tabla: str) -> int:
+    """
+    Contador de cambios de `tabla` (lo mantienen triggers, ver
+    migrations.data_version_steps). 0 si la tabla no está versionada.
+    """
+    row = conn.execute("SELECT version FROM data_versions WHERE tabla=?", (tabla,)).fetchone()
+    return int(row[0]) if row else 0
+
+def ventas_detalle(conn: sqlite3.Connection) -> bool:
+    """
+    True si los reportes leen ventas_enc/venta_items en lugar de `ventas`.
+    Lo activa app/sales_backfill.py cuando terminó de copiar el historial.
+    """
+    try:
+        row = conn.execute("SELECT valor FROM config WHERE clave = 'ventas_fuente'").fetchone()
+    except sqlite3.OperationalError:   # base sin config
+        return False
+    return bool(row) and row[0] == "detalle"
+
+_nombres = {}
+_nombres_lock = threading.Lock()
+
+def nombres_producto(conn: sqlite3.Connection) -> dict:
+    """
+    {id: nombre} de productos para mostrar reportes agrupados por producto_id.
+    Se cachea por (archivo, versión de productos): un alta o un renombre
+    cambian la versión y el próximo reporte relee el catálogo.
+    """
+    ruta = conn.execute("PRAGMA database_list").fetchone()[2]
+    clave = (ruta, data_version(conn, "productos"))
+    with _nombres_lock:
+        dic = _nombres.get(ruta)
+        if dic is not None and dic[0] == clave:
+            return dic[1]
+    nombres = dict(conn.execute("SELECT id, nombre FROM productos").fetchall())
+    if ruta:  # las bases en memoria no se cachean
+        with _nombres_lock:
+            _nombres[ruta] = (clave, nombres)
+    return nombres
+
 # -------------------------------
 # Bootstrap de la base
 # -------------------------------
@@ -73,32 +218,18 @@ def _table_exists(conn: sqlite3.Connection, table_name: str) -> bool:
     )
     return cur.fetchone() is not None
 
-def init_db_if_needed(app=None) -> None:
+def init_db_if_needed(app=None) -> int:
     """
-    Crea la DB y ejecuta scripts/schema.sql si no existen las tablas base.
-    - Busca el schema con _resource_path('scripts/schema.sql'), que sirve tanto
+    Aplica las migraciones pendientes (app/migrations.py) y devuelve la
+    versión del esquema. Con la base al día sólo cuesta leer PRAGMA user_version
+    y la marca de config de backfill_producto_id (que corre una sola vez).
+    - El paso 1 ejecuta scripts/schema.sql vía _resource_path(), que sirve tanto
       empacado (PyInstaller) como en modo fuente.
+    - Con TIENDAS migra también la base de cada tienda.
     """
-    conn = get_db()
-    # ¿Ya existe alguna tabla clave? Usa 'usuarios' como marcador.
-    if _table_exists(conn, "usuarios"):
-        return
-
-    # Carga el schema
-    schema_file = _resource_path("scripts/schema.sql")
-    if not schema_file.exists():
-        # Fallback defensivo por si no se empacó el schema: crea sólo usuarios
-        conn.executescript("""
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            nombre TEXT NOT NULL,
-            pass_hash TEXT NOT NULL
-        );
-        """)
-        conn.commit()
-        return
-
-    sql = schema_file.read_text(encoding="utf-8")
-    conn.executescript(sql)
-    conn.commit()
+    from .migrations import migrate, backfill_producto_id, MIGRACIONES_APP
+    from .stores import configuradas
+    for db_path in dict.fromkeys([central_db_path(), *configuradas().values()]):
+        version = migrate(get_db(db_path), MIGRACIONES_APP)
+        backfill_producto_id(get_db(db_path))
+    return version
@@ -0,0 +1,84 @@
+# app/events.py
+"""
+Eventos en vivo para los tableros (Server-Sent Events).
+
+Un único publicador en el proceso reparte cada evento a todos los
+suscriptores. Cada cliente tiene su propia cola acotada: si un navegador
+lento la llena, se vacía y recibe un 'resync' (vuelve a pedir la API) en
+lugar de hacer crecer la memoria del servidor.
+
+Los tableros abiertos sin actividad no tocan la base: el stream sólo espera
+en su cola y manda un comentario de keep-alive cada HEARTBEAT segundos.
+
+Uso:
+    from app.events import broker, sse_response
+    broker.publish('venta', {'total': 12.5, ...})   # después del commit
+    return sse_response()                            # en la vista del stream
+
+Nota: el reparto es por proceso. Con varios workers cada uno publica a sus
+propios clientes; por eso app/server.py arranca las apps con stream con un
+solo worker (WORKERS=1) salvo que se pida otra cosa.
+"""
+import json
+import os
+import queue
+import threading
+
+from flask import Response
+
+HEARTBEAT = 15  # segundos
+
+class Broker:
+    def __init__(self, max_queue=None):
+        self.max_queue = int(max_queue or os.getenv("SSE_MAX_QUEUE", "100"))
+        self._subs = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> queue.Queue:
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subs.add(q)
+        return q
+
+    def unsubscribe(self, q) -> None:
+        with self._lock:
+            self._subs.discard(q)
+
+    def __len__(self):
+        return len(self._subs)
+
+    def publish(self, evento: str, datos: dict) -> None:
+        msg = (evento, json.dumps(datos, separators=(",", ":"), default=str))
+        with self._lock:
+            subs = list(self._subs)
+        for q in subs:
+            try:
+                q.put_nowait(msg)
+            except queue.Full:
+                # Cliente atrasado: se descartan sus deltas y se le pide recargar
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait(("resync", "{}"))
+
+    def stream(self, heartbeat=HEARTBEAT):
+        """Generador de frames SSE para un suscriptor nuevo."""
+        q = self.subscribe()
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    evento, data = q.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {evento}\ndata: {data}\n\n"
+        finally:
+            self.unsubscribe(q)
+
+broker = Broker()
+
+def sse_response(b: Broker = None) -> Response:
+    resp = Response((b or broker).stream(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"   # nginx: no bufferizar
+    return resp
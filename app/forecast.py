@@ -0,0 +1,218 @@
+# app/forecast.py
+"""
+Pronóstico de demanda y punto de pedido por SKU (inventario.db).
+
+    python -m app.forecast inventario.db     # corrida incremental ya (cron)
+
+Modelo por producto (tabla `pronosticos`):
+  nivel    demanda diaria suavizada (EWMA, alfa FORECAST_ALPHA = 0.3)
+  desvio   desvío del error de un día (EWMA del error al cuadrado)
+Se ajusta sobre los últimos FORECAST_DIAS días (120) de ventas del kardex,
+todos los SKUs a la vez: una matriz SKU x día y una pasada por día.
+
+Incremental: sólo se reajustan los SKUs con movimientos nuevos desde la
+corrida anterior (config 'pronostico_ultimo_mov'). A los demás les pasaron
+días sin ventas, y eso el EWMA lo resuelve cerrado: nivel * (1-alfa)^días.
+
+Con el modelo:
+  punto de pedido = nivel * L + z * desvio * sqrt(L)      L = FORECAST_LEAD_DIAS (7)
+  pedir si stock <= punto de pedido, hasta cubrir L + FORECAST_REVISION_DIAS (7)
+  días más el stock de seguridad; redondeado a paquetes si el producto los tiene.
+
+Las sugerencias quedan como compras en estado 'borrador', una por proveedor
+(productos.proveedor). No tocan el stock hasta que se confirman.
+
+numpy/pandas se importan dentro de las funciones de cálculo: importar el
+módulo (wsgi.py, programar) no los carga.
+"""
+import json
+import logging
+import math
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING
+
+from .db import tune_connection
+from .periodic import Periodico
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+log = logging.getLogger("forecast")
+
+def parametros() -> dict:
+    return {
+        "alfa": float(os.getenv("FORECAST_ALPHA", "0.3")),
+        "dias": int(os.getenv("FORECAST_DIAS", "120")),
+        "lead": float(os.getenv("FORECAST_LEAD_DIAS", "7")),
+        "revision": float(os.getenv("FORECAST_REVISION_DIAS", "7")),
+        "z": float(os.getenv("FORECAST_Z", "1.65")),   # ~95% de servicio
+    }
+
+# ---------- Ajuste (vectorizado sobre SKUs) ----------
+def matriz_ventas(conn, ids, desde: date, hasta: date) -> "np.ndarray":
+    """Unidades vendidas por SKU (filas, en el orden de `ids`) y día [desde, hasta]."""
+    import numpy as np
+    import pandas as pd
+    dias = (hasta - desde).days + 1
+    m = np.zeros((len(ids), dias))
+    if not len(ids):
+        return m
+    df = pd.read_sql_query(
+        """SELECT producto_id, substr(fecha, 1, 10) AS dia, -SUM(cantidad_unidades) AS unidades
+           FROM stock_movimientos
+           WHERE tipo = 'venta' AND fecha >= ? AND fecha < ?
+             AND producto_id IN (SELECT value FROM json_each(?))
+           GROUP BY producto_id, dia""",
+        conn, params=(desde.isoformat(), (hasta + timedelta(days=1)).isoformat(),
+                      json.dumps([int(i) for i in ids])))
+    fila = pd.Index(ids).get_indexer(df["producto_id"])
+    col = (pd.to_datetime(df["dia"], format="%Y-%m-%d") - pd.Timestamp(desde)).dt.days.to_numpy()
+    m[fila, col] = df["unidades"].to_numpy(dtype=float)
+    return m
+
+def ajustar(m: "np.ndarray", alfa: float):
+    """EWMA de nivel y de error al cuadrado; una iteración por día, todos los SKUs juntos."""
+    import numpy as np
+    inicio = min(7, m.shape[1])
+    nivel = m[:, :inicio].mean(axis=1) if inicio else np.zeros(m.shape[0])
+    var = m[:, :inicio].var(axis=1) if inicio else np.zeros(m.shape[0])
+    for t in range(inicio, m.shape[1]):
+        error = m[:, t] - nivel
+        var = (1 - alfa) * var + alfa * error ** 2
+        nivel = nivel + alfa * error
+    return nivel, np.sqrt(var)
+
+# ---------- Sugerencias ----------
+def sugerencias(conn, p: dict, ayer: date) -> "pd.DataFrame":
+    """Punto de pedido y cantidad sugerida para todos los SKUs con modelo."""
+    import numpy as np
+    import pandas as pd
+    df = pd.read_sql_query(
+        """SELECT f.producto_id, f.nivel, f.desvio, f.dia_base,
+                  COALESCE(p.cantidad_stock, 0) AS stock, p.unidades_por_paquete,
+                  NULLIF(TRIM(p.proveedor), '') AS proveedor, c.costo
+           FROM pronosticos f
+           JOIN productos p ON p.id = f.producto_id
+           LEFT JOIN (
+               -- último costo conocido (columna suelta junto a un único MAX())
+               SELECT producto_id, MAX(fecha), costo_unit AS costo FROM stock_movimientos
+               WHERE tipo = 'reposicion' AND costo_unit IS NOT NULL GROUP BY producto_id
+           ) c ON c.producto_id = f.producto_id""", conn)
+    # Días sin ventas desde el último ajuste: decaimiento cerrado del EWMA
+    k = (pd.Timestamp(ayer) - pd.to_datetime(df["dia_base"], format="%Y-%m-%d")).dt.days.clip(lower=0)
+    nivel = df["nivel"] * (1 - p["alfa"]) ** k
+    seguridad = p["z"] * df["desvio"] * math.sqrt(p["lead"])
+    df["punto_pedido"] = (nivel * p["lead"] + seguridad).round(2)
+    objetivo = nivel * (p["lead"] + p["revision"]) + seguridad
+    falta = np.ceil((objetivo - df["stock"]).clip(lower=0))
+    paquete = pd.to_numeric(df["unidades_por_paquete"]).fillna(1).clip(lower=1)
+    falta = np.ceil(falta / paquete) * paquete
+    df["cantidad"] = falta.where(df["stock"] <= df["punto_pedido"], 0).astype(int)
+    return df
+
+def guardar_borradores(conn, sug: "pd.DataFrame", fecha: str) -> int:
+    """Reemplaza las compras en borrador: una por proveedor. Corre dentro de la transacción."""
+    import pandas as pd
+    conn.execute("DELETE FROM compra_items WHERE compra_id IN (SELECT id FROM compras WHERE estado = 'borrador')")
+    conn.execute("DELETE FROM compras WHERE estado = 'borrador'")
+    pedir = sug[sug["cantidad"] > 0].copy()
+    if pedir.empty:
+        return 0
+    pedir["costo"] = pd.to_numeric(pedir["costo"]).fillna(0.0)
+    pedir["subtotal"] = (pedir["cantidad"] * pedir["costo"]).round(2)
+    n = 0
+    for proveedor, grupo in pedir.groupby(pedir["proveedor"].fillna(""), sort=True):
+        proveedor_id = None
+        if proveedor:
+            row = conn.execute("SELECT id FROM proveedores WHERE nombre = ?", (proveedor,)).fetchone()
+            proveedor_id = row[0] if row else conn.execute(
+                "INSERT INTO proveedores (nombre) VALUES (?)", (proveedor,)).lastrowid
+        compra_id = conn.execute(
+            "INSERT INTO compras (fecha, proveedor_id, total, estado) VALUES (?, ?, ?, 'borrador')",
+            (fecha, proveedor_id, round(float(grupo["subtotal"].sum()), 2))).lastrowid
+        conn.executemany(
+            """INSERT INTO compra_items (compra_id, producto_id, cantidad, costo_unit, subtotal)
+               VALUES (?, ?, ?, ?, ?)""",
+            [(compra_id, int(pid), int(c), float(cu), float(st)) for pid, c, cu, st in
+             grupo[["producto_id", "cantidad", "costo", "subtotal"]].itertuples(index=False)])
+        n += 1
+    return n
+
+# ---------- Corrida incremental ----------
+def _config(conn, clave, defecto=None):
+    row = conn.execute("SELECT valor FROM config WHERE clave = ?", (clave,)).fetchone()
+    return row[0] if row else defecto
+
+def ejecutar(conn, hoy: date = None, forzar: bool = False) -> dict:
+    """
+    Reajusta los SKUs con movimientos nuevos y rehace los borradores.
+    `conn` es de escritura; todo lo escrito va en una sola transacción.
+    """
+    p = parametros()
+    hoy = hoy or date.today()
+    ayer = hoy - timedelta(days=1)   # último día completo
+    ultimo_mov = int(_config(conn, "pronostico_ultimo_mov", 0))
+    tope = conn.execute("SELECT COALESCE(MAX(id), 0) FROM stock_movimientos").fetchone()[0]
+    if not forzar and tope == ultimo_mov and _config(conn, "pronostico_dia") == ayer.isoformat():
+        return {"reajustados": 0, "borradores": None}
+
+    # SKUs a reajustar: con movimientos nuevos, o sin modelo todavía
+    ids = [r[0] for r in conn.execute(
+        """SELECT DISTINCT producto_id FROM stock_movimientos WHERE id > ? AND id <= ?
+           UNION
+           SELECT id FROM productos WHERE id NOT IN (SELECT producto_id FROM pronosticos)""",
+        (0 if forzar else ultimo_mov, tope))]
+    m = matriz_ventas(conn, ids, ayer - timedelta(days=p["dias"] - 1), ayer)
+    nivel, desvio = ajustar(m, p["alfa"])
+
+    with conn:
+        conn.executemany(
+            """INSERT INTO pronosticos (producto_id, nivel, desvio, dia_base, actualizado_en)
+               VALUES (?, ?, ?, ?, datetime('now', 'localtime'))
+               ON CONFLICT(producto_id) DO UPDATE SET
+                 nivel = excluded.nivel, desvio = excluded.desvio,
+                 dia_base = excluded.dia_base, actualizado_en = excluded.actualizado_en""",
+            [(int(i), float(n), float(d), ayer.isoformat()) for i, n, d in zip(ids, nivel, desvio)])
+        sug = sugerencias(conn, p, ayer)
+        conn.executemany(
+            "UPDATE pronosticos SET punto_pedido = ?, cantidad_sugerida = ? WHERE producto_id = ?",
+            [(float(pp), int(c), int(i)) for i, pp, c in
+             sug[["producto_id", "punto_pedido", "cantidad"]].itertuples(index=False)])
+        borradores = guardar_borradores(conn, sug, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        conn.executemany("INSERT OR REPLACE INTO config (clave, valor) VALUES (?, ?)",
+                         [("pronostico_ultimo_mov", str(tope)), ("pronostico_dia", ayer.isoformat())])
+    log.info("Pronóstico: %d SKUs reajustados, %d compras en borrador", len(ids), borradores)
+    return {"reajustados": len(ids), "borradores": borradores}
+
+def run(db_path: str, forzar: bool = False) -> dict:
+    conn = tune_connection(sqlite3.connect(db_path), "tareas")
+    try:
+        return ejecutar(conn, forzar=forzar)
+    finally:
+        conn.close()
+
+_programadores = {}
+
+def programar(db_path: str) -> None:
+    """Corrida incremental cada FORECAST_INTERVAL segundos (900) en un hilo del worker; 0 la apaga."""
+    intervalo = float(os.getenv("FORECAST_INTERVAL", "900"))
+    if intervalo <= 0:
+        return
+    prog = _programadores.get(db_path)
+    if prog is None:
+        prog = _programadores.setdefault(db_path, Periodico(
+            "forecast", lambda: run(db_path)["borradores"] is not None, intervalo,
+            db_path + ".forecast.lock", espera=intervalo))
+    prog.start()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Pronóstico de demanda y compras sugeridas")
+    ap.add_argument("db")
+    ap.add_argument("--todo", action="store_true", help="reajusta todos los SKUs")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(run(args.db, forzar=args.todo))
@@ -0,0 +1,99 @@
+# app/http_cache.py
+"""
+GET condicional (ETag / If-None-Match) basado en versiones de datos.
+
+Cada tabla tiene un contador en data_versions que mantienen triggers
+(ver migrations.data_version_steps). La ETag de una vista se arma con:
+  - las versiones de las tablas que lee,
+  - la ruta + query string,
+  - el usuario de la sesión y la fecha de hoy (los rangos "hoy"/"mes" cambian),
+  - la tienda del request (TIENDAS, ver stores.py): cada una tiene sus versiones,
+  - una marca de build (plantillas), para no servir HTML de una versión vieja.
+
+Si el cliente ya la tiene se responde 304 ANTES de ejecutar la vista: el
+único costo es una consulta por clave primaria a data_versions.
+
+Uso:
+    @app.route('/inventario')
+    @login_required
+    @conditional('productos', 'config', connect=get_conn)
+    def inventario(): ...
+"""
+import hashlib
+import os
+from datetime import date
+from functools import wraps
+
+from flask import request, session, make_response
+
+from .stores import actual as tienda_actual
+
+TEMPLATES_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), "templates")
+
+def _build_token() -> str:
+    """Cambia al desplegar plantillas nuevas; igual en todos los workers."""
+    try:
+        mtimes = [os.path.getmtime(os.path.join(TEMPLATES_DIR, n)) for n in os.listdir(TEMPLATES_DIR)]
+    except OSError:
+        return "0"
+    return str(int(max(mtimes, default=0)))
+
+BUILD_TOKEN = _build_token()
+
+def data_versions(conn, tablas) -> tuple:
+    """Versiones de varias tablas en una sola consulta, en el orden pedido."""
+    tablas = list(tablas)
+    marcas = ",".join("?" for _ in tablas)
+    rows = conn.execute(
+        f"SELECT tabla, version FROM data_versions WHERE tabla IN ({marcas})", tablas
+    ).fetchall()
+    por_tabla = {r[0]: r[1] for r in rows}
+    return tuple(por_tabla.get(t, 0) for t in tablas)
+
+def make_etag(versiones, *extra) -> str:
+    h = hashlib.sha1()
+    for parte in (BUILD_TOKEN, *versiones, *extra):
+        h.update(str(parte).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()[:20]
+
+def _usuario_sesion():
+    # wsgi.py guarda 'user_id'; Flask-Login guarda '_user_id'
+    return session.get("user_id") or session.get("_user_id") or ""
+
+def conditional(*tablas, connect, close=True):
+    """
+    Decorador de vistas GET. `tablas` puede ser una lista de nombres o una
+    función que recibe los kwargs de la vista (p.ej. export_csv(tabla)).
+    `connect` devuelve una conexión sqlite3; si `close` la cierra al terminar.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if request.method not in ("GET", "HEAD") or session.get("_flashes"):
+                return view(*args, **kwargs)
+
+            nombres = tablas[0](**kwargs) if len(tablas) == 1 and callable(tablas[0]) else tablas
+            conn = connect()
+            try:
+                versiones = data_versions(conn, nombres)
+            finally:
+                if close:
+                    conn.close()
+            etag = make_etag(versiones, request.full_path, _usuario_sesion(), tienda_actual() or "",
+                             date.today().isoformat())
+
+            # ETag débil: el cuerpo puede viajar comprimido o no con la misma etiqueta
+            if request.if_none_match.contains_weak(etag):
+                resp = make_response("", 304)
+                resp.set_etag(etag, weak=True)
+                return resp
+
+            resp = make_response(view(*args, **kwargs))
+            if resp.status_code == 200:
+                resp.set_etag(etag, weak=True)
+                # privado: depende del usuario; no-cache: siempre revalidar
+                resp.headers["Cache-Control"] = "private, no-cache"
+            return resp
+        return wrapped
+    return decorator
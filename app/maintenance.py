@@ -0,0 +1,197 @@
+# app/maintenance.py
+"""
+Mantenimiento de la base SQLite en segundo plano: estadísticas del
+planificador, checkpoints del WAL y devolución de páginas libres.
+
+    python -m app.maintenance inventario.db            # una vuelta ya (como si estuviera tranquilo)
+    python -m app.maintenance inventario.db --convertir   # pasa a auto_vacuum=INCREMENTAL (VACUUM)
+
+Cada MAINT_INTERVAL segundos (60; 0 = apagado) un worker a la vez (flock,
+ver app/periodic.py):
+
+- siempre: PRAGMA wal_checkpoint(PASSIVE), no espera a nadie.
+- si está tranquilo (menos de MAINT_QUIET_RPM pedidos por minuto en este
+  worker y ninguna escritura de nadie en los últimos MAINT_QUIET_SEGUNDOS,
+  mirando el mtime del WAL):
+    * wal_checkpoint(TRUNCATE): el WAL vuelve a cero bytes.
+    * PRAGMA optimize y, cada MAINT_ANALYZE_HORAS (24) o si nunca se hizo,
+      ANALYZE con analysis_limit=MAINT_ANALYSIS_LIMIT (1000 filas por índice).
+      El último ANALYZE queda en config 'mantenimiento_analyze'.
+    * incremental_vacuum de hasta MAINT_VACUUM_PAGINAS (2000) si hay más de
+      MAINT_FREELIST_MIN (256) páginas libres. Las bases nuevas nacen con
+      auto_vacuum=INCREMENTAL (db.tune_connection); una vieja, en NONE, se
+      convierte si nadie más la tiene abierta o, si no, se compacta con un
+      VACUUM, siempre que pese menos de MAINT_CONVERTIR_MB (64). Para las
+      más grandes: --convertir con la aplicación parada.
+
+El costo de cada tarea (ms y páginas) va a metrics.evento("mantenimiento")
+y el resumen de la última vuelta a /metrics ("mantenimiento").
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from . import metrics
+from .periodic import Periodico
+
+log = logging.getLogger("maintenance")
+
+# ---------- Actividad (pedidos de este worker) ----------
+_pedidos = deque(maxlen=10000)
+_pedidos_lock = threading.Lock()
+
+def registrar_pedido() -> None:
+    """Lo llama cada request (before_request) para medir la tasa."""
+    with _pedidos_lock:
+        _pedidos.append(time.monotonic())
+
+def pedidos_por_minuto(ventana: float = 60.0) -> float:
+    desde = time.monotonic() - ventana
+    with _pedidos_lock:
+        n = sum(1 for t in _pedidos if t >= desde)
+    return n * 60.0 / ventana
+
+def ultima_escritura(db_path: str) -> float:
+    """mtime (epoch) del último commit de cualquier proceso: el WAL o la base."""
+    tiempos = [os.stat(r).st_mtime for r in (db_path, db_path + "-wal") if os.path.exists(r)]
+    return max(tiempos, default=0.0)
+
+def tranquilo(db_path: str) -> bool:
+    rpm = float(os.getenv("MAINT_QUIET_RPM", "5"))
+    segundos = float(os.getenv("MAINT_QUIET_SEGUNDOS", "60"))
+    return (pedidos_por_minuto() < rpm
+            and time.time() - ultima_escritura(db_path) >= segundos)
+
+# ---------- Tareas ----------
+def _config(conn, clave, defecto=None):
+    row = conn.execute("SELECT valor FROM config WHERE clave = ?", (clave,)).fetchone()
+    return row[0] if row else defecto
+
+def _medir(costos: dict, tarea: str, fn):
+    t0 = time.perf_counter()
+    res = fn()
+    ms = round((time.perf_counter() - t0) * 1000, 1)
+    costos[tarea] = {"ms": ms, **(res or {})}
+    metrics.evento("mantenimiento", tarea=tarea, ms=ms, **(res or {}))
+    return res
+
+def checkpoint(conn, modo: str = "PASSIVE") -> dict:
+    ocupado, wal, copiadas = conn.execute(f"PRAGMA wal_checkpoint({modo})").fetchone()
+    return {"ocupado": ocupado, "wal_paginas": wal, "paginas": copiadas}
+
+def estadisticas(conn, forzar: bool = False) -> dict:
+    """PRAGMA optimize siempre; ANALYZE acotado si toca (o nunca se hizo)."""
+    horas = float(os.getenv("MAINT_ANALYZE_HORAS", "24"))
+    ultimo = float(_config(conn, "mantenimiento_analyze", 0) or 0)
+    sin_stats = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is None
+    analyze = forzar or sin_stats or time.time() - ultimo >= horas * 3600
+    conn.execute(f"PRAGMA analysis_limit={int(os.getenv('MAINT_ANALYSIS_LIMIT', '1000'))}")
+    if analyze:
+        conn.execute("ANALYZE")
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO config (clave, valor) VALUES ('mantenimiento_analyze', ?)",
+                         (str(int(time.time())),))
+    # 0x10002: en SQLite >= 3.46 revisa todas las tablas, no sólo las usadas por esta conexión
+    conn.execute("PRAGMA optimize=0x10002")
+    return {"analyze": analyze}
+
+def convertir(conn) -> dict:
+    """
+    Pasa a auto_vacuum=INCREMENTAL. En WAL el VACUUM no cambia ese modo, así
+    que sale de WAL un momento: necesita la base sola ('database is locked'
+    si hay otras conexiones abiertas).
+    """
+    antes = conn.execute("PRAGMA page_count").fetchone()[0]
+    conn.execute("PRAGMA journal_mode=DELETE")
+    try:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    finally:
+        conn.execute("PRAGMA journal_mode=WAL")
+    return {"paginas": antes - conn.execute("PRAGMA page_count").fetchone()[0], "convertida": True}
+
+def compactar(conn) -> dict:
+    """VACUUM completo (sirve en WAL, sin cambiar auto_vacuum)."""
+    antes = conn.execute("PRAGMA page_count").fetchone()[0]
+    conn.execute("VACUUM")
+    return {"paginas": antes - conn.execute("PRAGMA page_count").fetchone()[0]}
+
+def liberar(conn, db_path: str) -> dict:
+    """Devuelve páginas libres al sistema de archivos (incremental_vacuum por tandas)."""
+    libres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if libres <= int(os.getenv("MAINT_FREELIST_MIN", "256")):
+        return {"libres": libres, "paginas": 0}
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        tope = float(os.getenv("MAINT_CONVERTIR_MB", "64")) * 1024 * 1024
+        if os.path.getsize(db_path) > tope:
+            log.info("%s: %d páginas libres; auto_vacuum=NONE y demasiado grande para compactar solo",
+                     db_path, libres)
+            return {"libres": libres, "paginas": 0}
+        try:
+            return {"libres": libres, **convertir(conn)}
+        except sqlite3.OperationalError:
+            # Otros workers con la base abierta: compacta sin cambiar de modo
+            return {"libres": libres, **compactar(conn)}
+    paginas = int(os.getenv("MAINT_VACUUM_PAGINAS", "2000"))
+    conn.execute(f"PRAGMA incremental_vacuum({paginas})").fetchall()
+    return {"libres": libres, "paginas": libres - conn.execute("PRAGMA freelist_count").fetchone()[0]}
+
+# ---------- Vuelta ----------
+_ultima = {}   # db_path -> costos de la última vuelta (para /metrics)
+
+def ejecutar(db_path: str, forzar: bool = False) -> dict:
+    """Una vuelta; con `forzar` hace todo aunque haya movimiento. Devuelve los costos."""
+    quieto = forzar or tranquilo(db_path)
+    costos = {}
+    # Conexión propia en autocommit y con poca paciencia: si hay alguien, se saltea
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute(f"PRAGMA busy_timeout={int(os.getenv('MAINT_BUSY_TIMEOUT', '200'))}")
+        if not quieto:
+            _medir(costos, "checkpoint", lambda: checkpoint(conn, "PASSIVE"))
+        else:
+            _medir(costos, "estadisticas", lambda: estadisticas(conn, forzar))
+            _medir(costos, "vacuum", lambda: liberar(conn, db_path))
+            # Al final: que el TRUNCATE se lleve también lo que escribieron ANALYZE y VACUUM
+            _medir(costos, "checkpoint", lambda: checkpoint(conn, "TRUNCATE"))
+    except sqlite3.OperationalError as e:
+        # 'database is locked': volvió el movimiento, la próxima vuelta sigue
+        log.info("Mantenimiento de %s interrumpido: %s", db_path, e)
+        costos["interrumpido"] = str(e)
+    finally:
+        conn.close()
+    _ultima[db_path] = {"ts": time.strftime("%Y-%m-%d %H:%M:%S"), "tranquilo": quieto, **costos}
+    return costos
+
+_programadores = {}
+
+def programar(db_path: str) -> None:
+    """Vuelta cada MAINT_INTERVAL segundos (60); no hace nada si es 0."""
+    intervalo = float(os.getenv("MAINT_INTERVAL", "60"))
+    if intervalo <= 0:
+        return
+    prog = _programadores.get(db_path)
+    if prog is None:
+        prog = _programadores.setdefault(db_path, Periodico(
+            "mantenimiento", lambda: bool(ejecutar(db_path)), intervalo,
+            db_path + ".maintenance.lock", espera=intervalo))
+        metrics.registrar_fuente("mantenimiento", lambda: dict(_ultima))
+    prog.start()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Mantenimiento de la base SQLite")
+    ap.add_argument("db")
+    ap.add_argument("--convertir", action="store_true",
+                    help="pasa a auto_vacuum=INCREMENTAL (VACUUM completo, bloquea escrituras)")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.convertir:
+        conn = sqlite3.connect(args.db, isolation_level=None)
+        print(convertir(conn))
+        conn.close()
+    print(ejecutar(args.db, forzar=True))
@@ -0,0 +1,40 @@
+# app/metrics.py
+"""
+Métricas en memoria del proceso: contadores y los últimos eventos.
+
+    from app import metrics
+    metrics.incr("presupuesto_excedido")
+    metrics.evento("presupuesto_excedido", endpoint="export_csv", segundos=15)
+
+/metrics (login) las muestra en JSON. Son por worker: con varios procesos
+cada uno reporta lo suyo (el pid va en la respuesta).
+"""
+import os
+import threading
+import time
+from collections import Counter, deque
+
+_lock = threading.Lock()
+_contadores = Counter()
+_eventos = deque(maxlen=int(os.getenv("METRICS_EVENTOS", "200")))
+_fuentes = {}   # nombre -> callable() -> dict (p.ej. admisión)
+
+def incr(nombre: str, n: int = 1) -> None:
+    with _lock:
+        _contadores[nombre] += n
+
+def evento(tipo: str, **datos) -> None:
+    incr(tipo)
+    with _lock:
+        _eventos.append({"ts": time.strftime("%Y-%m-%d %H:%M:%S"), "tipo": tipo, **datos})
+
+def registrar_fuente(nombre: str, fn) -> None:
+    """Agrega un bloque calculado al snapshot (estado actual, no acumulado)."""
+    _fuentes[nombre] = fn
+
+def snapshot() -> dict:
+    with _lock:
+        datos = {"pid": os.getpid(), "contadores": dict(_contadores), "eventos": list(_eventos)}
+    for nombre, fn in _fuentes.items():
+        datos[nombre] = fn()
+    return datos
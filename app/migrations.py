@@ -0,0 +1,576 @@
+# app/migrations.py
+"""
+Migraciones numeradas con PRAGMA user_version.
+
+Cada base guarda en su cabecera (PRAGMA user_version) el número de la última
+migración aplicada. En un arranque "en caliente" sólo se lee ese PRAGMA; si
+hay pasos pendientes se aplican todos dentro de UNA transacción.
+
+Hay dos juegos de migraciones porque conviven dos esquemas:
+  - MIGRACIONES_INVENTARIO: inventario.db (wsgi.py, migracion_*.py)
+  - MIGRACIONES_APP:        data/app.db   (create_app / launcher.py)
+
+Reglas para agregar un paso:
+  - Nunca modificar un paso ya publicado; agregar uno nuevo al final.
+  - Los pasos deben tolerar bases antiguas creadas sin versión (user_version=0),
+    por eso se usa IF NOT EXISTS y add_column() en lugar de ALTER "a ciegas".
+"""
+import os
+import sqlite3
+
+# -------------------------------
+# Helpers para pasos idempotentes
+# -------------------------------
+
+def column_exists(conn: sqlite3.Connection, tabla: str, columna: str) -> bool:
+    rows = conn.execute(f"PRAGMA table_info({tabla})").fetchall()
+    return any(r[1] == columna for r in rows)
+
+def add_column(conn: sqlite3.Connection, tabla: str, columna: str, decl: str) -> None:
+    """ALTER TABLE ... ADD COLUMN sólo si la columna no existe."""
+    if not column_exists(conn, tabla, columna):
+        conn.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {decl}")
+
+def data_version_steps(*tablas):
+    """
+    Sentencias para llevar un contador de versión por tabla en data_versions.
+    Los triggers lo incrementan en cada INSERT/UPDATE/DELETE, venga de donde
+    venga la escritura; las cachés (fragmentos, ETag) lo usan como clave.
+    """
+    sql = ["""CREATE TABLE IF NOT EXISTS data_versions (
+      tabla TEXT PRIMARY KEY,
+      version INTEGER NOT NULL DEFAULT 0
+    )"""]
+    for tabla in tablas:
+        sql.append(f"INSERT OR IGNORE INTO data_versions (tabla, version) VALUES ('{tabla}', 0)")
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            sql.append(f"""CREATE TRIGGER IF NOT EXISTS trg_dv_{tabla}_{op.lower()}
+              AFTER {op} ON {tabla}
+              BEGIN UPDATE data_versions SET version = version + 1 WHERE tabla = '{tabla}'; END""")
+    return sql
+
+def month_version_steps(*tablas):
+    """
+    Versión por mes (YYYY-MM de `fecha`) en meses_version: una venta de hoy
+    sólo invalida el mes en curso y los meses cerrados quedan cacheables
+    (ver report_engine.py). UPDATE toca el mes viejo y el nuevo.
+    """
+    sql = ["""CREATE TABLE IF NOT EXISTS meses_version (
+      mes TEXT PRIMARY KEY,
+      version INTEGER NOT NULL DEFAULT 0
+    )"""]
+    bump = """INSERT INTO meses_version (mes, version) VALUES (substr({fila}.fecha, 1, 7), 1)
+              ON CONFLICT(mes) DO UPDATE SET version = version + 1;"""
+    for tabla in tablas:
+        for op, filas in (("INSERT", ("NEW",)), ("UPDATE", ("OLD", "NEW")), ("DELETE", ("OLD",))):
+            cuerpo = " ".join(bump.format(fila=f) for f in filas)
+            sql.append(f"""CREATE TRIGGER IF NOT EXISTS trg_mv_{tabla}_{op.lower()}
+              AFTER {op} ON {tabla}
+              BEGIN {cuerpo} END""")
+    return sql
+
+_UMBRAL = ("COALESCE((SELECT CAST(valor AS INTEGER) FROM config "
+           "WHERE clave = 'umbral_bajo_stock'), 5)")
+
+def low_stock_steps(columna: str):
+    """
+    Conjunto de productos con bajo stock mantenido por triggers:
+    productos_bajo_stock tiene los id con `columna` <= umbral y
+    contadores['bajo_stock'] su tamaño, así el badge es una lectura por
+    clave y "sólo bajo stock" recorre sólo esos productos.
+    Cambiar el umbral en config (set_umbral_bajo_stock, /actualizar-umbral)
+    recalcula el conjunto con el índice sobre `columna`.
+    """
+    stock = f"COALESCE(NEW.{columna}, 0)"
+    return [
+        "CREATE TABLE IF NOT EXISTS productos_bajo_stock (producto_id INTEGER PRIMARY KEY)",
+        """CREATE TABLE IF NOT EXISTS contadores (
+          nombre TEXT PRIMARY KEY,
+          valor INTEGER NOT NULL DEFAULT 0
+        )""",
+        "INSERT OR IGNORE INTO contadores (nombre, valor) VALUES ('bajo_stock', 0)",
+        f"CREATE INDEX IF NOT EXISTS idx_productos_stock ON productos({columna})",
+        """CREATE TRIGGER IF NOT EXISTS trg_bajo_stock_cuenta_insert
+          AFTER INSERT ON productos_bajo_stock
+          BEGIN UPDATE contadores SET valor = valor + 1 WHERE nombre = 'bajo_stock'; END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_bajo_stock_cuenta_delete
+          AFTER DELETE ON productos_bajo_stock
+          BEGIN UPDATE contadores SET valor = valor - 1 WHERE nombre = 'bajo_stock'; END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_bajo_stock_insert
+          AFTER INSERT ON productos WHEN {stock} <= {_UMBRAL}
+          BEGIN INSERT OR IGNORE INTO productos_bajo_stock (producto_id) VALUES (NEW.id); END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_bajo_stock_update
+          AFTER UPDATE OF {columna} ON productos
+          BEGIN
+            DELETE FROM productos_bajo_stock WHERE producto_id = OLD.id AND {stock} > {_UMBRAL};
+            INSERT OR IGNORE INTO productos_bajo_stock (producto_id)
+              SELECT NEW.id WHERE {stock} <= {_UMBRAL};
+          END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_bajo_stock_delete
+          AFTER DELETE ON productos
+          BEGIN DELETE FROM productos_bajo_stock WHERE producto_id = OLD.id; END""",
+    ] + [
+        # INSERT OR REPLACE en config dispara el de INSERT
+        f"""CREATE TRIGGER IF NOT EXISTS trg_bajo_stock_umbral_{op.lower()}
+          AFTER {op} ON config WHEN NEW.clave = 'umbral_bajo_stock'
+          BEGIN
+            DELETE FROM productos_bajo_stock;
+            INSERT INTO productos_bajo_stock (producto_id)
+              SELECT id FROM productos WHERE COALESCE({columna}, 0) <= CAST(NEW.valor AS INTEGER);
+          END"""
+        for op in ("INSERT", "UPDATE")
+    ] + [
+        f"""INSERT OR IGNORE INTO productos_bajo_stock (producto_id)
+          SELECT id FROM productos WHERE COALESCE({columna}, 0) <= {_UMBRAL}""",
+    ]
+
+def ventas_producto_id_steps(indice_nombre: bool):
+    """
+    ventas.producto_id como clave de los reportes (agrupar por entero y no
+    por el texto `producto`, que además cambia si se renombra el producto).
+    El trigger completa el id en los INSERT que sólo traen el nombre; las
+    filas viejas las completa backfill_producto_id() por tandas.
+    """
+    def paso(conn):
+        add_column(conn, "ventas", "producto_id", "INTEGER")
+        if indice_nombre:
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_productos_nombre ON productos(nombre)")
+        # (producto_id, fecha) también sirve donde se usaba sólo producto_id
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_ventas_producto_fecha ON ventas(producto_id, fecha)")
+        conn.execute("DROP INDEX IF EXISTS idx_ventas_producto_id")
+        conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_ventas_producto_id
+          AFTER INSERT ON ventas WHEN NEW.producto_id IS NULL
+          BEGIN
+            UPDATE ventas SET producto_id = (SELECT MIN(id) FROM productos WHERE nombre = NEW.producto)
+            WHERE rowid = NEW.rowid;
+          END""")
+    return paso
+
+def backfill_producto_id(conn: sqlite3.Connection, tanda: int = None) -> int:
+    """
+    Completa ventas.producto_id por nombre en tandas de BACKFILL_TANDA filas
+    (5000), cada una en su transacción: no retiene el lock de escritura y si
+    se corta se retoma donde quedó (sólo mira filas con producto_id NULL).
+    Las ventas de productos que ya no existen quedan en NULL y los reportes
+    las agrupan por nombre. Devuelve cuántas filas completó.
+
+    Al terminar queda config 'backfill_producto_id' = 'hecho' y no vuelve a
+    correr: las ventas nuevas ya traen el id (trigger trg_ventas_producto_id)
+    y las de productos borrados no se completan nunca, así que re-escanearlas
+    en cada arranque no sirve de nada.
+    """
+    tanda = tanda or int(os.getenv("BACKFILL_TANDA", "5000"))
+    if conn.in_transaction:
+        conn.commit()
+    hecho = conn.execute("SELECT valor FROM config WHERE clave = 'backfill_producto_id'").fetchone()
+    if hecho and hecho[0] == "hecho":
+        return 0
+    completadas, ultimo = 0, 0
+    while True:
+        filas = conn.execute(
+            "SELECT rowid FROM ventas WHERE producto_id IS NULL AND rowid > ? ORDER BY rowid LIMIT ?",
+            (ultimo, tanda)).fetchall()
+        if not filas:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO config (clave, valor) VALUES ('backfill_producto_id', 'hecho')")
+            return completadas
+        with conn:
+            completadas += conn.execute(
+                """UPDATE ventas SET producto_id = (SELECT MIN(id) FROM productos p WHERE p.nombre = ventas.producto)
+                   WHERE rowid BETWEEN ? AND ? AND producto_id IS NULL
+                     AND EXISTS (SELECT 1 FROM productos p WHERE p.nombre = ventas.producto)""",
+                (filas[0][0], filas[-1][0])).rowcount
+        ultimo = filas[-1][0]
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+# -------------------------------
+# Runner
+# -------------------------------
+
+def migrate(conn: sqlite3.Connection, migraciones) -> int:
+    """
+    Aplica las migraciones pendientes y devuelve la versión final.
+    `migraciones` es una lista ordenada de (version, descripcion, paso), donde
+    `paso` es una lista de sentencias SQL o una función paso(conn).
+    """
+    objetivo = migraciones[-1][0]
+    actual = schema_version(conn)
+    if actual >= objetivo:
+        return actual
+
+    if conn.in_transaction:
+        conn.commit()
+    # IMMEDIATE: toma el lock de escritura antes de releer la versión, así dos
+    # workers arrancando a la vez no aplican el mismo paso dos veces.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        actual = schema_version(conn)
+        for version, _descripcion, paso in migraciones:
+            if version <= actual:
+                continue
+            if callable(paso):
+                paso(conn)
+            else:
+                for sql in paso:
+                    conn.execute(sql)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            actual = version
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return actual
+
+# ============================================================
+# inventario.db (wsgi.py)
+# ============================================================
+
+def _inv_base(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS productos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        categoria TEXT,
+        precio_unitario REAL,
+        cantidad_stock INTEGER,
+        proveedor TEXT,
+        fecha_registro TEXT,
+        codigo_barras TEXT UNIQUE
+    )''')
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_productos_busqueda
+                    ON productos (nombre, categoria, codigo_barras)""")
+    conn.execute('''CREATE TABLE IF NOT EXISTS ventas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha TEXT,
+        producto TEXT,
+        cantidad INTEGER,
+        precio_unit REAL,
+        total REAL,
+        modo TEXT
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS gastos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha TEXT,
+        motivo TEXT,
+        monto REAL
+    )''')
+    conn.execute("""CREATE TABLE IF NOT EXISTS config (
+        clave TEXT PRIMARY KEY,
+        valor TEXT
+    )""")
+
+def _inv_columnas(conn):
+    # Antes eran ALTER TABLE dentro de try/except en crear_base_datos()
+    add_column(conn, "productos", "precio_paquete", "REAL")
+    add_column(conn, "productos", "unidades_por_paquete", "INTEGER")
+    add_column(conn, "ventas", "producto_id", "INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ventas_producto_id ON ventas(producto_id)")
+    conn.execute("INSERT OR IGNORE INTO config (clave, valor) VALUES ('umbral_bajo_stock', '5')")
+
+_INV_KARDEX = [
+    """CREATE TABLE IF NOT EXISTS stock_movimientos (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      fecha TEXT NOT NULL,
+      producto_id INTEGER NOT NULL,
+      tipo TEXT NOT NULL CHECK (tipo IN ('venta','reposicion','ajuste')),
+      referencia TEXT,
+      cantidad_unidades INTEGER NOT NULL,
+      precio_unit REAL,
+      costo_unit REAL,
+      FOREIGN KEY(producto_id) REFERENCES productos(id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_mov_productofecha ON stock_movimientos(producto_id, fecha)",
+    """CREATE TABLE IF NOT EXISTS reposiciones (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      fecha TEXT NOT NULL,
+      producto_id INTEGER NOT NULL,
+      cantidad INTEGER NOT NULL,
+      costo_unit REAL,
+      proveedor TEXT,
+      FOREIGN KEY(producto_id) REFERENCES productos(id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_repo_productofecha ON reposiciones(producto_id, fecha)",
+]
+
+# Antes: migracion_fase2.py
+_INV_FASE2 = [
+    """CREATE TABLE IF NOT EXISTS proveedores (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      nombre TEXT NOT NULL,
+      telefono TEXT, email TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS compras (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      fecha TEXT NOT NULL,
+      proveedor_id INTEGER,
+      total REAL,
+      FOREIGN KEY(proveedor_id) REFERENCES proveedores(id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS compra_items (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      compra_id INTEGER NOT NULL,
+      producto_id INTEGER NOT NULL,
+      cantidad INTEGER NOT NULL,
+      costo_unit REAL NOT NULL,
+      subtotal REAL NOT NULL,
+      FOREIGN KEY(compra_id) REFERENCES compras(id),
+      FOREIGN KEY(producto_id) REFERENCES productos(id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_compra_items_compra ON compra_items(compra_id)",
+    "CREATE INDEX IF NOT EXISTS idx_compra_items_producto ON compra_items(producto_id)",
+    """CREATE TABLE IF NOT EXISTS ventas_enc (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      fecha TEXT NOT NULL,
+      total REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS venta_items (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      venta_id INTEGER NOT NULL,
+      producto_id INTEGER NOT NULL,
+      modo TEXT,
+      cantidad INTEGER NOT NULL,
+      unidades INTEGER NOT NULL,
+      precio_unit REAL NOT NULL,
+      subtotal REAL NOT NULL,
+      FOREIGN KEY(venta_id) REFERENCES ventas_enc(id),
+      FOREIGN KEY(producto_id) REFERENCES productos(id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_venta_items_venta ON venta_items(venta_id)",
+    "CREATE INDEX IF NOT EXISTS idx_venta_items_producto ON venta_items(producto_id)",
+]
+
+def _inv_usuarios(conn):
+    # Antes: ensure_login_tables() en wsgi.py y migracion_login.py.
+    # El hash (scrypt) sólo se paga la única vez que corre este paso.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS usuarios (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      username TEXT UNIQUE NOT NULL,
+      password_hash TEXT NOT NULL,
+      rol TEXT NOT NULL DEFAULT 'admin',
+      activo INTEGER NOT NULL DEFAULT 1,
+      creado_en TEXT NOT NULL
+    )""")
+    existe = conn.execute("SELECT COUNT(*) FROM usuarios WHERE username='admin'").fetchone()[0]
+    if existe == 0:
+        from werkzeug.security import generate_password_hash
+        conn.execute("""INSERT INTO usuarios (username, password_hash, rol, activo, creado_en)
+                        VALUES ('admin', ?, 'admin', 1, datetime('now'))""",
+                     (generate_password_hash("admin123"),))
+
+# Rangos de reportes: `fecha >= ? AND fecha < ?` (ver app/reports.py)
+_INDICES_FECHA = [
+    "CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON ventas(fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_gastos_fecha ON gastos(fecha)",
+]
+
+# Resultado de app/analytics.py (se reescribe entero en cada refresco)
+_ANALITICA = [
+    """CREATE TABLE IF NOT EXISTS analitica_inventario (
+      producto_id INTEGER PRIMARY KEY,
+      nombre TEXT,
+      categoria TEXT,
+      stock REAL,
+      unidades_vendidas REAL,
+      ingresos REAL,
+      participacion REAL,
+      clase_abc TEXT,
+      rotacion REAL,
+      dias_cobertura REAL,
+      valor_stock REAL,
+      ultima_venta TEXT,
+      sin_movimiento INTEGER,
+      calculado_en TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_analitica_clase ON analitica_inventario(clase_abc, ingresos)",
+    # Sin triggers por fila (serían 2 por producto en cada refresco): la
+    # versión la sube analytics.guardar() una vez por refresco
+    "INSERT OR IGNORE INTO data_versions (tabla, version) VALUES ('analitica_inventario', 0)",
+]
+
+def _inv_pronosticos(conn):
+    # Compras sugeridas por app/forecast.py: quedan en 'borrador' hasta confirmarlas
+    add_column(conn, "compras", "estado", "TEXT NOT NULL DEFAULT 'confirmada'")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_compras_estado ON compras(estado)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS pronosticos (
+      producto_id INTEGER PRIMARY KEY,
+      nivel REAL NOT NULL,
+      desvio REAL NOT NULL,
+      dia_base TEXT NOT NULL,
+      punto_pedido REAL,
+      cantidad_sugerida INTEGER,
+      actualizado_en TEXT,
+      FOREIGN KEY(producto_id) REFERENCES productos(id)
+    )""")
+
+def _inv_ventas_detalle(conn):
+    # Copia de `ventas` en el modelo encabezado/detalle (app/sales_backfill.py):
+    # origen_venta_id enlaza la copia con su venta y evita copiarla dos veces
+    add_column(conn, "ventas_enc", "origen_venta_id", "INTEGER")
+    conn.execute("""CREATE UNIQUE INDEX IF NOT EXISTS idx_ventas_enc_origen
+                    ON ventas_enc(origen_venta_id) WHERE origen_venta_id IS NOT NULL""")
+    # Índices que cubren los reportes: rango por fecha con el total y el id
+    # para el join, y del detalle sólo producto y cantidad
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ventas_enc_fecha ON ventas_enc(fecha, total, id)")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_venta_items_reporte
+                    ON venta_items(venta_id, producto_id, cantidad)""")
+    conn.execute("DROP INDEX IF EXISTS idx_venta_items_venta")
+    for sql in month_version_steps("ventas_enc"):
+        conn.execute(sql)
+
+# Registro de app/archive.py: años mudados a su archivo y lo que se llevó cada lote
+_ARCHIVO = [
+    """CREATE TABLE IF NOT EXISTS archivos (
+      anio INTEGER PRIMARY KEY,
+      archivo TEXT NOT NULL,
+      creado_en TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS archivo_lotes (
+      lote INTEGER PRIMARY KEY,
+      anio INTEGER NOT NULL,
+      mes TEXT NOT NULL,
+      archivado_en TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_archivo_lotes_anio ON archivo_lotes(anio, lote)",
+    """CREATE TABLE IF NOT EXISTS archivo_resumen (
+      lote INTEGER NOT NULL,
+      tabla TEXT NOT NULL,
+      filas INTEGER NOT NULL,
+      total REAL NOT NULL,
+      PRIMARY KEY (lote, tabla)
+    )""",
+]
+
+# Claves de idempotencia de /api/sync y del formulario de venta (app/sync.py)
+_SYNC = [
+    """CREATE TABLE IF NOT EXISTS sync_claves (
+      clave TEXT PRIMARY KEY,
+      terminal TEXT,
+      tipo TEXT NOT NULL,
+      resultado TEXT NOT NULL,
+      creado_en TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_sync_claves_creado ON sync_claves(creado_en)",
+]
+
+# Valuación incremental del stock (app/valuation.py): estado por producto,
+# capas FIFO abiertas y resultados por mes
+_VALUACION = [
+    """CREATE TABLE IF NOT EXISTS valuacion (
+      producto_id INTEGER PRIMARY KEY,
+      unidades REAL NOT NULL DEFAULT 0,
+      valor REAL NOT NULL DEFAULT 0,
+      costo_promedio REAL NOT NULL DEFAULT 0,
+      valor_fifo REAL,
+      actualizado_en TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS valuacion_capas (
+      id INTEGER PRIMARY KEY,
+      producto_id INTEGER NOT NULL,
+      mov_id INTEGER NOT NULL,
+      fecha TEXT NOT NULL,
+      restantes REAL NOT NULL,
+      costo_unit REAL NOT NULL
+    )""",
+    # Sólo quedan las capas con saldo: las agotadas se borran al consumirlas
+    "CREATE INDEX IF NOT EXISTS idx_valuacion_capas_producto ON valuacion_capas(producto_id, id)",
+    """CREATE TABLE IF NOT EXISTS valuacion_mensual (
+      mes TEXT NOT NULL,
+      producto_id INTEGER NOT NULL,
+      unidades REAL NOT NULL DEFAULT 0,
+      ingresos REAL NOT NULL DEFAULT 0,
+      costo REAL NOT NULL DEFAULT 0,
+      costo_fifo REAL,
+      ajustes REAL NOT NULL DEFAULT 0,
+      PRIMARY KEY (mes, producto_id)
+    )""",
+    # Una versión para las tres tablas: la sube valuation.aplicar() una vez por llamada
+    "INSERT OR IGNORE INTO data_versions (tabla, version) VALUES ('valuacion', 0)",
+]
+
+MIGRACIONES_INVENTARIO = [
+    (1, "tablas base", _inv_base),
+    (2, "columnas de paquete y ventas.producto_id", _inv_columnas),
+    (3, "kardex y reposiciones", _INV_KARDEX),
+    (4, "fase 2: proveedores, compras y ventas con detalle", _INV_FASE2),
+    (5, "usuarios y admin por defecto", _inv_usuarios),
+    (6, "versión de datos de productos", data_version_steps("productos")),
+    (7, "versiones de datos para ETag", data_version_steps(
+        "ventas", "gastos", "config", "stock_movimientos", "reposiciones",
+        "proveedores", "compras", "compra_items", "ventas_enc", "venta_items")),
+    (8, "índices por fecha para rangos de reportes", _INDICES_FECHA),
+    (9, "versión por mes para el motor de reportes", month_version_steps("ventas", "gastos", "reposiciones")),
+    (10, "analítica de inventario (ABC, rotación, cobertura)",
+     _ANALITICA),
+    (11, "pronósticos de demanda y compras en borrador", _inv_pronosticos),
+    (12, "conjunto de bajo stock mantenido por triggers", low_stock_steps("cantidad_stock")),
+    (13, "ventas.producto_id como clave de reportes", ventas_producto_id_steps(indice_nombre=False)),
+    (14, "ventas_enc enlazada con ventas e índices de reportes", _inv_ventas_detalle),
+    (15, "registro del archivo por año", _ARCHIVO),
+    (16, "claves de idempotencia de la sincronización", _SYNC),
+    (17, "valuación de stock y costo de lo vendido", _VALUACION),
+]
+
+# ============================================================
+# data/app.db (create_app)
+# ============================================================
+
+_USUARIOS_MINIMO = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT UNIQUE NOT NULL,
+    nombre TEXT NOT NULL,
+    pass_hash TEXT NOT NULL
+)"""
+
+def _split_sql(script: str):
+    """Separa un .sql simple (sin triggers) en sentencias sueltas."""
+    return [s.strip() for s in script.split(";") if s.strip()]
+
+def _app_schema(conn):
+    # Import local: db.py importa este módulo en init_db_if_needed
+    from .db import _resource_path
+    schema_file = _resource_path("scripts/schema.sql")
+    if not schema_file.exists():
+        # Fallback defensivo por si no se empacó el schema: crea sólo usuarios
+        conn.execute(_USUARIOS_MINIMO)
+        return
+    # No se usa executescript(): hace COMMIT implícito y rompería la transacción
+    for sql in _split_sql(schema_file.read_text(encoding="utf-8")):
+        conn.execute(sql)
+
+def _app_admin(conn):
+    # Admin por defecto (admin@example.com / admin123). Antes se comprobaba en
+    # cada create_app(); como paso de migración corre una sola vez por base y
+    # el hash (scrypt) sólo se calcula si hace falta.
+    row = conn.execute("SELECT id FROM usuarios WHERE email=?", ("admin@example.com",)).fetchone()
+    if not row:
+        from werkzeug.security import generate_password_hash
+        conn.execute(
+            "INSERT INTO usuarios (email, nombre, pass_hash) VALUES (?,?,?)",
+            ("admin@example.com", "Admin", generate_password_hash("admin123")),
+        )
+
+_APP_CONFIG = [
+    """CREATE TABLE IF NOT EXISTS config (
+      clave TEXT PRIMARY KEY,
+      valor TEXT
+    )""",
+    "INSERT OR IGNORE INTO config (clave, valor) VALUES ('umbral_bajo_stock', '5')",
+]
+
+MIGRACIONES_APP = [
+    (1, "scripts/schema.sql", _app_schema),
+    (2, "admin por defecto", _app_admin),
+    (3, "versión de datos de productos", data_version_steps("productos")),
+    (4, "versiones de datos para ETag", data_version_steps("ventas", "gastos", "reposiciones")),
+    (5, "índices por fecha para rangos de reportes", _INDICES_FECHA),
+    (6, "versión por mes para el motor de reportes", month_version_steps("ventas", "gastos", "reposiciones")),
+    (7, "analítica de inventario (ABC, rotación, cobertura)",
+     _ANALITICA),
+    (8, "umbral de bajo stock en config", _APP_CONFIG + data_version_steps("config")),
+    (9, "conjunto de bajo stock mantenido por triggers", low_stock_steps("cantidad")),
+    (10, "ventas.producto_id como clave de reportes", ventas_producto_id_steps(indice_nombre=True)),
+    (11, "registro del archivo por año", _ARCHIVO),
+]
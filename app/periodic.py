@@ -0,0 +1,59 @@
+# app/periodic.py
+"""
+Tareas periódicas en un hilo daemon del worker.
+
+    tarea = Periodico("analytics", lambda: refresh(db), 3600, db + ".analytics.lock")
+    tarea.start()
+
+- El hilo nace en el proceso que lo usa (después del fork de gunicorn).
+- Con varios workers corre uno solo a la vez: flock no bloqueante sobre
+  `candado`; el que no lo consigue saltea esa vuelta.
+- Una tarea que falla se registra y se reintenta en la próxima vuelta.
+"""
+import logging
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso, no hace falta
+    fcntl = None
+
+log = logging.getLogger("periodic")
+
+class Periodico:
+    def __init__(self, nombre: str, tarea, intervalo: float, candado: str, espera: float = None):
+        self.nombre = nombre
+        self.tarea = tarea
+        self.intervalo = float(intervalo)
+        self.candado = candado
+        # Cada cuánto se despierta a preguntar (la tarea decide si hay trabajo)
+        self.espera = float(espera if espera is not None else max(self.intervalo / 4, 1))
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def tick(self) -> bool:
+        """Corre la tarea si nadie más la está corriendo; True si hizo algo."""
+        with open(self.candado, "a") as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return False  # otro worker ya está en eso
+            return bool(self.tarea())
+
+    def _loop(self):
+        while True:
+            try:
+                self.tick()
+            except Exception:
+                # Cualquier error (pandas, un valor de config roto...): el hilo
+                # no puede morir, o la tarea no vuelve a correr hasta reiniciar
+                log.exception("Falló la tarea periódica %s", self.nombre)
+            time.sleep(self.espera)
+
+    def start(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._loop, name=self.nombre, daemon=True)
+                self._hilo.start()
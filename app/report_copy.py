@@ -0,0 +1,109 @@
+# app/report_copy.py
+"""
+Copia de la base para reportes pesados, refrescada con la API de backup.
+
+Con REPORT_COPY=1 las exportaciones y el reporte de reposiciones leen de
+una copia junto a la base en vez del archivo vivo: su carga no comparte ni
+páginas de caché ni locks con las ventas. A cambio pueden ir hasta
+REPORT_COPY_INTERVAL segundos (300) atrasados.
+
+- La copia se arma en <base>.report.db.tmp y se publica con nombre nuevo,
+  <base>.report.<ms>.db: nunca se reemplaza un archivo que un reporte puede
+  tener abierto (en Windows os.replace() falla sobre uno abierto). Se
+  conservan las dos últimas; las más viejas se borran cuando se puede.
+- Se abre con mode=ro&immutable=1: sin locks ni lecturas del WAL.
+- El refresco es un Periodico (app/periodic.py): con varios workers sólo
+  uno copia (flock sobre <base>.report.db.lock).
+"""
+import glob
+import logging
+import os
+import sqlite3
+import time
+
+from .periodic import Periodico
+
+log = logging.getLogger("report_copy")
+
+def enabled() -> bool:
+    return os.getenv("REPORT_COPY", "0").lower() in ("1", "true", "yes", "on")
+
+class ReportCopy:
+    CONSERVAR = 2
+
+    def __init__(self, origen: str, destino: str = None, intervalo: float = None):
+        self.origen = origen
+        # Raíz de los nombres: <destino sin .db>.<ms>.db, .tmp y .lock
+        self.destino = destino or os.path.splitext(origen)[0] + ".report.db"
+        self.intervalo = float(intervalo or os.getenv("REPORT_COPY_INTERVAL", "300"))
+        self._periodico = Periodico("report-copy", self._copiar, self.intervalo, self.destino + ".lock")
+
+    def _publicadas(self) -> list:
+        """[(sello en ms, ruta)] de las copias publicadas, de la más vieja a la más nueva."""
+        raiz, ext = os.path.splitext(self.destino)
+        publicadas = []
+        for ruta in glob.glob(glob.escape(raiz) + ".*" + ext):
+            sello = ruta[len(raiz) + 1:-len(ext)]
+            if sello.isdigit():
+                publicadas.append((int(sello), ruta))
+        return sorted(publicadas)
+
+    def actual(self):
+        """La copia más nueva, o None si todavía no hay."""
+        publicadas = self._publicadas()
+        return publicadas[-1][1] if publicadas else None
+
+    def _vigente(self) -> bool:
+        publicadas = self._publicadas()
+        return bool(publicadas) and time.time() - publicadas[-1][0] / 1000 < self.intervalo
+
+    def _copiar(self) -> bool:
+        if self._vigente():
+            return False
+        t0 = time.perf_counter()
+        tmp = self.destino + ".tmp"
+        src = sqlite3.connect(f"file:{self.origen}?mode=ro", uri=True)
+        dst = sqlite3.connect(tmp)
+        try:
+            # Por tandas, cediendo entre páginas: no acapara la E/S de la caja
+            src.backup(dst, pages=512, sleep=0.002)
+            # La copia no usa WAL: así se puede abrir inmutable sin -shm
+            dst.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            dst.close()
+            src.close()
+        raiz, ext = os.path.splitext(self.destino)
+        publicadas = self._publicadas()
+        sello = max(time.time_ns() // 1_000_000, publicadas[-1][0] + 1 if publicadas else 0)
+        os.replace(tmp, f"{raiz}.{sello}{ext}")
+        self._limpiar()
+        log.info("Copia de reportes actualizada en %.0f ms", (time.perf_counter() - t0) * 1000)
+        return True
+
+    def _limpiar(self):
+        # La anterior queda por si un reporte la eligió justo antes de publicar
+        for _, vieja in self._publicadas()[:-self.CONSERVAR]:
+            try:
+                os.remove(vieja)
+            except OSError:
+                pass  # Windows: todavía abierta; se reintenta en el próximo refresco
+
+    def refresh(self) -> bool:
+        """Rehace la copia si está vencida y nadie más la está rehaciendo."""
+        return self._periodico.tick()
+
+    def path(self) -> str:
+        """Ruta para leer: la copia más nueva si ya hay; si no, la base viva."""
+        self._periodico.start()
+        return self.actual() or self.origen
+
+_copias = {}
+
+def report_path(origen: str) -> str:
+    """Base a usar para reportes pesados según REPORT_COPY."""
+    if not enabled():
+        return origen
+    copia = _copias.get(origen)
+    if copia is None:
+        copia = _copias.setdefault(origen, ReportCopy(origen))
+    return copia.path()
@@ -0,0 +1,234 @@
+# app/report_engine.py
+"""
+Motor de reportes por particiones mensuales.
+
+Un rango largo (p.ej. año contra año) se parte en meses; cada mes calcula
+sus parciales en un pool de procesos sobre conexiones de sólo lectura y
+después se suman:
+    totales        ventas/gastos (suma y cantidad)
+    por_dia        total vendido por día
+    por_producto   unidades vendidas por producto_id (el top N sale de la suma;
+                   los nombres se ponen al final, con el catálogo actual)
+    reposiciones   unidades y valorización (cantidad * costo_unit)
+
+Los meses cerrados se cachean por (mes, versión del mes): la versión la
+mantienen triggers sobre ventas/gastos/reposiciones (migrations.
+month_version_steps), así que sólo se recalcula un mes si se tocó. En
+inventario.db ventas_enc también lleva versión por mes.
+
+    res = resumen(DB_PATH, date(2023, 1, 1), date(2024, 12, 31))
+
+REPORT_PROCESSES fija el tamaño del pool (por defecto min(4, núcleos));
+0 calcula todo en el proceso actual.
+
+Dentro de un request con @query_budget los meses heredan el presupuesto
+(budget.limite_reloj): cada conexión del pool aborta al vencer, la espera
+de los resultados no pasa del límite y lo que quedaba en cola se cancela.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturoVencido
+from datetime import date, timedelta
+from multiprocessing import get_context
+from pathlib import Path
+
+from jinja2.utils import LRUCache
+
+from . import archive
+from .db import nombres_producto, ventas_detalle
+
+_cache = LRUCache(int(os.getenv("REPORT_CACHE_MESES", "240")))
+_cache_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+def _connect_ro(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(f"file:{Path(db_path).as_posix()}?mode=ro", uri=True)
+    conn.execute("PRAGMA query_only=1")
+    return conn
+
+# ---------- Particiones ----------
+def particionar(desde: date, hasta: date):
+    """[(inicio, fin)] por mes calendario, inclusivos y recortados al rango."""
+    partes = []
+    d = desde
+    while d <= hasta:
+        sig = date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+        partes.append((d, min(hasta, sig - timedelta(days=1))))
+        d = sig
+    return partes
+
+def _mes_cerrado(inicio: date, hoy: date) -> bool:
+    return (inicio.year, inicio.month) < (hoy.year, hoy.month)
+
+# ---------- Parcial de un mes (corre en el pool) ----------
+_POR_PRODUCTO = """
+    SELECT producto_id, CASE WHEN producto_id IS NULL THEN producto END AS nombre,
+           COALESCE(SUM(cantidad),0)
+    FROM ventas WHERE fecha >= ? AND fecha < ? GROUP BY producto_id, nombre"""
+
+_POR_PRODUCTO_DETALLE = """
+    SELECT vi.producto_id, NULL, COALESCE(SUM(vi.cantidad),0)
+    FROM ventas_enc e JOIN venta_items vi ON vi.venta_id = e.id
+    WHERE e.fecha >= ? AND e.fecha < ? GROUP BY vi.producto_id"""
+
+def calcular_parcial(db_path: str, inicio: str, fin_exclusivo: str, detalle: bool = False,
+                     limite: float = None) -> dict:
+    """
+    Agregados de [inicio, fin_exclusivo). Función de módulo: se envía al pool.
+    Con `detalle` las ventas salen de ventas_enc/venta_items (db.ventas_detalle).
+    Con `limite` (time.time()) las consultas se abortan al pasarlo.
+    """
+    ventas = "ventas_enc" if detalle else "ventas"
+    conn = _connect_ro(db_path)
+    if limite is not None:
+        conn.set_progress_handler(lambda: time.time() > limite, 10000)
+    try:
+        # Un mes de un año archivado se lee de su archivo (app/archive.py)
+        with archive.rango(conn, db_path, inicio, inicio):
+            lim = (inicio, fin_exclusivo)
+            tv, nv = conn.execute(
+                f"SELECT COALESCE(SUM(total),0), COUNT(*) FROM {ventas} WHERE fecha >= ? AND fecha < ?", lim
+            ).fetchone()
+            tg, ng = conn.execute(
+                "SELECT COALESCE(SUM(monto),0), COUNT(*) FROM gastos WHERE fecha >= ? AND fecha < ?", lim
+            ).fetchone()
+            por_dia = dict(conn.execute(
+                f"""SELECT substr(fecha, 1, 10) AS dia, COALESCE(SUM(total),0)
+                   FROM {ventas} WHERE fecha >= ? AND fecha < ? GROUP BY dia""", lim
+            ).fetchall())
+            # Clave producto_id; el nombre sólo para ventas sin id (producto borrado)
+            por_producto = {pid if pid is not None else nombre: cant for pid, nombre, cant in conn.execute(
+                _POR_PRODUCTO_DETALLE if detalle else _POR_PRODUCTO, lim
+            )}
+            ru, rv = conn.execute(
+                """SELECT COALESCE(SUM(cantidad),0), COALESCE(SUM(cantidad * COALESCE(costo_unit,0)),0)
+                   FROM reposiciones WHERE fecha >= ? AND fecha < ?""", lim
+            ).fetchone()
+    finally:
+        conn.close()
+    return {
+        "ventas": float(tv or 0), "n_ventas": nv, "gastos": float(tg or 0), "n_gastos": ng,
+        "por_dia": {k: float(v or 0) for k, v in por_dia.items()},
+        "por_producto": {k: float(v or 0) for k, v in por_producto.items()},
+        "repo_unidades": float(ru or 0), "repo_valor": float(rv or 0),
+    }
+
+# ---------- Pool ----------
+def _processes() -> int:
+    return int(os.getenv("REPORT_PROCESSES", min(4, os.cpu_count() or 1)))
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: los workers de gunicorn tienen hilos, fork() desde ahí no es seguro
+            _pool = ProcessPoolExecutor(max_workers=_processes(), mp_context=get_context("spawn"))
+        return _pool
+
+def _reset_after_fork():
+    global _pool
+    _pool = None   # el pool del padre no sirve en el hijo
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+# ---------- Fusión ----------
+def _versiones_mes(db_path: str, meses) -> dict:
+    conn = _connect_ro(db_path)
+    try:
+        marcas = ",".join("?" for _ in meses)
+        try:
+            return dict(conn.execute(
+                f"SELECT mes, version FROM meses_version WHERE mes IN ({marcas})", list(meses)
+            ).fetchall())
+        except sqlite3.OperationalError:   # base sin la migración
+            return {}
+    finally:
+        conn.close()
+
+def resumen(db_path: str, desde: date, hasta: date, top: int = 5, hoy: date = None) -> dict:
+    parciales_mes, nombres = parciales(db_path, desde, hasta, hoy)
+    return fusionar(parciales_mes, top, nombres)
+
+def parciales(db_path: str, desde: date, hasta: date, hoy: date = None, limite: float = None):
+    """
+    ([parcial por mes], {id: nombre}) sin fusionar: app/stores.py suma los
+    de varias tiendas, que no comparten ids de producto. `limite` (time.time())
+    por defecto es el del presupuesto del request en curso, si lo hay.
+    """
+    hoy = hoy or date.today()
+    if limite is None:
+        from .budget import limite_reloj
+        limite = limite_reloj()
+    partes = particionar(desde, hasta)
+    versiones = _versiones_mes(db_path, {p[0].strftime("%Y-%m") for p in partes})
+    conn = _connect_ro(db_path)
+    try:
+        detalle = ventas_detalle(conn)
+        nombres = nombres_producto(conn)
+    finally:
+        conn.close()
+
+    hechos, pendientes = [], []
+    for inicio, fin in partes:
+        clave = None
+        if _mes_cerrado(inicio, hoy):
+            mes = inicio.strftime("%Y-%m")
+            clave = (db_path, inicio, fin, versiones.get(mes, 0), detalle)
+            with _cache_lock:
+                hit = _cache.get(clave)
+            if hit is not None:
+                hechos.append(hit)
+                continue
+        pendientes.append((clave, inicio.isoformat(), (fin + timedelta(days=1)).isoformat()))
+
+    if len(pendientes) > 1 and _processes() > 0:
+        pool = _get_pool()
+        futuros = [pool.submit(calcular_parcial, db_path, a, b, detalle, limite) for _, a, b in pendientes]
+        try:
+            calculados = [f.result(timeout=None if limite is None else max(limite - time.time(), 0))
+                          for f in futuros]
+        except (FuturoVencido, sqlite3.OperationalError):
+            # Los meses que siguen en cola no llegan a empezar
+            for f in futuros:
+                f.cancel()
+            if limite is not None and time.time() >= limite:
+                raise sqlite3.OperationalError("interrupted") from None
+            raise
+    else:
+        calculados = [calcular_parcial(db_path, a, b, detalle, limite) for _, a, b in pendientes]
+
+    for (clave, _, _), parcial in zip(pendientes, calculados):
+        if clave is not None:
+            with _cache_lock:
+                _cache[clave] = parcial
+        hechos.append(parcial)
+    return hechos, nombres
+
+def fusionar(parciales, top: int = 5, nombres: dict = None) -> dict:
+    """Suma los parciales; `nombres` ({id: nombre}) etiqueta el top por producto_id."""
+    nombres = nombres or {}
+    tot = Counter()
+    por_dia, por_producto = Counter(), Counter()
+    for p in parciales:
+        for k in ("ventas", "n_ventas", "gastos", "n_gastos", "repo_unidades", "repo_valor"):
+            tot[k] += p[k]
+        por_dia.update(p["por_dia"])
+        por_producto.update(p["por_producto"])
+    dias = sorted(por_dia)
+    etiquetas = [(str(nombres.get(k, k)), v) for k, v in por_producto.items()]
+    mejores = sorted(etiquetas, key=lambda kv: (-kv[1], kv[0]))[:top]
+    return {
+        "totales": {
+            "ventas": round(tot["ventas"], 2), "gastos": round(tot["gastos"], 2),
+            "neta": round(tot["ventas"] - tot["gastos"], 2),
+            "n_ventas": int(tot["n_ventas"]), "n_gastos": int(tot["n_gastos"]),
+        },
+        "por_dia": {"labels": dias, "values": [round(por_dia[d], 2) for d in dias]},
+        "top": {"labels": [k for k, _ in mejores], "values": [v for _, v in mejores]},
+        "reposiciones": {"unidades": tot["repo_unidades"], "valor": round(tot["repo_valor"], 2)},
+    }
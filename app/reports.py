@@ -0,0 +1,139 @@
+# app/reports.py
+"""
+Consultas de los tableros (totales, ventas por día, top productos) y la API
+JSON que las expone. Sirve a create_app() y a wsgi.py: las dos bases tienen
+ventas(fecha, producto, producto_id, cantidad, total) y gastos(fecha, monto).
+En inventario.db, una vez copiado el historial (app/sales_backfill.py), las
+ventas se leen de ventas_enc/venta_items (ver db.ventas_detalle).
+
+Los rangos se filtran con `fecha >= desde AND fecha < hasta+1día`:
+  - usa el índice sobre fecha (date(fecha) BETWEEN ... no puede),
+  - incluye las ventas con hora del último día ('2024-05-31 18:20:00').
+
+Las respuestas son columnares y compactas, listas para Chart.js:
+    {"desde": "...", "hasta": "...", "labels": [...], "values": [...]}
+"""
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
+
+from flask import Blueprint, request
+
+from . import archive, report_engine
+from .budget import query_budget
+from .db import nombres_producto, ventas_detalle
+from .http_cache import conditional
+
+# ---------- Rangos ----------
+def rango_fechas(r, desde_arg="", hasta_arg="", hoy=None):
+    """('hoy'|'semana'|'mes'|otro, desde, hasta) -> (date desde, date hasta, etiqueta). Inclusivo."""
+    hoy = hoy or date.today()
+    if r == "hoy":
+        return hoy, hoy, "Hoy"
+    if r == "semana":
+        return hoy - timedelta(days=6), hoy, "Últimos 7 días"
+    if r == "mes":
+        return hoy.replace(day=1), hoy, "Mes actual"
+    try:
+        d = datetime.strptime(desde_arg, "%Y-%m-%d").date()
+        h = datetime.strptime(hasta_arg, "%Y-%m-%d").date()
+        if d > h:
+            d, h = h, d
+        return d, h, "Personalizado"
+    except (TypeError, ValueError):
+        return hoy.replace(day=1), hoy, "Mes actual"
+
+def _limites(desde, hasta):
+    """Rango inclusivo de días -> parámetros de `fecha >= ? AND fecha < ?`."""
+    return desde.isoformat(), (hasta + timedelta(days=1)).isoformat()
+
+# ---------- Consultas ----------
+def _tabla_ventas(conn) -> str:
+    # ventas_enc tiene las mismas columnas fecha y total que ventas
+    return "ventas_enc" if ventas_detalle(conn) else "ventas"
+
+def totales(conn, desde, hasta) -> dict:
+    lim = _limites(desde, hasta)
+    tv, nv = conn.execute(
+        f"SELECT COALESCE(SUM(total),0), COUNT(*) FROM {_tabla_ventas(conn)} WHERE fecha >= ? AND fecha < ?", lim
+    ).fetchone()
+    tg, ng = conn.execute(
+        "SELECT COALESCE(SUM(monto),0), COUNT(*) FROM gastos WHERE fecha >= ? AND fecha < ?", lim
+    ).fetchone()
+    tv, tg = float(tv or 0), float(tg or 0)
+    return {
+        "ventas": round(tv, 2), "gastos": round(tg, 2), "neta": round(tv - tg, 2),
+        "n_ventas": nv, "n_gastos": ng,
+    }
+
+def ventas_por_dia(conn, desde, hasta) -> dict:
+    rows = conn.execute(
+        f"""SELECT substr(fecha, 1, 10) AS dia, COALESCE(SUM(total),0)
+           FROM {_tabla_ventas(conn)} WHERE fecha >= ? AND fecha < ?
+           GROUP BY dia ORDER BY dia""",
+        _limites(desde, hasta),
+    ).fetchall()
+    return {"labels": [r[0] for r in rows], "values": [round(float(r[1] or 0), 2) for r in rows]}
+
+SQL_TOP = """
+    SELECT producto_id, CASE WHEN producto_id IS NULL THEN producto END AS nombre,
+           COALESCE(SUM(cantidad),0) AS cant
+    FROM ventas WHERE fecha >= ? AND fecha < ?
+    GROUP BY producto_id, nombre ORDER BY cant DESC LIMIT ?"""
+
+# Sólo índices: idx_ventas_enc_fecha (fecha, total, id) e idx_venta_items_reporte
+SQL_TOP_DETALLE = """
+    SELECT vi.producto_id, NULL AS nombre, COALESCE(SUM(vi.cantidad),0) AS cant
+    FROM ventas_enc e JOIN venta_items vi ON vi.venta_id = e.id
+    WHERE e.fecha >= ? AND e.fecha < ?
+    GROUP BY vi.producto_id ORDER BY cant DESC LIMIT ?"""
+
+def top_productos(conn, desde, hasta, limite=5) -> dict:
+    # Por producto_id (entero, estable ante renombres); el nombre sale del
+    # catálogo actual. Las ventas sin id (producto borrado) van por nombre.
+    sql = SQL_TOP_DETALLE if ventas_detalle(conn) else SQL_TOP
+    rows = conn.execute(sql, (*_limites(desde, hasta), limite)).fetchall()
+    nombres = nombres_producto(conn)
+    return {"labels": [str(nombres.get(r[0], r[1])) for r in rows],
+            "values": [float(r[2] or 0) for r in rows]}
+
+# ---------- API JSON ----------
+def api_blueprint(connect, login_required, close=True, db_path=None):
+    """
+    Blueprint 'api' con los datos de los tableros. Cada app pasa su conexión
+    y su login_required (Flask-Login en create_app, sesión en wsgi.py).
+    Los endpoints usan GET condicional (un refresh sin ventas nuevas es un 304)
+    y presupuesto de tiempo: un rango de años responde 503 en vez de colgarse.
+
+    Con `db_path` (callable -> ruta) los rangos de más de un mes se calculan
+    con app/report_engine.py: por mes, en paralelo y con los meses cerrados
+    cacheados.
+    """
+    bp = Blueprint("api", __name__, url_prefix="/api")
+
+    def endpoint(ruta, nombre, consulta, clave):
+        @login_required
+        @query_budget("interactive")
+        @conditional("ventas", "ventas_enc", "gastos", connect=connect, close=close)
+        def view():
+            desde, hasta, label = rango_fechas(
+                (request.args.get("r") or "mes").strip(),
+                (request.args.get("desde") or "").strip(),
+                (request.args.get("hasta") or "").strip(),
+            )
+            if db_path is not None and len(report_engine.particionar(desde, hasta)) > 1:
+                datos = report_engine.resumen(db_path(), desde, hasta)[clave]
+                return {"desde": desde.isoformat(), "hasta": hasta.isoformat(), "rango": label, **datos}
+            conn = connect()
+            try:
+                with archive.rango(conn, db_path(), desde, hasta) if db_path else nullcontext():
+                    datos = consulta(conn, desde, hasta)
+            finally:
+                if close:
+                    conn.close()
+            return {"desde": desde.isoformat(), "hasta": hasta.isoformat(), "rango": label, **datos}
+        bp.add_url_rule(ruta, nombre, view)
+
+    endpoint("/finanzas/totales", "totales", totales, "totales")
+    endpoint("/finanzas/ventas-por-dia", "ventas_por_dia", ventas_por_dia, "por_dia")
+    endpoint("/finanzas/top-productos", "top_productos", top_productos, "top")
+    return bp
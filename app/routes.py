@@ -1,44 +1,57 @@
 # app/routes.py
-from datetime import date, datetime, timedelta
 from io import StringIO
 import csv
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, Response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, Response, abort
 from flask_login import login_user, logout_user, current_user, login_required
-from werkzeug.security import check_password_hash
 
-from .db import get_db
+from .db import get_db, open_report_db, report_db_path, central_db_path
+from . import analytics, archive, metrics, stores
+from .budget import query_budget
+from .http_cache import conditional
+from .reports import rango_fechas
 from .user import User  # <--- *** CAMBIO CLAVE: importar desde user.py ***
 
 bp = Blueprint("main", __name__)
 
+def etag(*tablas):
+    """GET condicional según la versión de `tablas` (ver http_cache.py)."""
+    # get_db() es la conexión del request; la cierra el teardown
+    return conditional(*tablas, connect=get_db, close=False)
+
+def _report_db():
+    # Reportes pesados: conexión de sólo lectura (o la copia de REPORT_COPY)
+    return open_report_db(copia=True)
+
+def report_etag(*tablas):
+    """Como etag(), pero leyendo versiones de la misma base que el reporte."""
+    return conditional(*tablas, connect=_report_db)
+
+def _report_rows(sql, params, desde=None, hasta=None):
+    db = _report_db()
+    try:
+        # Años archivados del rango (app/archive.py); sin rango, todos
+        with archive.rango(db, report_db_path(), desde, hasta):
+            return db.execute(sql, params).fetchall()
+    finally:
+        db.close()
+
 # ---------- HOME (protegida: pide login primero) ----------
 @bp.route("/")
 @login_required
 def home():
-    """Dashboard principal: requiere iniciar sesión."""
-    db = get_db()
-
-    tv_row = db.execute("SELECT COALESCE(SUM(total),0) AS s FROM ventas").fetchone()
-    tg_row = db.execute("SELECT COALESCE(SUM(monto),0) AS s FROM gastos").fetchone()
-    total_ventas = float(tv_row["s"] if tv_row and tv_row["s"] is not None else 0)
-    total_gastos = float(tg_row["s"] if tg_row and tg_row["s"] is not None else 0)
-    ganancia_neta = total_ventas - total_gastos
-
-    ventas_rows = db.execute("SELECT fecha FROM ventas LIMIT 1000").fetchall()
-    gastos_rows = db.execute("SELECT fecha FROM gastos LIMIT 1000").fetchall()
-
-    hoy = date.today().isoformat()
+    """
+    Dashboard principal: requiere iniciar sesión. Sólo arma el esqueleto;
+    los KPIs llegan por /api/finanzas/totales (ver app/reports.py).
+    """
+    r = (request.args.get("r") or "hoy").strip()
+    desde, hasta, rango_label = rango_fechas(r, request.args.get("desde"), request.args.get("hasta"))
     return render_template(
         "inicio.html",
-        total_ventas=round(total_ventas, 2),
-        total_gastos=round(total_gastos, 2),
-        ganancia_neta=round(ganancia_neta, 2),
-        ventas=ventas_rows,
-        gastos=gastos_rows,
-        rango_label="Hoy",
-        desde=hoy,
-        hasta=hoy,
+        r=r,
+        rango_label=rango_label,
+        desde=desde.isoformat(),
+        hasta=hasta.isoformat(),
     )
 
 # ---------- AUTH ----------
@@ -53,7 +66,7 @@ def login():
         user_input = (request.form.get("email") or request.form.get("username") or "").strip().lower()
         password = request.form.get("password", "")
 
-        db = get_db()
+        db = get_db(central_db_path())   # los usuarios son de todas las tiendas
         # Permite iniciar con email O con nombre (case-insensitive).
         row = db.execute(
             """
@@ -64,6 +77,8 @@ def login():
             (user_input, user_input),
         ).fetchone()
 
+        # Import diferido: werkzeug.security no se carga en el arranque
+        from werkzeug.security import check_password_hash
         if row and check_password_hash(row["pass_hash"], password):
             user = User(row["id"], row["email"], row["nombre"])
             login_user(user)
@@ -83,52 +98,47 @@ def logout():
     return redirect(url_for("main.login"))
 
 # ---------- INVENTARIO ----------
+def _umbral(db) -> int:
+    row = db.execute("SELECT valor FROM config WHERE clave='umbral_bajo_stock'").fetchone()
+    return int(row["valor"]) if row and str(row["valor"]).isdigit() else 5
+
 @bp.route("/inventario")
 @login_required
+@query_budget("interactive")
+@etag("productos", "config")
 def inventario():
     db = get_db()
 
     q = (request.args.get("q") or "").strip()
-    try:
-        umbral = int(request.args.get("umbral", 5))
-    except ValueError:
-        umbral = 5
+    umbral = _umbral(db)
     solo_bajo = 1 if request.args.get("solo_bajo") else 0
 
-    # Filtro de búsqueda simple por nombre/categoría/código
+    # productos_bajo_stock lo mantienen triggers (ver migrations.low_stock_steps):
+    # "sólo bajo stock" recorre sólo esos productos
     base_sql = """
-      SELECT id, nombre, categoria, precio, cantidad, proveedor, fecha, codigo
-      FROM productos
+      SELECT p.id, p.nombre, p.categoria, p.precio, p.cantidad, p.proveedor, p.fecha, p.codigo
+      FROM productos p
     """
+    if solo_bajo:
+        base_sql += " JOIN productos_bajo_stock b ON b.producto_id = p.id"
     where = []
     params = []
     if q:
-        where.append("(LOWER(nombre) LIKE ? OR LOWER(categoria) LIKE ? OR LOWER(codigo) LIKE ?)")
+        where.append("(LOWER(p.nombre) LIKE ? OR LOWER(p.categoria) LIKE ? OR LOWER(p.codigo) LIKE ?)")
         like = f"%{q.lower()}%"
         params += [like, like, like]
     if where:
         base_sql += " WHERE " + " AND ".join(where)
-    base_sql += " ORDER BY nombre"
+    base_sql += " ORDER BY p.nombre"
 
     productos = db.execute(base_sql, params).fetchall()
 
-    # Cálculo bajo stock
-    def cant(row):
-        try:
-            return int(row["cantidad"] or 0)
-        except Exception:
-            return 0
-
-    low_items = [p for p in productos if cant(p) <= umbral]
-    low_count = len(low_items)
-
-    if solo_bajo:
-        productos = low_items
+    # El badge: una lectura por clave, no un COUNT(*) sobre productos
+    low_count = db.execute("SELECT valor FROM contadores WHERE nombre='bajo_stock'").fetchone()["valor"]
 
     return render_template(
         "index.html",
         productos=productos,
-        low_items=low_items,
         low_count=low_count,
         umbral=umbral,
         q=q,
@@ -139,143 +149,46 @@ def inventario():
 @login_required
 def actualizar_umbral():
     """
-    Endpoint dummy para que el formulario de 'index.html' no falle.
-    Solo redirige guardando el umbral en la query (?umbral=...).
+    Guarda el umbral en config; los triggers recalculan productos_bajo_stock.
     """
     try:
-        umbral = int(request.form.get("umbral", 5))
+        umbral = max(0, int(request.form.get("umbral", 5)))
     except ValueError:
-        umbral = 5
+        umbral = None
+    if umbral is not None:
+        db = get_db()
+        db.execute("INSERT OR REPLACE INTO config (clave, valor) VALUES ('umbral_bajo_stock', ?)", (str(umbral),))
+        db.commit()
     # Conserva parámetros de búsqueda si venían
     q = request.args.get("q")
     solo_bajo = request.args.get("solo_bajo")
-    return redirect(url_for("main.inventario", umbral=umbral, q=q, solo_bajo=solo_bajo))
+    return redirect(url_for("main.inventario", q=q, solo_bajo=solo_bajo))
 
 # ---------- FINANZAS ----------
 @bp.route("/fin")
 @login_required
 def fin_panel():
     """
-    Panel de finanzas con rango seleccionable y datos listos para Chart.js.
-    Siempre envía variables con valores por defecto para evitar Undefined.
+    Panel de finanzas con rango seleccionable. La página sale sin consultar
+    nada: las tarjetas y cada gráfico piden su JSON en paralelo a /api/finanzas/*.
     """
-    db = get_db()
-
-    # ---- Leer filtros de rango ----
     r = (request.args.get("r") or "hoy").strip()
-    desde_arg = (request.args.get("desde") or "").strip()
-    hasta_arg = (request.args.get("hasta") or "").strip()
-
-    hoy = date.today()
-    rango_label = "Hoy"
-    # Construir desde/hasta (YYYY-MM-DD). Inclusivo.
-    if r == "hoy":
-        desde = hoy.isoformat()
-        hasta = hoy.isoformat()
-        rango_label = "Hoy"
-    elif r == "semana":
-        d1 = hoy - timedelta(days=6)  # últimos 7 días incl. hoy
-        desde = d1.isoformat()
-        hasta = hoy.isoformat()
-        rango_label = "Últimos 7 días"
-    elif r == "mes":
-        d1 = hoy.replace(day=1)
-        if d1.month == 12:
-            dm = date(d1.year + 1, 1, 1) - timedelta(days=1)
-        else:
-            dm = date(d1.year, d1.month + 1, 1) - timedelta(days=1)
-        desde = d1.isoformat()
-        hasta = dm.isoformat()
-        rango_label = "Mes actual"
-    else:  # personalizado
-        try:
-            d1 = datetime.strptime(desde_arg, "%Y-%m-%d").date()
-        except Exception:
-            d1 = hoy
-        try:
-            d2 = datetime.strptime(hasta_arg, "%Y-%m-%d").date()
-        except Exception:
-            d2 = hoy
-        if d2 < d1:
-            d2 = d1
-        desde = d1.isoformat()
-        hasta = d2.isoformat()
-        rango_label = "Personalizado"
-
-    # ---- Totales del rango ----
-    tv_row = db.execute(
-        "SELECT COALESCE(SUM(total),0) AS s FROM ventas WHERE fecha BETWEEN ? AND ?",
-        (desde, hasta),
-    ).fetchone()
-    tg_row = db.execute(
-        "SELECT COALESCE(SUM(monto),0) AS s FROM gastos WHERE fecha BETWEEN ? AND ?",
-        (desde, hasta),
-    ).fetchone()
-
-    total_ventas = float(tv_row["s"] if tv_row and tv_row["s"] is not None else 0.0)
-    total_gastos = float(tg_row["s"] if tg_row and tg_row["s"] is not None else 0.0)
-    ganancia_neta = total_ventas - total_gastos
-
-    # ---- Ventas por día (labels/values) ----
-    ventas_labels = []
-    ventas_values = []
-    rows_vd = db.execute(
-        """
-        SELECT fecha, COALESCE(SUM(total),0) AS s
-        FROM ventas
-        WHERE fecha BETWEEN ? AND ?
-        GROUP BY fecha
-        ORDER BY fecha
-        """,
-        (desde, hasta),
-    ).fetchall()
-    for rvd in rows_vd:
-        ventas_labels.append(str(rvd["fecha"]))
-        ventas_values.append(float(rvd["s"] or 0))
-
-    # ---- Top 5 productos (labels/values) ----
-    top_labels = []
-    top_values = []
-    rows_top = db.execute(
-        """
-        SELECT producto, COALESCE(SUM(cantidad),0) AS cant
-        FROM ventas
-        WHERE fecha BETWEEN ? AND ?
-        GROUP BY producto
-        ORDER BY cant DESC
-        LIMIT 5
-        """,
-        (desde, hasta),
-    ).fetchall()
-    for rt in rows_top:
-        top_labels.append(str(rt["producto"]))
-        try:
-            top_values.append(float(rt["cant"] or 0))
-        except Exception:
-            top_values.append(0.0)
-
-    # ---- Render con valores por defecto garantizados ----
+    desde, hasta, rango_label = rango_fechas(
+        r, (request.args.get("desde") or "").strip(), (request.args.get("hasta") or "").strip()
+    )
     return render_template(
         "fin_panel.html",
-        # filtros y etiquetas
         r=r,
-        desde=desde,
-        hasta=hasta,
+        desde=desde.isoformat(),
+        hasta=hasta.isoformat(),
         rango_label=rango_label,
-        # tarjetas resumen
-        total_ventas=round(total_ventas, 2),
-        total_gastos=round(total_gastos, 2),
-        ganancia_neta=round(ganancia_neta, 2),
-        # datasets para gráficos
-        ventas_labels=ventas_labels or [],
-        ventas_values=ventas_values or [],
-        top_labels=top_labels or [],
-        top_values=top_values or [],
     )
 
 # ---------- LISTAS / FORMULARIOS FINANZAS ----------
 @bp.route("/fin/ventas", methods=["GET"], endpoint="fin_ventas")
 @login_required
+@query_budget("interactive")
+@etag("ventas")
 def fin_ventas():
     """
     Lista simple de ventas (para tu botón 'Registrar venta' puedes enlazar aquí
@@ -296,6 +209,8 @@ def fin_ventas():
 
 @bp.route("/fin/gastos", methods=["GET"], endpoint="fin_gastos")
 @login_required
+@query_budget("interactive")
+@etag("gastos")
 def fin_gastos():
     db = get_db()
     rows = db.execute(
@@ -326,9 +241,57 @@ def reportes_reposiciones():
         rango_label="Hoy",
     )
 
+@bp.route("/reportes/inventario")
+@login_required
+@query_budget("heavy")
+@report_etag("analitica_inventario")
+def reportes_inventario():
+    """
+    ABC, rotación, cobertura y stock muerto por producto. Lee la tabla que
+    deja app/analytics.py; el cálculo corre aparte, en su hilo periódico
+    (lo arranca create_app).
+    """
+    clase = (request.args.get("clase") or "").strip().upper()
+    solo_muertos = request.args.get("muertos") == "1"
+    db = _report_db()
+    try:
+        resumen = analytics.resumen_clases(db)
+        rows = analytics.filas(db, clase, solo_muertos)
+    finally:
+        db.close()
+    return render_template(
+        "reportes_inventario.html",
+        resumen=resumen, rows=rows, clase=clase, solo_muertos=solo_muertos,
+        dias=analytics.dias_ventana(),
+    )
+
+@bp.route("/reportes/consolidado")
+@bp.route("/reportes/consolidado.json", endpoint="reportes_consolidado_json")
+@login_required
+@query_budget("heavy")
+def reportes_consolidado():
+    """
+    Casa central (TIENDAS): finanzas e inventario de todas las tiendas,
+    consultadas en paralelo y sumadas (ver app/stores.py).
+    """
+    if not stores.activo():
+        abort(404)
+    r = (request.args.get("r") or "mes").strip()
+    desde, hasta, rango_label = rango_fechas(
+        r, (request.args.get("desde") or "").strip(), (request.args.get("hasta") or "").strip()
+    )
+    datos = {"finanzas": stores.finanzas(desde, hasta), "inventario": stores.inventario()}
+    if request.path.endswith(".json"):
+        return {"desde": desde.isoformat(), "hasta": hasta.isoformat(), "rango": rango_label, **datos}
+    return render_template(
+        "reportes_consolidado.html", **datos,
+        r=r, desde=desde.isoformat(), hasta=hasta.isoformat(), rango_label=rango_label,
+    )
+
 # ---------- ADMIN ----------
 @bp.route("/admin")
 @login_required
+@etag("productos")
 def admin():
     """
     Evita crash de admin.html: pásale 'total' y 'page_size'.
@@ -341,14 +304,22 @@ def admin():
     page = int(request.args.get("page", 1))
     return render_template("admin.html", total=total, page_size=page_size, page=page)
 
+# ---------- MÉTRICAS ----------
+@bp.route("/metrics")
+@login_required
+def metrics_view():
+    """Contadores del worker: presupuestos excedidos, rechazos de admisión..."""
+    return metrics.snapshot()
+
 # ---------- EXPORTS CSV ----------
 @bp.route("/export/ventas.csv", methods=["GET"], endpoint="export_ventas_filtrado")
 @login_required
+@query_budget("heavy")
+@report_etag("ventas")
 def export_ventas_filtrado():
     desde = request.args.get("desde")
     hasta = request.args.get("hasta")
 
-    db = get_db()
     sql = "SELECT fecha, producto, cantidad, precio_unit, total FROM ventas"
     params = []
     where = []
@@ -362,7 +333,7 @@ def export_ventas_filtrado():
         sql += " WHERE " + " AND ".join(where)
     sql += " ORDER BY fecha DESC"
 
-    rows = db.execute(sql, params).fetchall()
+    rows = _report_rows(sql, params, desde, hasta)
 
     si = StringIO()
     cw = csv.writer(si)
@@ -378,11 +349,12 @@ def export_ventas_filtrado():
 
 @bp.route("/export/gastos.csv", methods=["GET"], endpoint="export_gastos_filtrado")
 @login_required
+@query_budget("heavy")
+@report_etag("gastos")
 def export_gastos_filtrado():
     desde = request.args.get("desde")
     hasta = request.args.get("hasta")
 
-    db = get_db()
     sql = "SELECT fecha, motivo, monto FROM gastos"
     params = []
     where = []
@@ -396,7 +368,7 @@ def export_gastos_filtrado():
         sql += " WHERE " + " AND ".join(where)
     sql += " ORDER BY fecha DESC"
 
-    rows = db.execute(sql, params).fetchall()
+    rows = _report_rows(sql, params, desde, hasta)
 
     si = StringIO()
     cw = csv.writer(si)
@@ -412,13 +384,14 @@ def export_gastos_filtrado():
 
 @bp.route("/export/reposiciones.csv", methods=["GET"], endpoint="export_reposiciones_filtrado")
 @login_required
+@query_budget("heavy")
+@report_etag("reposiciones")
 def export_reposiciones_filtrado():
     desde = request.args.get("desde")
     hasta = request.args.get("hasta")
     producto_id = request.args.get("producto_id")
     origen = request.args.get("origen")
 
-    db = get_db()
     sql = "SELECT fecha, producto, cantidad, costo_unit, proveedor, ref FROM reposiciones"
     params = []
     where = []
@@ -438,7 +411,7 @@ def export_reposiciones_filtrado():
         sql += " WHERE " + " AND ".join(where)
     sql += " ORDER BY fecha DESC"
 
-    rows = db.execute(sql, params).fetchall()
+    rows = _report_rows(sql, params, desde, hasta)
 
     si = StringIO()
     cw = csv.writer(si)
@@ -0,0 +1,133 @@
+# app/sales_backfill.py
+"""
+Copia el historial de `ventas` (modelo plano) a ventas_enc/venta_items
+(encabezado/detalle) en inventario.db, con la tienda abierta.
+
+    python -m app.sales_backfill inventario.db              # copia y cambia los reportes
+    python -m app.sales_backfill inventario.db --tanda 2000 --pausa 0.05
+    python -m app.sales_backfill inventario.db --fuente ventas   # vuelve atrás
+
+- Tandas de SALES_BACKFILL_TANDA ventas (5000), cada una en su propia
+  transacción corta: entre tanda y tanda las ventas nuevas toman el lock.
+- El avance (último ventas.id copiado) se guarda en config
+  'ventas_backfill_hasta' dentro de la misma transacción que la tanda: si se
+  corta, se retoma desde ahí sin duplicar.
+- registrar_venta ya escribe en los dos modelos; ventas_enc.origen_venta_id
+  enlaza cada copia con su venta y evita copiarla otra vez.
+- Al terminar pone config 'ventas_fuente' = 'detalle' y los reportes pasan a
+  leer ventas_enc/venta_items (db.ventas_detalle) con índices que los cubren.
+
+Las ventas sin producto_id (producto borrado) se copian sólo como
+encabezado: cuentan en los totales pero no en el top de productos.
+"""
+import logging
+import os
+import sqlite3
+import time
+
+from .db import tune_connection
+
+log = logging.getLogger("sales_backfill")
+
+def _config(conn, clave, defecto=None):
+    row = conn.execute("SELECT valor FROM config WHERE clave = ?", (clave,)).fetchone()
+    return row[0] if row else defecto
+
+def estado(conn) -> dict:
+    hasta = int(_config(conn, "ventas_backfill_hasta", 0))
+    tope = conn.execute("SELECT COALESCE(MAX(id), 0) FROM ventas").fetchone()[0]
+    pendientes = conn.execute("SELECT COUNT(*) FROM ventas WHERE id > ?", (hasta,)).fetchone()[0]
+    return {"hasta": hasta, "tope": tope, "pendientes": pendientes,
+            "fuente": _config(conn, "ventas_fuente", "ventas")}
+
+# ---------- Una tanda ----------
+def copiar_tanda(conn, tanda: int) -> int:
+    """Copia las próximas `tanda` ventas; devuelve cuántas ventas recorrió (0 = terminado)."""
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        desde = int(_config(conn, "ventas_backfill_hasta", 0))
+        row = conn.execute(
+            """SELECT COUNT(*), MAX(id) FROM (
+                 SELECT id FROM ventas WHERE id > ? ORDER BY id LIMIT ?)""", (desde, tanda)).fetchone()
+        n, hasta = row[0], row[1]
+        if not n:
+            conn.rollback()
+            return 0
+        antes = conn.execute("SELECT COALESCE(MAX(id), 0) FROM ventas_enc").fetchone()[0]
+        conn.execute(
+            """INSERT INTO ventas_enc (fecha, total, origen_venta_id)
+               SELECT COALESCE(v.fecha, ''), COALESCE(v.total, 0), v.id FROM ventas v
+               WHERE v.id > ? AND v.id <= ?
+                 AND NOT EXISTS (SELECT 1 FROM ventas_enc e WHERE e.origen_venta_id = v.id)""",
+            (desde, hasta))
+        # Detalle sólo de los encabezados recién creados (tenemos el lock de escritura)
+        conn.execute(
+            """INSERT INTO venta_items (venta_id, producto_id, modo, cantidad, unidades, precio_unit, subtotal)
+               SELECT e.id, v.producto_id, COALESCE(v.modo, 'unidad'), COALESCE(v.cantidad, 0),
+                      COALESCE(v.cantidad, 0) * CASE WHEN v.modo = 'paquete'
+                                                     THEN COALESCE(p.unidades_por_paquete, 1) ELSE 1 END,
+                      COALESCE(v.precio_unit, v.total * 1.0 / NULLIF(v.cantidad, 0), 0),
+                      COALESCE(v.total, 0)
+               FROM ventas_enc e
+               JOIN ventas v ON v.id = e.origen_venta_id
+               LEFT JOIN productos p ON p.id = v.producto_id
+               WHERE e.id > ? AND v.producto_id IS NOT NULL""", (antes,))
+        conn.execute("INSERT OR REPLACE INTO config (clave, valor) VALUES ('ventas_backfill_hasta', ?)",
+                     (str(hasta),))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return n
+
+# ---------- Corrida completa ----------
+def ejecutar(conn, tanda: int = None, pausa: float = None, cambiar: bool = True) -> dict:
+    """Copia hasta alcanzar la última venta y, con `cambiar`, pasa los reportes al detalle."""
+    tanda = tanda or int(os.getenv("SALES_BACKFILL_TANDA", "5000"))
+    pausa = float(os.getenv("SALES_BACKFILL_PAUSA", "0") if pausa is None else pausa)
+    copiadas = 0
+    while True:
+        n = copiar_tanda(conn, tanda)
+        if not n:
+            break
+        copiadas += n
+        log.info("Ventas copiadas: %d (hasta id %s)", copiadas, _config(conn, "ventas_backfill_hasta"))
+        if pausa:
+            time.sleep(pausa)
+    if cambiar:
+        usar_fuente(conn, "detalle")
+    return {"copiadas": copiadas, **estado(conn)}
+
+def usar_fuente(conn, fuente: str) -> None:
+    """'detalle' (ventas_enc/venta_items) o 'ventas' (modelo plano) para los reportes."""
+    if fuente not in ("detalle", "ventas"):
+        raise ValueError(f"fuente desconocida: {fuente}")
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO config (clave, valor) VALUES ('ventas_fuente', ?)", (fuente,))
+
+def run(db_path: str, tanda: int = None, pausa: float = None, cambiar: bool = True) -> dict:
+    conn = tune_connection(sqlite3.connect(db_path), "tareas")
+    try:
+        return ejecutar(conn, tanda, pausa, cambiar)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Copia ventas al modelo encabezado/detalle")
+    ap.add_argument("db")
+    ap.add_argument("--tanda", type=int, help="ventas por transacción (SALES_BACKFILL_TANDA)")
+    ap.add_argument("--pausa", type=float, help="segundos entre tandas (SALES_BACKFILL_PAUSA)")
+    ap.add_argument("--sin-cambiar", action="store_true", help="copia sin pasar los reportes al detalle")
+    ap.add_argument("--fuente", choices=["detalle", "ventas"], help="sólo cambia la fuente de los reportes")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.fuente:
+        conn = sqlite3.connect(args.db)
+        usar_fuente(conn, args.fuente)
+        print(estado(conn))
+        conn.close()
+    else:
+        print(run(args.db, args.tanda, args.pausa, cambiar=not args.sin_cambiar))
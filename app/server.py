@@ -0,0 +1,119 @@
+# app/server.py
+"""
+Modo producción: varios procesos (pre-fork) con hilos, sobre gunicorn.
+
+    python -m app.server                 # app:create_app() con la config del entorno
+    python -m app.server wsgi:app        # la app legacy
+    kill -HUP <pid del master>           # recarga en caliente: workers nuevos, los viejos terminan lo suyo
+
+Variables de entorno (todas opcionales):
+    HOST, PORT            dirección de escucha (0.0.0.0:5000)
+    WORKERS               procesos; por defecto uno por núcleo (uno solo con SSE, ver abajo)
+    THREADS               hilos por proceso (8; 16 con SSE)
+    TIMEOUT               seg. sin latido antes de reiniciar un worker colgado (30)
+    GRACEFUL_TIMEOUT      seg. para terminar requests en curso al recargar/parar (30)
+    KEEPALIVE             seg. que se mantiene abierta una conexión ociosa (5)
+    MAX_REQUESTS          recicla el worker tras N requests (0 = nunca)
+
+SQLite: cada worker crea su app DESPUÉS del fork (sin preload), así que abre
+sus propias conexiones; db.tune_connection() pone WAL + busy_timeout para que
+haya un escritor a la vez sin errores 'database is locked'.
+
+Eventos en vivo (SSE, app/events.py): el broker reparte dentro de un
+proceso, así que una venta atendida por un worker no llega a los tableros
+conectados a otro. Las apps con stream (APPS_CON_SSE: la legacy) arrancan
+por defecto con WORKERS=1; además cada tablero abierto ocupa un hilo del
+worker mientras está conectado, por eso ahí THREADS sube a 16. Quien fije
+WORKERS > 1 a mano pierde los deltas entre workers (los tableros siguen
+andando, pero sólo se enteran al recargar).
+
+gunicorn no corre en Windows: ahí (o si no está instalado) se cae al servidor
+de Werkzeug con hilos en un solo proceso.
+"""
+import logging
+import os
+import sys
+import time
+
+log = logging.getLogger("server")
+
+DEFAULT_APP = "app:create_app()"
+# Apps que sirven /finanzas/stream: el broker de eventos es por proceso
+APPS_CON_SSE = ("wsgi:app",)
+
+def server_options(sse: bool = False) -> dict:
+    env = os.getenv
+    return {
+        "bind": f"{env('HOST', '0.0.0.0')}:{env('PORT', '5000')}",
+        "workers": int(env("WORKERS") or (1 if sse else (os.cpu_count() or 1))),
+        "threads": int(env("THREADS") or (16 if sse else 8)),
+        "worker_class": "gthread",
+        "timeout": int(env("TIMEOUT", "30")),
+        "graceful_timeout": int(env("GRACEFUL_TIMEOUT", "30")),
+        "keepalive": int(env("KEEPALIVE", "5")),
+        "max_requests": int(env("MAX_REQUESTS", "0")),
+        "max_requests_jitter": int(env("MAX_REQUESTS", "0")) // 10,
+        # Sin preload: cada worker importa y crea la app tras el fork
+        # (conexiones propias, y HUP recarga código nuevo)
+        "preload_app": False,
+        "accesslog": env("ACCESS_LOG") or None,
+        "post_worker_init": _post_worker_init,
+    }
+
+def _tiempos(app) -> str:
+    """Etapas de create_app() (STARTUP_TIMINGS), como las muestra el launcher."""
+    tiempos = getattr(app, "config", {}).get("STARTUP_TIMINGS", [])
+    return ", ".join(f"{etapa}={ms:.0f}ms" for etapa, ms in tiempos)
+
+def _post_worker_init(worker) -> None:
+    worker.log.info("Worker %s listo (%s)", worker.pid, _tiempos(worker.wsgi) or "sin tiempos")
+
+def _gunicorn():
+    if sys.platform == "win32":
+        return None
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        return None
+    return BaseApplication
+
+def serve(app_spec: str = DEFAULT_APP, **overrides) -> None:
+    """Arranca el servidor de producción (bloquea hasta SIGTERM/SIGINT)."""
+    from dotenv import load_dotenv
+    load_dotenv()  # HOST/PORT/WORKERS desde .env, igual que `flask run`
+    opciones = {**server_options(sse=app_spec in APPS_CON_SSE), **overrides}
+    BaseApplication = _gunicorn()
+    if BaseApplication is None:
+        _serve_threaded(app_spec, opciones)
+        return
+
+    class _App(BaseApplication):
+        def load_config(self):
+            for clave, valor in opciones.items():
+                if valor is not None:
+                    self.cfg.set(clave, valor)
+
+        def load(self):
+            from gunicorn.util import import_app
+            return import_app(app_spec)
+
+    log.info("gunicorn %s: %s workers x %s hilos", opciones["bind"], opciones["workers"], opciones["threads"])
+    _App().run()
+
+def _serve_threaded(app_spec: str, opciones: dict) -> None:
+    from werkzeug.serving import run_simple
+    t_inicio = time.perf_counter()
+    modulo, _, attr = app_spec.partition(":")
+    obj = getattr(__import__(modulo, fromlist=[attr.rstrip("()")]), attr.rstrip("()"))
+    t_import = (time.perf_counter() - t_inicio) * 1000.0
+    app = obj() if attr.endswith("()") else obj
+    host, _, port = opciones["bind"].rpartition(":")
+    log.warning("gunicorn no disponible: servidor con hilos en un solo proceso")
+    # Mismo desglose que el launcher en modo dev (y que post_worker_init con gunicorn)
+    detalle = ", ".join(filter(None, [f"import={t_import:.0f}ms", _tiempos(app)]))
+    log.info("Arranque listo en %.0f ms (%s)", (time.perf_counter() - t_inicio) * 1000.0, detalle)
+    run_simple(host, int(port), app, threaded=True)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s")
+    serve(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_APP)
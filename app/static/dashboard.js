@@ -0,0 +1,154 @@
+// app/static/dashboard.js
+// Tableros con carga asíncrona: la página llega vacía y cada bloque con
+// data-widget pide su JSON (data-src) en paralelo. Un gráfico lento ya no
+// frena al resto. Si dos bloques usan la misma URL se pide una sola vez.
+//
+//   <div data-widget="kpis" data-src="/api/finanzas/totales?r=mes">
+//     <p data-kpi="ventas" data-prefijo="Bs ">…</p>
+//   </div>
+//   <canvas data-widget="barras" data-src="/api/finanzas/ventas-por-dia" data-label="Ventas por día"></canvas>
+//   <canvas data-widget="torta"  data-src="/api/finanzas/top-productos"></canvas>
+//   <canvas data-widget="resumen" data-src="/api/finanzas/totales"></canvas>
+//
+// En vivo: un elemento con data-stream (URL SSE) + data-desde/data-hasta
+// aplica los deltas de ventas y gastos en el lugar, sin volver a la API.
+(function () {
+  const datos = {};       // url -> JSON (compartido por los bloques de esa URL)
+  const bloques = {};     // url -> [elementos]
+
+  function cargar(url) {
+    return fetch(url, { credentials: 'same-origin', headers: { Accept: 'application/json' } })
+      .then(r => { if (!r.ok) throw new Error(r.status); return r.json(); });
+  }
+
+  const gridColor = 'rgba(255,255,255,0.1)';
+  const tickColor = 'rgba(255,255,255,0.7)';
+  const legend = { labels: { color: '#e5e7eb' } };
+
+  function grafico(canvas, config) {
+    if (canvas._chart) canvas._chart.destroy();
+    canvas._chart = new Chart(canvas, config);
+  }
+
+  function barras(canvas, labels, data, label) {
+    grafico(canvas, {
+      type: 'bar',
+      data: { labels, datasets: [{ label, data, borderWidth: 1 }] },
+      options: {
+        responsive: true,
+        plugins: { legend },
+        scales: {
+          x: { grid: { color: gridColor }, ticks: { color: tickColor } },
+          y: { grid: { color: gridColor }, ticks: { color: tickColor } }
+        }
+      }
+    });
+  }
+
+  const widgets = {
+    kpis(el, d) {
+      el.querySelectorAll('[data-kpi]').forEach(k => {
+        const v = Number(d[k.dataset.kpi]) || 0;
+        k.textContent = (k.dataset.prefijo || '') + (k.dataset.entero !== undefined ? v : v.toFixed(2));
+        if (k.dataset.signo !== undefined) k.classList.toggle('text-rose-300', v < 0);
+      });
+    },
+    barras(el, d) { barras(el, d.labels || [], d.values || [], el.dataset.label || ''); },
+    resumen(el, d) { barras(el, ['Ingresos', 'Egresos'], [d.ventas || 0, d.gastos || 0], 'Resumen'); },
+    torta(el, d) {
+      grafico(el, {
+        type: 'pie',
+        data: { labels: d.labels || [], datasets: [{ data: d.values || [] }] },
+        options: { responsive: true, plugins: { legend } }
+      });
+    }
+  };
+
+  function pintar(url) {
+    (bloques[url] || []).forEach(el => widgets[el.dataset.widget](el, datos[url]));
+  }
+
+  function refrescar(url) {
+    (bloques[url] || []).forEach(el => el.setAttribute('aria-busy', 'true'));
+    return cargar(url)
+      .then(d => { datos[url] = d; pintar(url); })
+      .catch(() => (bloques[url] || []).forEach(el =>
+        el.insertAdjacentHTML('afterend', '<p class="text-sm text-rose-300">⚠️ No se pudo cargar</p>')))
+      .finally(() => (bloques[url] || []).forEach(el => el.removeAttribute('aria-busy')));
+  }
+
+  document.querySelectorAll('[data-widget]').forEach(el => {
+    if (!widgets[el.dataset.widget] || !el.dataset.src) return;
+    (bloques[el.dataset.src] = bloques[el.dataset.src] || []).push(el);
+  });
+  Object.keys(bloques).forEach(refrescar);
+
+  // ---- En vivo (SSE) ----
+  const vivo = document.querySelector('[data-stream]');
+  if (!vivo || !window.EventSource) return;
+
+  const r2 = n => Math.round(n * 100) / 100;
+  const enRango = f => {
+    const dia = String(f || '').slice(0, 10);
+    return dia >= vivo.dataset.desde && dia <= vivo.dataset.hasta;
+  };
+  // Cómo aplica cada endpoint un delta; devuelve false si no puede (se recarga)
+  const deltas = {
+    totales: {
+      venta(d, e) { d.ventas = r2(d.ventas + e.total); d.neta = r2(d.neta + e.total); d.n_ventas += 1; },
+      gasto(d, e) { d.gastos = r2(d.gastos + e.monto); d.neta = r2(d.neta - e.monto); d.n_gastos += 1; }
+    },
+    'ventas-por-dia': {
+      venta(d, e) {
+        const dia = e.fecha.slice(0, 10);
+        const i = d.labels.indexOf(dia);
+        if (i >= 0) d.values[i] = r2(d.values[i] + e.total);
+        else { d.labels.push(dia); d.values.push(e.total); }
+      }
+    },
+    'top-productos': {
+      venta(d, e) {
+        const i = d.labels.indexOf(e.producto);
+        if (i < 0) return false;   // puede entrar al top: mejor consultar
+        d.values[i] += e.cantidad;
+      }
+    }
+  };
+
+  function aplicar(tipo, evento) {
+    if (!enRango(evento.fecha)) return;
+    Object.keys(datos).forEach(url => {
+      const ep = url.split('?')[0].split('/').pop();
+      const fn = (deltas[ep] || {})[tipo];
+      if (!fn) return;
+      if (fn(datos[url], evento) === false) refrescar(url);
+      else pintar(url);
+    });
+  }
+
+  function alerta(texto) {
+    const caja = document.getElementById('alertas-vivo');
+    if (!caja) return;
+    caja.insertAdjacentHTML('afterbegin',
+      `<div class="rounded-lg bg-amber-500/20 text-amber-200 px-3 py-2 text-sm">${texto}</div>`);
+    while (caja.children.length > 5) caja.lastElementChild.remove();
+  }
+
+  const es = new EventSource(vivo.dataset.stream);
+  es.addEventListener('venta', m => aplicar('venta', JSON.parse(m.data)));
+  es.addEventListener('gasto', m => aplicar('gasto', JSON.parse(m.data)));
+  es.addEventListener('stock_bajo', m => {
+    const e = JSON.parse(m.data);
+    const p = document.createElement('span');
+    p.textContent = e.producto;
+    alerta(`⚠️ Stock bajo: ${p.innerHTML} (${e.stock} ≤ ${e.umbral})`);
+  });
+  es.addEventListener('reposicion', m => {
+    const e = JSON.parse(m.data);
+    const p = document.createElement('span');
+    p.textContent = e.producto;
+    alerta(`📥 Reposición: ${p.innerHTML} +${e.cantidad}`);
+  });
+  // Cola desbordada en el servidor: se perdieron deltas, recargar todo
+  es.addEventListener('resync', () => Object.keys(bloques).forEach(refrescar));
+})();
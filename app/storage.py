@@ -0,0 +1,169 @@
+# app/storage.py
+"""
+Perfiles de almacenamiento de SQLite por rol de conexión.
+
+    SQLITE_PERFIL=throughput                 # todos los roles
+    SQLITE_PERFIL_LECTURA=reporting          # o por rol: ESCRITURA, LECTURA, TAREAS
+
+    python -m app.storage inventario.db      # tuner: mide los perfiles y recomienda
+
+Roles:
+    escritura  requests que escriben (db.get_db, wsgi.get_conn)
+    lectura    tableros y reportes (db.connect_readonly)
+    tareas     hilos y comandos de fondo (analytics, forecast, archive...)
+
+Un perfil fija journal_mode, synchronous, cache_size, mmap_size, temp_store
+y busy_timeout; lo que queda en None no se toca. journal_mode es del
+archivo, no de la conexión: sólo lo aplican los roles que escriben, y las
+conexiones de lectura no pueden cambiarlo. Sin configurar nada rige "base",
+que es lo que había: WAL + synchronous=NORMAL y lo demás por defecto.
+
+El tuner trabaja sobre una copia de la base (API de backup) en una carpeta
+temporal: para cada perfil mide transacciones de escritura chicas (como una
+venta) y lecturas completas de cada tabla, TUNER_REPETICIONES veces (3) con
+conexiones nuevas, y se queda con la mediana.
+"""
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+PERFILES = {
+    # Lo de siempre: WAL + NORMAL, caché de 2 MB, sin mmap
+    "base": {"journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": None,
+             "mmap_size": None, "temp_store": None, "busy_timeout": None},
+    # Caja: ningún commit confirmado se pierde aunque se corte la luz
+    "pos-safe": {"journal_mode": "WAL", "synchronous": "FULL", "cache_size": -8192,
+                 "mmap_size": 0, "temp_store": "DEFAULT", "busy_timeout": 10000},
+    # Más escrituras por segundo: un corte de luz puede perder el último commit (nunca corrompe)
+    "throughput": {"journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": -32768,
+                   "mmap_size": 256 * 1024 * 1024, "temp_store": "MEMORY", "busy_timeout": 5000},
+    # Lecturas grandes: mucha caché, mmap y ordenamientos en memoria
+    "reporting": {"journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": -65536,
+                  "mmap_size": 1024 * 1024 * 1024, "temp_store": "MEMORY", "busy_timeout": 5000},
+}
+ROLES = ("escritura", "lectura", "tareas")
+
+def perfil(rol: str) -> dict:
+    nombre = (os.getenv(f"SQLITE_PERFIL_{rol.upper()}") or os.getenv("SQLITE_PERFIL") or "base").lower()
+    if nombre not in PERFILES:
+        raise ValueError(f"perfil SQLite desconocido para {rol}: {nombre} (hay {', '.join(PERFILES)})")
+    return PERFILES[nombre]
+
+def aplicar(conn: sqlite3.Connection, rol: str = "escritura", valores: dict = None) -> sqlite3.Connection:
+    """PRAGMAs del perfil del rol (o `valores`) sobre `conn`."""
+    p = valores or perfil(rol)
+    # busy_timeout primero: el cambio a WAL también puede esperar un lock
+    espera = p["busy_timeout"] or int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+    conn.execute(f"PRAGMA busy_timeout={int(espera)}")
+    if rol != "lectura":
+        # Base nueva: auto_vacuum antes de pasar a WAL, después ya no se puede cambiar
+        if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        if p["journal_mode"]:
+            conn.execute(f"PRAGMA journal_mode={p['journal_mode']}")
+        if p["synchronous"]:
+            conn.execute(f"PRAGMA synchronous={p['synchronous']}")
+    for pragma in ("cache_size", "mmap_size"):
+        if p[pragma] is not None:
+            conn.execute(f"PRAGMA {pragma}={int(p[pragma])}")
+    if p["temp_store"]:
+        conn.execute(f"PRAGMA temp_store={p['temp_store']}")
+    return conn
+
+# ---------- Tuner ----------
+def _copia(db_path: str, destino: Path) -> None:
+    origen = sqlite3.connect(f"file:{Path(db_path).as_posix()}?mode=ro", uri=True)
+    copia = sqlite3.connect(destino)
+    try:
+        origen.backup(copia)
+        copia.execute("PRAGMA journal_mode=WAL")
+    finally:
+        copia.close()
+        origen.close()
+
+def _tablas(conn) -> list:
+    return [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+        "AND name NOT LIKE '\\_tuner%' ESCAPE '\\' ORDER BY name")]
+
+def _escrituras(ruta: Path, valores: dict, n: int) -> float:
+    """Transacciones por segundo: un INSERT y un UPDATE por commit, como una venta."""
+    conn = aplicar(sqlite3.connect(ruta), "escritura", valores)
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS _tuner_mov (id INTEGER PRIMARY KEY, k INTEGER, dato TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS _tuner_stock (k INTEGER PRIMARY KEY, n INTEGER)")
+        conn.executemany("INSERT OR IGNORE INTO _tuner_stock VALUES (?, 0)", [(k,) for k in range(100)])
+        conn.commit()
+        t0 = time.perf_counter()
+        for i in range(n):
+            conn.execute("INSERT INTO _tuner_mov (k, dato) VALUES (?, ?)", (i % 100, "x" * 80))
+            conn.execute("UPDATE _tuner_stock SET n = n + 1 WHERE k = ?", (i % 100,))
+            conn.commit()
+        return n / (time.perf_counter() - t0)
+    finally:
+        conn.close()
+
+def _lecturas(ruta: Path, valores: dict, vueltas: int) -> float:
+    """Milisegundos por vuelta de lectura completa de todas las tablas (2 pasadas: fría y caliente)."""
+    conn = aplicar(sqlite3.connect(f"file:{ruta.as_posix()}?mode=ro", uri=True), "lectura", valores)
+    try:
+        tablas = _tablas(conn)
+        t0 = time.perf_counter()
+        for _ in range(vueltas):
+            for t in tablas:
+                conn.execute(f'SELECT * FROM "{t}" ORDER BY rowid DESC').fetchall()
+        return (time.perf_counter() - t0) * 1000 / vueltas
+    finally:
+        conn.close()
+
+def medir(db_path: str, perfiles=None, escrituras: int = None, repeticiones: int = None) -> dict:
+    """{perfil: {"escrituras_s": ..., "lectura_ms": ...}} con la mediana de las repeticiones."""
+    escrituras = escrituras or int(os.getenv("TUNER_ESCRITURAS", "500"))
+    repeticiones = repeticiones or int(os.getenv("TUNER_REPETICIONES", "3"))
+    carpeta = Path(tempfile.mkdtemp(prefix="tuner-"))
+    resultados = {}
+    try:
+        for nombre in perfiles or PERFILES:
+            valores = PERFILES[nombre]
+            escr, lect = [], []
+            for i in range(repeticiones):
+                ruta = carpeta / f"{nombre}-{i}.db"
+                _copia(db_path, ruta)
+                lect.append(_lecturas(ruta, valores, 2))
+                escr.append(_escrituras(ruta, valores, escrituras))
+            resultados[nombre] = {"escrituras_s": round(statistics.median(escr), 1),
+                                  "lectura_ms": round(statistics.median(lect), 2)}
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+    return resultados
+
+def recomendar(resultados: dict) -> dict:
+    """Perfil por rol: el que más escribe para escritura/tareas, el que lee más rápido para lectura."""
+    escritura = max(resultados, key=lambda p: resultados[p]["escrituras_s"])
+    lectura = min(resultados, key=lambda p: resultados[p]["lectura_ms"])
+    return {"escritura": escritura, "lectura": lectura, "tareas": escritura}
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Mide los perfiles SQLite sobre una copia de la base")
+    ap.add_argument("db")
+    ap.add_argument("--perfiles", nargs="+", choices=list(PERFILES))
+    ap.add_argument("--escrituras", type=int, help="commits por medición (TUNER_ESCRITURAS)")
+    ap.add_argument("--repeticiones", type=int, help="TUNER_REPETICIONES")
+    args = ap.parse_args()
+    res = medir(args.db, args.perfiles, args.escrituras, args.repeticiones)
+    base = res.get("base")
+    print(f"{'perfil':<12}{'escrituras/s':>14}{'lectura ms':>12}")
+    for nombre, r in res.items():
+        extra = f"  ({r['escrituras_s'] / base['escrituras_s']:.2f}x)" if base and nombre != "base" else ""
+        print(f"{nombre:<12}{r['escrituras_s']:>14}{r['lectura_ms']:>12}{extra}")
+    print("\n# .env recomendado")
+    for rol, nombre in recomendar(res).items():
+        print(f"SQLITE_PERFIL_{rol.upper()}={nombre}")
+    if "pos-safe" in res:
+        print("# pos-safe (synchronous=FULL) no pierde ventas con un corte de luz: "
+              "preferirlo para ESCRITURA si la caja no tiene UPS")
@@ -0,0 +1,128 @@
+# app/stores.py
+"""
+Modo multi-tienda: una base SQLite (shard) por tienda, en la misma app.
+
+    TIENDAS=centro=data/centro.db,norte=data/norte.db,sur=data/sur.db
+
+Sin TIENDAS todo sigue igual: una sola base, la de DATABASE_URL.
+
+Con TIENDAS:
+- Cada request trabaja sobre la base de una tienda. Se elige con ?tienda=
+  (queda en la sesión), con el header X-Tienda (terminales, scripts) o, si
+  no viene nada, la primera de la lista. Una tienda desconocida es un 404.
+- db.get_db() y db.report_db_path() devuelven la base de esa tienda, así que
+  las vistas, la API de los tableros, los reportes y sus cachés quedan
+  separados por tienda sin cambiar nada más. Las conexiones de escritura
+  tienen un pool por archivo (ver db.get_db).
+- Los usuarios siguen en la base de DATABASE_URL (la central): el mismo
+  login sirve para todas las tiendas.
+- /consolidado (y /api/consolidado/*) arma el reporte de casa central:
+  consulta todas las tiendas a la vez en un pool de hilos
+  (STORES_THREADS, por defecto una por tienda hasta 8) y suma los parciales.
+  Los productos se juntan por nombre: los ids no coinciden entre tiendas.
+"""
+import os
+import sqlite3
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from flask import abort, g, has_request_context, request, session
+
+def configuradas() -> dict:
+    """{tienda: ruta} de TIENDAS, en el orden en que están escritas."""
+    tiendas = {}
+    for parte in (os.getenv("TIENDAS") or "").split(","):
+        if parte.strip():
+            nombre, _, ruta = parte.partition("=")
+            tiendas[nombre.strip()] = ruta.strip() or f"data/{nombre.strip()}.db"
+    return tiendas
+
+def activo() -> bool:
+    return bool(configuradas())
+
+def actual():
+    """Tienda del request en curso (None fuera de un request o sin TIENDAS)."""
+    return g.get("tienda") if has_request_context() else None
+
+def ruta_actual():
+    tienda = actual()
+    return configuradas().get(tienda) if tienda else None
+
+def elegir():
+    """before_request: fija g.tienda para el resto del request."""
+    tiendas = configuradas()
+    pedida = (request.args.get("tienda") or request.headers.get("X-Tienda") or "").strip()
+    tienda = pedida or session.get("tienda") or next(iter(tiendas))
+    if tienda not in tiendas:
+        if pedida:
+            abort(404)
+        tienda = next(iter(tiendas))   # la de la sesión ya no está configurada
+    if pedida and not request.headers.get("X-Tienda"):
+        session["tienda"] = tienda
+    g.tienda = tienda
+
+def contexto() -> dict:
+    """Para las plantillas: selector de tienda."""
+    return {"tiendas": list(configuradas()), "tienda_actual": actual()}
+
+# ---------- Reportes consolidados ----------
+def _en_paralelo(fn, *args) -> dict:
+    """{tienda: fn(ruta, *args)} con todas las tiendas a la vez."""
+    tiendas = configuradas()
+    hilos = int(os.getenv("STORES_THREADS", "0")) or min(8, len(tiendas))
+    with ThreadPoolExecutor(max_workers=max(hilos, 1), thread_name_prefix="tienda") as pool:
+        futuros = {t: pool.submit(fn, ruta, *args) for t, ruta in tiendas.items()}
+        return {t: f.result() for t, f in futuros.items()}
+
+def _parciales_finanzas(ruta: str, desde, hasta, limite=None) -> list:
+    """Parciales mensuales de una tienda con los productos por nombre."""
+    from . import report_engine
+    parciales, nombres = report_engine.parciales(ruta, desde, hasta, limite=limite)
+    por_nombre = []
+    for p in parciales:
+        productos = Counter()
+        for clave, cant in p["por_producto"].items():
+            productos[str(nombres.get(clave, clave))] += cant
+        por_nombre.append({**p, "por_producto": dict(productos)})
+    return por_nombre
+
+def finanzas(desde, hasta, top: int = 10) -> dict:
+    """Totales, ventas por día y top de productos de todas las tiendas, más el detalle por tienda."""
+    from .budget import limite_reloj
+    from .report_engine import fusionar
+    # Los hilos no ven el request: el presupuesto viaja como hora límite
+    por_tienda = _en_paralelo(_parciales_finanzas, desde, hasta, limite_reloj())
+    todas = [p for parciales in por_tienda.values() for p in parciales]
+    return {**fusionar(todas, top),
+            "tiendas": {t: fusionar(parciales, 0)["totales"] for t, parciales in por_tienda.items()}}
+
+def _parcial_inventario(ruta: str) -> dict:
+    conn = sqlite3.connect(f"file:{Path(ruta).as_posix()}?mode=ro", uri=True)
+    try:
+        n, unidades, valor = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(cantidad),0), COALESCE(SUM(cantidad * precio),0) FROM productos"
+        ).fetchone()
+        bajo = conn.execute("SELECT valor FROM contadores WHERE nombre = 'bajo_stock'").fetchone()
+        por_producto = dict(conn.execute(
+            "SELECT nombre, COALESCE(SUM(cantidad),0) FROM productos GROUP BY nombre").fetchall())
+    finally:
+        conn.close()
+    return {"productos": n, "unidades": unidades, "valor": float(valor),
+            "bajo_stock": int(bajo[0]) if bajo else 0, "por_producto": por_producto}
+
+def inventario(top: int = 20) -> dict:
+    """Stock de todas las tiendas: totales, por tienda y los productos con más unidades."""
+    por_tienda = _en_paralelo(_parcial_inventario)
+    tot, unidades = Counter(), Counter()
+    for p in por_tienda.values():
+        for k in ("unidades", "valor", "bajo_stock"):
+            tot[k] += p[k]
+        unidades.update(p["por_producto"])
+    mayores = sorted(unidades.items(), key=lambda kv: (-kv[1], kv[0]))[:top]
+    return {
+        "totales": {"productos": len(unidades), "unidades": int(tot["unidades"]),
+                    "valor": round(tot["valor"], 2), "bajo_stock": int(tot["bajo_stock"])},
+        "tiendas": {t: {k: v for k, v in p.items() if k != "por_producto"} for t, p in por_tienda.items()},
+        "productos": {"labels": [k for k, _ in mayores], "values": [v for _, v in mayores]},
+    }
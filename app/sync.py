@@ -0,0 +1,235 @@
+# app/sync.py
+"""
+Sincronización de las cajas que trabajaron sin red (inventario.db).
+
+POST /api/sync con un lote de operaciones encoladas en la terminal:
+
+    {"terminal": "caja-2", "operaciones": [
+        {"clave": "c2-000481", "tipo": "venta", "fecha": "2024-06-01 10:31:07",
+         "producto_id": 12, "cantidad": 2, "modo": "unidad"},
+        {"clave": "c2-000482", "tipo": "gasto", "motivo": "Hielo", "monto": 1500},
+        {"clave": "c2-000483", "tipo": "reposicion", "producto_id": 12, "cantidad": 24,
+         "costo_unit": 310.5, "proveedor": "Molinos"}]}
+
+Responde un resultado por operación, en el mismo orden:
+    {"clave": ..., "estado": "ok" | "duplicado" | "error", "id": ..., "error": ...}
+
+- `clave` la genera la terminal y es única por operación. Las aplicadas
+  quedan en `sync_claves` con su resultado; si la misma clave vuelve (la
+  terminal reintentó porque no vio la respuesta) se contesta "duplicado"
+  con ese resultado y no se aplica otra vez. Las que dieron error no se
+  guardan: un reintento las vuelve a evaluar.
+- Todo el lote va en una sola transacción (BEGIN IMMEDIATE): o entra
+  entero o no entra nada. Las operaciones se validan en orden contra el
+  stock que van dejando las anteriores, igual que registrar_venta.
+- Los INSERT y el UPDATE de stock son por conjunto sobre una tabla
+  temporal con el lote (un UPDATE de productos por lote, no uno por venta).
+- `sync_claves` se poda a SYNC_CLAVES_DIAS días (30); un lote trae como
+  mucho SYNC_MAX_OPERACIONES (1000).
+"""
+import json
+import os
+from datetime import datetime, timedelta
+
+from . import valuation
+
+TIPOS = ("venta", "gasto", "reposicion")
+
+class LoteInvalido(ValueError):
+    """El lote entero es inválido (no es una lista, demasiado grande...)."""
+
+def _fecha(valor) -> str:
+    if not valor:
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # Acepta 'YYYY-MM-DD HH:MM:SS' o ISO con 'T'; se guarda como las demás fechas
+    return datetime.fromisoformat(str(valor).replace("T", " ")[:19]).strftime("%Y-%m-%d %H:%M:%S")
+
+def _productos(conn, ops) -> dict:
+    """{id: (id, nombre, precio_unitario, stock, precio_paquete, unidades_por_paquete)} de una vez."""
+    ids = sorted({int(o["producto_id"]) for o in ops
+                  if o.get("tipo") in ("venta", "reposicion") and str(o.get("producto_id", "")).isdigit()})
+    filas = conn.execute(
+        """SELECT id, nombre, precio_unitario, cantidad_stock, precio_paquete, unidades_por_paquete
+           FROM productos WHERE id IN (SELECT value FROM json_each(?))""", (json.dumps(ids),)).fetchall()
+    return {f[0]: f for f in filas}
+
+def _validar(op, productos: dict, stock: dict) -> dict:
+    """Fila lista para la tabla temporal; ValueError con el motivo si no se puede aplicar."""
+    tipo = op.get("tipo")
+    if tipo not in TIPOS:
+        raise ValueError(f"tipo desconocido: {tipo}")
+    fila = {"tipo": tipo, "fecha": _fecha(op.get("fecha")), "producto_id": None, "producto": None,
+            "modo": None, "cantidad": None, "unidades": 0, "precio": None, "total": None,
+            "motivo": None, "costo_unit": None, "proveedor": None}
+    if tipo == "gasto":
+        motivo = str(op.get("motivo") or "").strip()
+        if not motivo:
+            raise ValueError("gasto sin motivo")
+        fila.update(motivo=motivo, total=float(op["monto"]))
+        return fila
+
+    prod = productos.get(int(op["producto_id"])) if str(op.get("producto_id", "")).isdigit() else None
+    if prod is None:
+        raise ValueError("producto no encontrado")
+    pid, nombre, precio_unitario, _stock, precio_paquete, unidades_por_paquete = prod
+    cantidad = int(op["cantidad"])
+    if cantidad <= 0:
+        raise ValueError("cantidad inválida")
+    fila.update(producto_id=pid, producto=nombre, cantidad=cantidad)
+
+    if tipo == "reposicion":
+        costo = op.get("costo_unit")
+        fila.update(unidades=cantidad, costo_unit=float(costo) if costo not in (None, "") else None,
+                    proveedor=(str(op.get("proveedor") or "").strip() or None))
+        stock[pid] += cantidad
+        return fila
+
+    modo = op.get("modo") or "unidad"
+    if modo == "paquete":
+        if not precio_paquete or not unidades_por_paquete:
+            raise ValueError("el producto no tiene precio de paquete o unidades por paquete")
+        precio, unidades = float(precio_paquete), cantidad * int(unidades_por_paquete)
+    else:
+        precio, unidades = float(precio_unitario), cantidad
+    if stock[pid] < unidades:
+        raise ValueError("no hay suficiente stock")
+    stock[pid] -= unidades
+    fila.update(modo=modo, unidades=-unidades, precio=precio, total=round(precio * cantidad, 2))
+    return fila
+
+_LOTE = """CREATE TEMP TABLE IF NOT EXISTS sync_lote (
+    n INTEGER PRIMARY KEY, clave TEXT, tipo TEXT, fecha TEXT, producto_id INTEGER, producto TEXT,
+    modo TEXT, cantidad INTEGER, unidades INTEGER, precio REAL, total REAL, motivo TEXT,
+    costo_unit REAL, proveedor TEXT, ref_id INTEGER)"""
+
+def _enlazar(conn, tabla: str, tipo: str, antes: int) -> None:
+    """
+    ref_id de cada fila del lote = id que le tocó en `tabla`. Los INSERT ... SELECT
+    van en orden de n y con el lock de escritura: el k-ésimo id nuevo es la k-ésima fila.
+    """
+    conn.execute(f"""
+        WITH nuevos AS (SELECT id, ROW_NUMBER() OVER (ORDER BY id) AS k FROM {tabla} WHERE id > ?),
+             lote AS (SELECT n, ROW_NUMBER() OVER (ORDER BY n) AS k FROM sync_lote WHERE tipo = ?)
+        UPDATE sync_lote SET ref_id = (SELECT nuevos.id FROM lote JOIN nuevos USING (k)
+                                       WHERE lote.n = sync_lote.n)
+        WHERE tipo = ?""", (antes, tipo, tipo))
+
+def _max_id(conn, tabla: str) -> int:
+    return conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabla}").fetchone()[0]
+
+def _insertar(conn, terminal) -> None:
+    """Aplica sync_lote por conjunto. Corre dentro de la transacción del lote."""
+    antes = _max_id(conn, "ventas")
+    conn.execute("""INSERT INTO ventas (fecha, producto, cantidad, precio_unit, total, modo, producto_id)
+                    SELECT fecha, producto, cantidad, precio, total, modo, producto_id
+                    FROM sync_lote WHERE tipo = 'venta' ORDER BY n""")
+    _enlazar(conn, "ventas", "venta", antes)
+    # Doble escritura en encabezado/detalle, como registrar_venta
+    antes_enc = _max_id(conn, "ventas_enc")
+    conn.execute("""INSERT INTO ventas_enc (fecha, total, origen_venta_id)
+                    SELECT fecha, total, ref_id FROM sync_lote WHERE tipo = 'venta' ORDER BY n""")
+    conn.execute("""INSERT INTO venta_items (venta_id, producto_id, modo, cantidad, unidades, precio_unit, subtotal)
+                    SELECT e.id, l.producto_id, l.modo, l.cantidad, -l.unidades, l.precio, l.total
+                    FROM ventas_enc e JOIN sync_lote l ON l.tipo = 'venta' AND l.ref_id = e.origen_venta_id
+                    WHERE e.id > ?""", (antes_enc,))
+
+    antes = _max_id(conn, "reposiciones")
+    conn.execute("""INSERT INTO reposiciones (fecha, producto_id, cantidad, costo_unit, proveedor)
+                    SELECT fecha, producto_id, cantidad, costo_unit, proveedor
+                    FROM sync_lote WHERE tipo = 'reposicion' ORDER BY n""")
+    _enlazar(conn, "reposiciones", "reposicion", antes)
+
+    antes = _max_id(conn, "gastos")
+    conn.execute("""INSERT INTO gastos (fecha, motivo, monto)
+                    SELECT fecha, motivo, total FROM sync_lote WHERE tipo = 'gasto' ORDER BY n""")
+    _enlazar(conn, "gastos", "gasto", antes)
+
+    # Stock: un solo UPDATE con el neto de cada producto del lote
+    conn.execute("""UPDATE productos SET cantidad_stock = cantidad_stock +
+                        (SELECT SUM(unidades) FROM sync_lote l WHERE l.producto_id = productos.id)
+                    WHERE id IN (SELECT producto_id FROM sync_lote WHERE unidades <> 0)""")
+    conn.execute("""INSERT INTO stock_movimientos
+                        (fecha, producto_id, tipo, referencia, cantidad_unidades, precio_unit, costo_unit)
+                    SELECT fecha, producto_id, tipo,
+                           CASE tipo WHEN 'venta' THEN 'venta:' ELSE 'repo:' END || ref_id,
+                           unidades, precio, costo_unit
+                    FROM sync_lote WHERE tipo IN ('venta', 'reposicion') ORDER BY n""")
+    conn.execute("""INSERT INTO sync_claves (clave, terminal, tipo, resultado, creado_en)
+                    SELECT clave, ?, tipo, json_object('clave', clave, 'estado', 'ok', 'id', ref_id),
+                           datetime('now', 'localtime')
+                    FROM sync_lote ORDER BY n""", (terminal,))
+
+def aplicar_lote(conn, operaciones, terminal: str = None) -> list:
+    """
+    Aplica el lote en una transacción y devuelve un resultado por operación.
+    `conn` es de escritura (wsgi.get_conn); las filas aplicadas quedan en
+    sync_lote (temporal) hasta el próximo lote, para avisar a los tableros.
+    """
+    if not isinstance(operaciones, list):
+        raise LoteInvalido("'operaciones' debe ser una lista")
+    if len(operaciones) > int(os.getenv("SYNC_MAX_OPERACIONES", "1000")):
+        raise LoteInvalido("demasiadas operaciones en un lote")
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute(_LOTE)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM sync_lote")
+        dias = int(os.getenv("SYNC_CLAVES_DIAS", "30"))
+        conn.execute("DELETE FROM sync_claves WHERE creado_en < ?",
+                     ((datetime.now() - timedelta(days=dias)).strftime("%Y-%m-%d %H:%M:%S"),))
+
+        claves = [str(o.get("clave") or "") if isinstance(o, dict) else "" for o in operaciones]
+        previas = dict(conn.execute(
+            "SELECT clave, resultado FROM sync_claves WHERE clave IN (SELECT value FROM json_each(?))",
+            (json.dumps([c for c in claves if c]),)).fetchall())
+        validas = [o for o in operaciones if isinstance(o, dict)]
+        productos = _productos(conn, validas)
+        stock = {pid: p[3] or 0 for pid, p in productos.items()}
+
+        resultados, filas, vistas = [], [], set()
+        for n, (clave, op) in enumerate(zip(claves, operaciones)):
+            if not clave:
+                resultados.append({"clave": None, "estado": "error", "error": "operación sin clave"})
+            elif clave in previas:
+                resultados.append({**json.loads(previas[clave]), "estado": "duplicado"})
+            elif clave in vistas:
+                resultados.append({"clave": clave, "estado": "duplicado"})
+            else:
+                try:
+                    fila = _validar(op, productos, stock)
+                except (ValueError, TypeError, KeyError) as e:
+                    msg = f"falta {e}" if isinstance(e, KeyError) else str(e)
+                    resultados.append({"clave": clave, "estado": "error", "error": msg})
+                    continue
+                vistas.add(clave)
+                filas.append({"n": n, "clave": clave, **fila})
+                resultados.append(None)   # se completa con el id después del INSERT
+
+        conn.executemany(
+            """INSERT INTO sync_lote (n, clave, tipo, fecha, producto_id, producto, modo, cantidad, unidades,
+                                      precio, total, motivo, costo_unit, proveedor)
+               VALUES (:n, :clave, :tipo, :fecha, :producto_id, :producto, :modo, :cantidad, :unidades,
+                       :precio, :total, :motivo, :costo_unit, :proveedor)""", filas)
+        if filas:
+            _insertar(conn, terminal)
+            valuation.aplicar(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    for n, clave, ref_id in conn.execute("SELECT n, clave, ref_id FROM sync_lote ORDER BY n"):
+        resultados[n] = {"clave": clave, "estado": "ok", "id": ref_id}
+    return resultados
+
+def reclamar_clave(conn, clave: str, tipo: str) -> bool:
+    """
+    Para formularios (registrar_venta): registra `clave` dentro de la transacción
+    en curso. False si ya estaba, es decir, el POST es un reenvío.
+    """
+    cur = conn.execute(
+        """INSERT OR IGNORE INTO sync_claves (clave, terminal, tipo, resultado, creado_en)
+           VALUES (?, 'web', ?, json_object('clave', ?, 'estado', 'ok'), datetime('now', 'localtime'))""",
+        (clave, tipo, clave))
+    return cur.rowcount == 1
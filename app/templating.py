@@ -0,0 +1,111 @@
+# app/templating.py
+"""
+Ajustes del entorno Jinja: caché de bytecode en disco, precompilación y
+caché de fragmentos HTML.
+
+Caché de fragmentos:
+    {% cache "venta_productos", productos_version %}
+      ... bucle caro ...
+    {% endcache %}
+
+La clave es la tupla de argumentos; si alguno es None/indefinido el bloque se
+renderiza siempre (sin caché), así una vista que no pasa la versión nunca sirve
+HTML viejo.
+"""
+import os
+import threading
+from pathlib import Path
+
+from jinja2 import FileSystemBytecodeCache, nodes, Undefined
+from jinja2.ext import Extension
+from jinja2.utils import LRUCache
+
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "128"))
+
+class FragmentCacheExtension(Extension):
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=LRUCache(FRAGMENT_CACHE_SIZE))
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_render_cached", [nodes.List(args)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, key_parts, caller):
+        if any(p is None or isinstance(p, Undefined) for p in key_parts):
+            return caller()
+        key = tuple(key_parts)
+        cache = self.environment.fragment_cache
+        html = cache.get(key)
+        if html is None:
+            html = caller()
+            cache[key] = html
+        return html
+
+class LazyRows:
+    """
+    Filas que sólo se consultan si la plantilla las recorre. Junto con
+    {% cache %} evita traer el catálogo completo cuando el fragmento ya está
+    en caché.
+    """
+    def __init__(self, loader):
+        self._loader = loader
+        self._rows = None
+
+    def _load(self):
+        if self._rows is None:
+            self._rows = list(self._loader())
+        return self._rows
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __getitem__(self, i):
+        return self._load()[i]
+
+def configure_bytecode_cache(app, cache_dir) -> Path:
+    """
+    Guarda el bytecode de las plantillas en `cache_dir` para no volver a
+    parsear/compilar en cada arranque. Debe llamarse antes del primer render
+    (Flask crea app.jinja_env de forma perezosa).
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # jinja_options es un dict de clase: se copia para no tocar otras apps
+    app.jinja_options = {**app.jinja_options, "bytecode_cache": FileSystemBytecodeCache(str(cache_dir))}
+    return cache_dir
+
+def configure_jinja(app, cache_dir) -> None:
+    """Bytecode persistente + etiqueta {% cache %}. Se usa en create_app() y wsgi.py."""
+    configure_bytecode_cache(app, os.getenv("JINJA_CACHE_DIR") or cache_dir)
+    extensions = list(app.jinja_options.get("extensions", ()))
+    extensions.append(FragmentCacheExtension)
+    app.jinja_options = {**app.jinja_options, "extensions": extensions}
+
+def precompile_templates(app) -> int:
+    """Carga todas las plantillas; las que no estaban en caché quedan escritas."""
+    env = app.jinja_env
+    n = 0
+    for name in env.list_templates(extensions=("html",)):
+        try:
+            env.get_template(name)
+            n += 1
+        except Exception:
+            # Una plantilla rota no debe impedir el arranque; fallará al usarse
+            app.logger.warning("No se pudo precompilar %s", name, exc_info=True)
+    return n
+
+def precompile_in_background(app) -> threading.Thread:
+    t = threading.Thread(target=precompile_templates, args=(app,), name="jinja-precompile", daemon=True)
+    t.start()
+    return t
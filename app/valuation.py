@@ -0,0 +1,326 @@
+# app/valuation.py
+"""
+Valuación del stock y costo de lo vendido (inventario.db), incremental.
+
+    python -m app.valuation inventario.db             # pone al día lo pendiente
+    python -m app.valuation inventario.db --rehacer   # borra el estado y recorre todo el kardex
+
+Recorre stock_movimientos en orden de id a partir del último procesado
+(config 'valuacion_ultimo_mov') y actualiza lo de abajo. La primera vez (y
+con --rehacer) abre cada producto con el stock que el kardex no explica
+(cantidad_stock - SUM(kardex): stock de antes del kardex, historial
+archivado) al primer costo conocido del producto.
+
+  valuacion          por producto: unidades, valor y costo promedio ponderado;
+                     valor_fifo con las capas abiertas
+  valuacion_capas    capas FIFO con saldo (VALUACION_FIFO=1, por defecto):
+                     una por entrada, se consumen de la más vieja a la más nueva
+  valuacion_mensual  por mes y producto: unidades vendidas, ingresos, costo
+                     promedio, costo FIFO y ajustes negativos (mermas)
+
+Las ventas, reposiciones, compras y el alta o edición de productos llaman
+a aplicar() dentro de su propia transacción, después de escribir el kardex: el costo queda al día con cada
+movimiento y sólo se procesa lo nuevo. Si algún camino no lo llama, la
+próxima llamada lo recupera (va por id). Lo atrasado (base nueva, kardex
+importado, --rehacer) lo pone al día un hilo cada VALUACION_INTERVAL
+segundos (300; 0 lo apaga), no el arranque.
+
+Reglas:
+- Una entrada sin costo_unit entra al costo promedio vigente (no lo diluye).
+- Una salida sin capas suficientes (historial archivado o stock negativo)
+  cuesta el faltante al costo promedio y lo deja como capa negativa: la
+  próxima entrada lo salda antes de abrir su capa, así FIFO y promedio
+  tienen siempre las mismas unidades.
+- Los ingresos salen del total de la venta (referencia venta:N o
+  venta_enc:N); si no, precio_unit por unidades.
+
+El reporte de margen suma valuacion_mensual: O(productos x meses), nunca el
+historial de movimientos.
+"""
+import json
+import logging
+import os
+import sqlite3
+from collections import defaultdict, deque
+
+from .db import tune_connection
+from .periodic import Periodico
+
+log = logging.getLogger("valuation")
+
+def fifo_activo() -> bool:
+    return os.getenv("VALUACION_FIFO", "1").lower() in ("1", "true", "yes", "on")
+
+def _config(conn, clave, defecto=None):
+    row = conn.execute("SELECT valor FROM config WHERE clave = ?", (clave,)).fetchone()
+    return row[0] if row else defecto
+
+def _ingresos(conn, movs) -> dict:
+    """{referencia: total} de las ventas del lote, en dos consultas."""
+    ids = {"venta": [], "venta_enc": []}
+    for m in movs:
+        tipo, _, num = (m[4] or "").partition(":")
+        if m[3] == "venta" and tipo in ids and num.isdigit():
+            ids[tipo].append(int(num))
+    totales = {}
+    for tipo, tabla in (("venta", "ventas"), ("venta_enc", "ventas_enc")):
+        if ids[tipo]:
+            totales.update((f"{tipo}:{i}", t) for i, t in conn.execute(
+                f"SELECT id, total FROM {tabla} WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(ids[tipo]),)))
+    return totales
+
+def _apertura(conn, fifo: bool) -> int:
+    """
+    Saldo inicial por producto: el stock que el kardex no explica
+    (cantidad_stock - SUM(kardex)). Entra antes del primer movimiento, al
+    primer costo conocido del producto (0 si no hay). Devuelve cuántos abrió.
+    """
+    filas = [(pid, saldo, fecha, costo or 0.0) for pid, saldo, fecha, costo in conn.execute(
+        """SELECT p.id, p.cantidad_stock - COALESCE(SUM(m.cantidad_unidades), 0), COALESCE(p.fecha_registro, ''),
+                  (SELECT c.costo_unit FROM stock_movimientos c
+                   WHERE c.producto_id = p.id AND c.costo_unit IS NOT NULL ORDER BY c.id LIMIT 1)
+           FROM productos p LEFT JOIN stock_movimientos m ON m.producto_id = p.id
+           GROUP BY p.id""") if saldo]
+    conn.executemany(
+        """INSERT OR REPLACE INTO valuacion (producto_id, unidades, valor, costo_promedio, valor_fifo, actualizado_en)
+           VALUES (?, ?, ?, ?, ?, datetime('now', 'localtime'))""",
+        [(pid, saldo, max(saldo, 0) * costo, costo, max(saldo, 0) * costo if fifo else None)
+         for pid, saldo, _, costo in filas])
+    if fifo:
+        conn.executemany(
+            """INSERT INTO valuacion_capas (producto_id, mov_id, fecha, restantes, costo_unit)
+               VALUES (?, 0, ?, ?, ?)""",
+            [(pid, fecha, saldo, costo) for pid, saldo, fecha, costo in filas])
+    return len(filas)
+
+# ---------- Incremental ----------
+def aplicar(conn, limite: int = None) -> int:
+    """
+    Procesa los movimientos nuevos; devuelve cuántos. No hace commit: corre
+    dentro de la transacción de quien escribió el kardex.
+    """
+    fifo = fifo_activo()
+    desde = _config(conn, "valuacion_ultimo_mov")
+    abiertos = 0
+    if desde is None:
+        # Primera vez (o --rehacer): primero el stock de antes del kardex
+        abiertos = _apertura(conn, fifo)
+        conn.execute("INSERT OR REPLACE INTO config (clave, valor) VALUES ('valuacion_ultimo_mov', '0')")
+    movs = conn.execute(
+        """SELECT id, fecha, producto_id, tipo, referencia, cantidad_unidades, precio_unit, costo_unit
+           FROM stock_movimientos WHERE id > ? ORDER BY id LIMIT ?""", (int(desde or 0), limite or -1)).fetchall()
+    if not movs:
+        if abiertos:
+            conn.execute("UPDATE data_versions SET version = version + 1 WHERE tabla = 'valuacion'")
+        return 0
+    pids = json.dumps(sorted({m[2] for m in movs}))
+
+    # Estado de los productos tocados: [unidades, valor, costo promedio]
+    estado = defaultdict(lambda: [0.0, 0.0, 0.0])
+    for pid, u, v, c in conn.execute(
+            """SELECT producto_id, unidades, valor, costo_promedio FROM valuacion
+               WHERE producto_id IN (SELECT value FROM json_each(?))""", (pids,)):
+        estado[pid] = [u, v, c]
+    capas = defaultdict(deque)   # pid -> [[id o None, restantes, costo, mov_id, fecha]]
+    if fifo:
+        for cid, pid, r, c, mov_id, fecha in conn.execute(
+                """SELECT id, producto_id, restantes, costo_unit, mov_id, fecha FROM valuacion_capas
+                   WHERE producto_id IN (SELECT value FROM json_each(?)) ORDER BY producto_id, id""", (pids,)):
+            capas[pid].append([cid, r, c, mov_id, fecha])
+    agotadas = []
+    ingresos = _ingresos(conn, movs)
+    meses = defaultdict(lambda: [0.0, 0.0, 0.0, 0.0, 0.0])   # unidades, ingresos, costo, costo_fifo, ajustes
+
+    for mov_id, fecha, pid, tipo, ref, q, precio, costo_unit in movs:
+        st = estado[pid]
+        if q > 0:
+            costo = float(costo_unit) if costo_unit is not None else st[2]
+            if st[0] <= 0:
+                # Sin stock (o negativo por ventas de más): el promedio arranca de nuevo
+                st[0] += q
+                st[2] = costo
+                st[1] = max(st[0], 0) * costo
+            else:
+                st[0] += q
+                st[1] += q * costo
+                st[2] = st[1] / st[0]
+            if fifo:
+                cola = capas[pid]
+                entra = float(q)
+                if cola and cola[0][1] < 0:
+                    # Primero salda el faltante de ventas sin stock: esas unidades ya se fueron
+                    deficit = cola[0]
+                    tomado = min(entra, -deficit[1])
+                    deficit[1] += tomado
+                    entra -= tomado
+                    if deficit[1] >= -1e-9:
+                        cola.popleft()
+                        if deficit[0] is not None:
+                            agotadas.append((deficit[0],))
+                if entra > 1e-9:
+                    cola.append([None, entra, costo, mov_id, fecha])
+            continue
+        if q == 0:
+            continue
+
+        u = -q
+        costo = u * st[2]
+        st[0] -= u
+        st[1] = st[0] * st[2] if st[0] > 0 else 0.0
+        costo_fifo = 0.0
+        if fifo:
+            falta = float(u)
+            cola = capas[pid]
+            while falta > 1e-9 and cola and cola[0][1] > 0:
+                capa = cola[0]
+                tomado = min(falta, capa[1])
+                costo_fifo += tomado * capa[2]
+                capa[1] -= tomado
+                falta -= tomado
+                if capa[1] <= 1e-9:
+                    cola.popleft()
+                    if capa[0] is not None:
+                        agotadas.append((capa[0],))
+            costo_fifo += falta * (costo / u)   # faltante al costo promedio
+            if falta > 1e-9:
+                # Capa negativa (una sola, al frente): la próxima entrada la descuenta
+                if cola:
+                    cola[0][1] -= falta
+                else:
+                    cola.append([None, -falta, costo / u, mov_id, fecha])
+        mes = meses[(fecha[:7], pid)]
+        if tipo == "venta":
+            mes[0] += u
+            mes[1] += float(ingresos.get(ref, (precio or 0) * u))
+            mes[2] += costo
+            mes[3] += costo_fifo
+        else:
+            mes[4] += costo
+
+    conn.executemany(
+        """INSERT INTO valuacion (producto_id, unidades, valor, costo_promedio, valor_fifo, actualizado_en)
+           VALUES (?, ?, ?, ?, ?, datetime('now', 'localtime'))
+           ON CONFLICT(producto_id) DO UPDATE SET
+             unidades = excluded.unidades, valor = excluded.valor, costo_promedio = excluded.costo_promedio,
+             valor_fifo = excluded.valor_fifo, actualizado_en = excluded.actualizado_en""",
+        [(pid, u, round(v, 6), round(c, 6),
+          round(sum(k[1] * k[2] for k in capas[pid] if k[1] > 0), 6) if fifo else None)
+         for pid, (u, v, c) in estado.items()])
+    if fifo:
+        conn.executemany("DELETE FROM valuacion_capas WHERE id = ?", agotadas)
+        conn.executemany("UPDATE valuacion_capas SET restantes = ? WHERE id = ?",
+                         [(k[1], k[0]) for cola in capas.values() for k in cola if k[0] is not None])
+        conn.executemany(
+            """INSERT INTO valuacion_capas (producto_id, mov_id, fecha, restantes, costo_unit)
+               VALUES (?, ?, ?, ?, ?)""",
+            [(pid, k[3], k[4], k[1], k[2]) for pid, cola in capas.items() for k in cola if k[0] is None])
+    conn.executemany(
+        """INSERT INTO valuacion_mensual (mes, producto_id, unidades, ingresos, costo, costo_fifo, ajustes)
+           VALUES (?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT(mes, producto_id) DO UPDATE SET
+             unidades = unidades + excluded.unidades, ingresos = ingresos + excluded.ingresos,
+             costo = costo + excluded.costo,
+             costo_fifo = CASE WHEN excluded.costo_fifo IS NULL THEN costo_fifo
+                               ELSE COALESCE(costo_fifo, 0) + excluded.costo_fifo END,
+             ajustes = ajustes + excluded.ajustes""",
+        [(mes, pid, u, i, c, cf if fifo else None, a) for (mes, pid), (u, i, c, cf, a) in meses.items()])
+    conn.execute("INSERT OR REPLACE INTO config (clave, valor) VALUES ('valuacion_ultimo_mov', ?)",
+                 (str(movs[-1][0]),))
+    conn.execute("UPDATE data_versions SET version = version + 1 WHERE tabla = 'valuacion'")
+    return len(movs)
+
+# ---------- Consultas (sobre lo materializado) ----------
+def inventario(conn) -> dict:
+    """Valor del stock actual: totales y por producto."""
+    filas = conn.execute(
+        """SELECT p.id, p.nombre, v.unidades, v.costo_promedio, v.valor, v.valor_fifo
+           FROM valuacion v JOIN productos p ON p.id = v.producto_id
+           ORDER BY v.valor DESC, p.nombre""").fetchall()
+    return {
+        "valor": round(sum(f[4] for f in filas), 2),
+        "valor_fifo": round(sum(f[5] or 0 for f in filas), 2) if fifo_activo() else None,
+        "productos": filas,
+    }
+
+def margen(conn, desde_mes: str, hasta_mes: str) -> dict:
+    """COGS y margen por producto entre dos meses (YYYY-MM, inclusivos)."""
+    filas = conn.execute(
+        """SELECT m.producto_id, COALESCE(p.nombre, '#' || m.producto_id) AS nombre,
+                  SUM(m.unidades), SUM(m.ingresos), SUM(m.costo), SUM(m.costo_fifo), SUM(m.ajustes)
+           FROM valuacion_mensual m LEFT JOIN productos p ON p.id = m.producto_id
+           WHERE m.mes >= ? AND m.mes <= ?
+           GROUP BY m.producto_id ORDER BY SUM(m.ingresos) - SUM(m.costo) DESC""",
+        (desde_mes, hasta_mes)).fetchall()
+    productos = []
+    tot = defaultdict(float)
+    for pid, nombre, u, ing, costo, costo_fifo, ajustes in filas:
+        productos.append({
+            "producto_id": pid, "nombre": nombre, "unidades": u, "ingresos": round(ing, 2),
+            "costo": round(costo, 2), "margen": round(ing - costo, 2),
+            "margen_pct": round((ing - costo) * 100 / ing, 1) if ing else None,
+            "costo_fifo": round(costo_fifo, 2) if costo_fifo is not None else None,
+            "ajustes": round(ajustes, 2),
+        })
+        for k, v in (("ingresos", ing), ("costo", costo), ("costo_fifo", costo_fifo or 0), ("ajustes", ajustes)):
+            tot[k] += v
+    ingresos = tot["ingresos"]
+    return {
+        "totales": {"ingresos": round(ingresos, 2), "costo": round(tot["costo"], 2),
+                    "margen": round(ingresos - tot["costo"], 2),
+                    "margen_pct": round((ingresos - tot["costo"]) * 100 / ingresos, 1) if ingresos else None,
+                    "costo_fifo": round(tot["costo_fifo"], 2) if fifo_activo() else None,
+                    "ajustes": round(tot["ajustes"], 2)},
+        "productos": productos,
+    }
+
+# ---------- Puesta al día ----------
+def run(db_path: str, rehacer: bool = False, tanda: int = None) -> int:
+    """Procesa lo pendiente por tandas de VALUACION_TANDA movimientos (5000), una transacción cada una."""
+    tanda = tanda or int(os.getenv("VALUACION_TANDA", "5000"))
+    conn = tune_connection(sqlite3.connect(db_path), "tareas")
+    total = 0
+    try:
+        if rehacer:
+            with conn:
+                for tabla in ("valuacion", "valuacion_capas", "valuacion_mensual"):
+                    conn.execute(f"DELETE FROM {tabla}")
+                conn.execute("DELETE FROM config WHERE clave = 'valuacion_ultimo_mov'")
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                n = aplicar(conn, tanda)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if not n:
+                break
+            total += n
+            log.info("Valuación: %d movimientos procesados", total)
+    finally:
+        conn.close()
+    return total
+
+_programadores = {}
+
+def programar(db_path: str) -> None:
+    """Puesta al día cada VALUACION_INTERVAL segundos (300) en un hilo del worker; 0 la apaga."""
+    intervalo = float(os.getenv("VALUACION_INTERVAL", "300"))
+    if intervalo <= 0:
+        return
+    prog = _programadores.get(db_path)
+    if prog is None:
+        prog = _programadores.setdefault(db_path, Periodico(
+            "valuacion", lambda: run(db_path) > 0, intervalo,
+            db_path + ".valuation.lock", espera=intervalo))
+    prog.start()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Valuación de stock y costo de lo vendido")
+    ap.add_argument("db")
+    ap.add_argument("--rehacer", action="store_true", help="recalcula desde el primer movimiento")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(run(args.db, rehacer=args.rehacer))
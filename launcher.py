@@ -1,8 +1,10 @@
-# launcher.py
 import os
 import sys
+import time
+import logging
 import pathlib
-from app import create_app
+
+log = logging.getLogger("launcher")
 
 def ensure_env(base_dir: pathlib.Path):
     env_path = base_dir / ".env"
@@ -20,7 +22,16 @@ def get_base_dir() -> pathlib.Path:
         return pathlib.Path(sys.executable).resolve().parent
     return pathlib.Path(__file__).resolve().parent
 
+def log_startup(t_inicio: float, t_import: float, app) -> None:
+    """Desglose del arranque: import del paquete + etapas de create_app()."""
+    partes = [f"import={t_import:.0f}ms"]
+    partes += [f"{etapa}={ms:.0f}ms" for etapa, ms in app.config.get("STARTUP_TIMINGS", [])]
+    total = (time.perf_counter() - t_inicio) * 1000.0
+    log.info("Arranque listo en %.0f ms (%s)", total, ", ".join(partes))
+
 def main():
+    t_inicio = time.perf_counter()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s")
     base_dir = get_base_dir()
 
     # Asegura data/ y .env al lado del ejecutable
@@ -35,8 +46,31 @@ def main():
     os.environ.setdefault("HOST", "0.0.0.0")
     os.environ.setdefault("PORT", "5000")
 
+    # Arranque rápido por defecto: plantillas precompiladas en data/jinja_cache
+    os.environ.setdefault("FAST_START", "1")
+
+    # Producción (por defecto): varios procesos con hilos, ver app/server.py.
+    # --dev o SERVER_MODE=dev usa el servidor de desarrollo de un solo proceso.
+    if "--dev" in sys.argv[1:]:
+        os.environ["SERVER_MODE"] = "dev"
+    if os.environ.get("SERVER_MODE", "prod") != "dev":
+        from app.server import serve
+        serve("app:create_app()")
+        return
+
+    # Import diferido para poder medirlo (Flask, Jinja, blueprint...)
+    t = time.perf_counter()
+    from app import create_app
+    t_import = (time.perf_counter() - t) * 1000.0
+
     app = create_app()
+    log_startup(t_inicio, t_import, app)
     app.run(host=os.environ["HOST"], port=int(os.environ["PORT"]))
 
 if __name__ == "__main__":
+    # Antes que nada: en el binario, los hijos del pool de reportes (spawn,
+    # app/report_engine.py) vuelven a entrar por acá y deben quedarse en el
+    # pool, no arrancar otro servidor
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
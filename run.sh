@@ -10,11 +10,15 @@ fi
 # Activar venv
 source venv/bin/activate
 
-# Exportar variables para Flask
-export FLASK_APP=app:create_app
-# Si PORT/HOST no están en .env, usa defaults:
-export FLASK_RUN_PORT=${PORT:-5000}
-export FLASK_RUN_HOST=${HOST:-0.0.0.0}
+# ./run.sh --dev  -> servidor de desarrollo de Flask (un proceso, recarga de código)
+if [ "${1:-}" = "--dev" ]; then
+  export FLASK_APP=app:create_app
+  # Si PORT/HOST no están en .env, usa defaults:
+  export FLASK_RUN_PORT=${PORT:-5000}
+  export FLASK_RUN_HOST=${HOST:-0.0.0.0}
+  exec flask run
+fi
 
-# Levantar
-flask run
+# Producción: gunicorn pre-fork con hilos (WORKERS/THREADS/TIMEOUT... ver app/server.py)
+# Recarga sin cortar requests: kill -HUP <pid>
+exec python -m app.server "app:create_app()"
@@ -0,0 +1,139 @@
+# scripts/build_assets.py
+"""
+Genera app/static/dist/ para servir todo sin CDNs:
+
+  1) Descarga (una vez) las librerías a app/static/vendor/ (versiones fijas).
+  2) Compila el CSS de Tailwind purgado con la CLI (tailwind.config.js).
+  3) Copia cada archivo con el hash de su contenido en el nombre,
+     reescribe las url() de los CSS y escribe manifest.json.
+  4) Precomprime .gz (y .br si está instalado `brotli`).
+
+Uso:
+    python scripts/build_assets.py
+    TAILWIND_BIN=/ruta/tailwindcss python scripts/build_assets.py
+
+La CLI de Tailwind puede ser el binario standalone
+(https://github.com/tailwindlabs/tailwindcss/releases) o `npx tailwindcss`.
+Sin CLI se omite tailwind.css y base_tw.html usa el compilador del navegador.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+STATIC = ROOT / "app" / "static"
+VENDOR = STATIC / "vendor"
+SRC = STATIC / "src"
+DIST = STATIC / "dist"
+
+# nombre lógico -> URL fija
+VENDOR_URLS = {
+    "flowbite.min.js": "https://cdn.jsdelivr.net/npm/flowbite@2.5.1/dist/flowbite.min.js",
+    "chart.umd.min.js": "https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js",
+    "InterVariable.woff2": "https://rsms.me/inter/font-files/InterVariable.woff2?v=4.0",
+    "InterVariable-Italic.woff2": "https://rsms.me/inter/font-files/InterVariable-Italic.woff2?v=4.0",
+    "login-bg.jpg": "https://images.pexels.com/photos/2523959/pexels-photo-2523959.jpeg?auto=compress&w=1600",
+}
+
+# Fuentes ya comprimidas: no vale la pena gzip/br
+NO_COMPRIMIR = {".woff2", ".jpg", ".jpeg", ".png", ".webp"}
+
+def descargar_vendor() -> None:
+    VENDOR.mkdir(parents=True, exist_ok=True)
+    for nombre, url in VENDOR_URLS.items():
+        destino = VENDOR / nombre
+        if destino.exists():
+            continue
+        print(f"⬇️  {nombre}")
+        try:
+            with urllib.request.urlopen(url, timeout=30) as r:
+                destino.write_bytes(r.read())
+        except Exception as e:
+            print(f"⚠️  No se pudo descargar {nombre}: {e}")
+
+def compilar_tailwind(salida: Path) -> bool:
+    bin_ = os.getenv("TAILWIND_BIN") or shutil.which("tailwindcss")
+    cmd = [bin_] if bin_ else (["npx", "--yes", "tailwindcss@3"] if shutil.which("npx") else None)
+    if not cmd:
+        print("⚠️  Sin CLI de Tailwind: se omite tailwind.css")
+        return False
+    cmd += ["-c", str(ROOT / "tailwind.config.js"), "-i", str(SRC / "tailwind.css"),
+            "-o", str(salida), "--minify"]
+    try:
+        subprocess.run(cmd, cwd=ROOT, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"⚠️  Falló Tailwind: {e}")
+        return False
+    return True
+
+def _hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:10]
+
+def _con_huella(nombre: str, data: bytes) -> str:
+    base, ext = os.path.splitext(nombre)
+    return f"{base}.{_hash(data)}{ext}"
+
+def _comprimir(path: Path) -> None:
+    if path.suffix in NO_COMPRIMIR:
+        return
+    data = path.read_bytes()
+    with gzip.open(str(path) + ".gz", "wb", compresslevel=9) as f:
+        f.write(data)
+    try:
+        import brotli
+    except ImportError:
+        return
+    Path(str(path) + ".br").write_bytes(brotli.compress(data, quality=11))
+
+def construir() -> dict:
+    descargar_vendor()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fuentes = {}  # nombre lógico -> Path
+        tw = Path(tmp) / "tailwind.css"
+        if compilar_tailwind(tw):
+            fuentes["tailwind.css"] = tw
+        fuentes["style.css"] = STATIC / "style.css"
+        fuentes["dashboard.js"] = STATIC / "dashboard.js"
+        for nombre in VENDOR_URLS:
+            if (VENDOR / nombre).exists():
+                fuentes[nombre] = VENDOR / nombre
+        # inter.css sólo si están las fuentes; si no, asset_url() usa el CDN
+        if "InterVariable.woff2" in fuentes:
+            fuentes["inter.css"] = SRC / "inter.css"
+
+        if DIST.exists():
+            shutil.rmtree(DIST)
+        DIST.mkdir(parents=True)
+
+        manifest = {}
+        # Binarios primero: los CSS referencian sus nombres con huella
+        orden = sorted(fuentes, key=lambda n: n.endswith(".css"))
+        for nombre in orden:
+            data = fuentes[nombre].read_bytes()
+            if nombre.endswith(".css"):
+                texto = data.decode("utf-8")
+                for original, final in manifest.items():
+                    texto = re.sub(rf"url\((['\"]?){re.escape(original)}\1\)", f'url("{final}")', texto)
+                data = texto.encode("utf-8")
+            final = _con_huella(nombre, data)
+            (DIST / final).write_bytes(data)
+            _comprimir(DIST / final)
+            manifest[nombre] = final
+
+    (DIST / "manifest.json").write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    return manifest
+
+if __name__ == "__main__":
+    m = construir()
+    faltan = sorted((set(VENDOR_URLS) | {"tailwind.css", "inter.css"}) - set(m))
+    print(f"✅ {len(m)} archivos en {DIST.relative_to(ROOT)}")
+    if faltan:
+        print("⚠️  Faltan (se usará el CDN de respaldo):", ", ".join(faltan))
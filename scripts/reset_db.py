@@ -1,7 +1,9 @@
-import os, sqlite3
+import os, sys, sqlite3
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.migrations import migrate, MIGRACIONES_APP
 
 DB_PATH = "data/app.db"
-SCHEMA = "scripts/schema.sql"
 
 def reset():
     # 1) Borrar DB si existe
@@ -9,11 +11,9 @@ def reset():
         os.remove(DB_PATH)
     # 2) Asegurar carpeta data/
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    # 3) Crear nueva DB vacía y aplicar schema.sql
+    # 3) Crear nueva DB vacía y aplicar migraciones (schema.sql es el paso 1)
     conn = sqlite3.connect(DB_PATH)
-    with open(SCHEMA, "r", encoding="utf-8") as f:
-        conn.executescript(f.read())
-    conn.commit()
+    migrate(conn, MIGRACIONES_APP)
     conn.close()
     print("✅ Base de datos reiniciada (sin datos).")
 
@@ -0,0 +1,14 @@
+// Usado por scripts/build_assets.py (CLI de Tailwind) para generar el CSS purgado.
+// Mantener los colores en sincronía con el fallback de base_tw.html.
+module.exports = {
+  // Los .js también: dashboard.js arma los avisos de SSE con clases propias
+  content: ["./app/templates/**/*.html", "./app/static/**/*.js"],
+  theme: {
+    extend: {
+      colors: {
+        primary: "#4f46e5",   // Indigo-600 (alineado con el UI oscuro)
+        secondary: "#22c55e", // Emerald-500
+      },
+    },
+  },
+};
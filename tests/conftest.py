@@ -2,3 +2,9 @@
 import os, sys
 # Agrega la carpeta raíz del proyecto al sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Sin hilo de mantenimiento sobre las bases de prueba (los tests lo llaman directo)
+os.environ.setdefault("MAINT_INTERVAL", "0")
+# Ni analítica ni pronóstico en hilos: los tests llaman refresh()/run() directo
+os.environ.setdefault("ANALYTICS_INTERVAL", "0")
+os.environ.setdefault("FORECAST_INTERVAL", "0")
+os.environ.setdefault("VALUACION_INTERVAL", "0")
@@ -0,0 +1,46 @@
+# tests/test_admission.py
+import threading
+import time
+
+from app.admission import Admission, clasificar
+
+def _call(mw, path="/", method="GET"):
+    out = {}
+    def start_response(status, headers, exc_info=None):
+        out["status"], out["headers"] = status, dict(headers)
+    it = mw({"PATH_INFO": path, "REQUEST_METHOD": method}, start_response)
+    body = b"".join(it)
+    if hasattr(it, "close"):
+        it.close()
+    return out["status"], out["headers"], body
+
+def test_clasificacion():
+    assert clasificar({"PATH_INFO": "/registrar_venta", "REQUEST_METHOD": "POST"}) == "pos"
+    assert clasificar({"PATH_INFO": "/export/stock_movimientos.csv", "REQUEST_METHOD": "GET"}) == "heavy"
+    assert clasificar({"PATH_INFO": "/finanzas/stream", "REQUEST_METHOD": "GET"}) == "stream"
+    assert clasificar({"PATH_INFO": "/inventario", "REQUEST_METHOD": "GET"}) == "interactive"
+
+def test_reporte_sobre_el_limite_recibe_429_con_retry_after():
+    entro, soltar = threading.Event(), threading.Event()
+    def app(environ, start_response):
+        start_response("200 OK", [])
+        if environ["PATH_INFO"] == "/export/lento.csv":
+            entro.set(); soltar.wait(2)
+        return [b"ok"]
+    mw = Admission(app, limites={"pos": (4, 4, 1), "interactive": (4, 4, 1), "heavy": (1, 0, 0.1)})
+    t = threading.Thread(target=_call, args=(mw, "/export/lento.csv"))
+    t.start(); entro.wait(2)
+
+    status, headers, _ = _call(mw, "/export/otro.csv")
+    assert status.startswith("429") and headers["Retry-After"] == "10"
+    # una venta no espera detrás del reporte
+    assert _call(mw, "/registrar_venta", "POST")[0] == "200 OK"
+    soltar.set(); t.join()
+    assert mw.stats()["heavy"]["en_curso"] == 0
+
+def test_con_ventas_en_cola_no_entran_reportes():
+    mw = Admission(lambda e, s: (s("200 OK", []), [b""])[1],
+                   limites={"pos": (1, 4, 1), "heavy": (2, 2, 0.05)})
+    mw.clases["pos"].esperando = 1   # simula una venta esperando
+    status, _, _ = _call(mw, "/reportes/reposiciones")
+    assert status.startswith("503")
@@ -0,0 +1,66 @@
+# tests/test_analytics.py
+import os
+import sqlite3
+from datetime import datetime
+
+from app import analytics, create_app
+from app.migrations import migrate, MIGRACIONES_INVENTARIO
+
+HOY = datetime(2024, 6, 30, 12, 0, 0)
+
+def _inventario(tmp_path):
+    ruta = str(tmp_path / "inv.db")
+    conn = sqlite3.connect(ruta)
+    migrate(conn, MIGRACIONES_INVENTARIO)
+    conn.executemany("""INSERT INTO productos (id, nombre, categoria, cantidad_stock, unidades_por_paquete)
+                        VALUES (?,?,?,?,?)""", [
+        (1, "Arroz", "Almacén", 90, 10),
+        (2, "Fideos", "Almacén", 10, None),
+        (3, "Velas", "Bazar", 7, None),
+    ])
+    conn.executemany("INSERT INTO ventas (fecha, producto, cantidad, total, modo) VALUES (?,?,?,?,?)", [
+        ("2024-06-10 10:00:00", "Arroz", 9, 900.0, "paquete"),   # 90 unidades
+        ("2024-06-11", "Fideos", 9, 90.0, "unidad"),
+        ("2023-01-01", "Velas", 1, 5.0, "unidad"),               # fuera de la ventana
+    ])
+    conn.execute("INSERT INTO ventas_enc (id, fecha, total) VALUES (1, '2024-06-20', 10.0)")
+    conn.execute("""INSERT INTO venta_items (venta_id, producto_id, cantidad, unidades, precio_unit, subtotal)
+                    VALUES (1, 2, 1, 1, 10.0, 10.0)""")
+    conn.executemany("""INSERT INTO stock_movimientos (fecha, producto_id, tipo, cantidad_unidades, costo_unit)
+                        VALUES (?,?,?,?,?)""", [
+        ("2024-01-01", 1, "reposicion", 100, 5.0),
+        ("2024-06-01", 1, "reposicion", 80, 6.0),
+        ("2023-01-01", 3, "reposicion", 8, 2.0),
+    ])
+    conn.commit()
+    return ruta, conn
+
+def test_abc_cobertura_y_stock_muerto(tmp_path):
+    _, conn = _inventario(tmp_path)
+    df = analytics.calcular(conn, "inventario", hoy=HOY).set_index("nombre")
+    assert list(df["clase_abc"]) == ["A", "B", "C"]
+    assert df.loc["Arroz", "unidades_vendidas"] == 90          # paquetes -> unidades
+    assert df.loc["Fideos", "ingresos"] == 100.0                # ventas + venta_items
+    assert df.loc["Arroz", "dias_cobertura"] == 90.0            # 90 en stock / 1 por día
+    assert df.loc["Arroz", "valor_stock"] == 540.0              # último costo conocido
+    # Arroz: empezó la ventana con 90 - 80 + 90 = 100, promedio 95
+    assert df.loc["Arroz", "rotacion"] == round(90 / 95, 2)
+    assert df.loc["Velas", "sin_movimiento"] == 1 and df.loc["Fideos", "sin_movimiento"] == 0
+
+def test_refresh_reemplaza_la_tabla_y_sube_la_version(tmp_path):
+    ruta, conn = _inventario(tmp_path)
+    assert analytics.refresh(ruta, "inventario") == 3
+    assert analytics.refresh(ruta, "inventario") == 3
+    assert conn.execute("SELECT COUNT(*) FROM analitica_inventario").fetchone()[0] == 3
+    version = conn.execute("SELECT version FROM data_versions WHERE tabla='analitica_inventario'").fetchone()[0]
+    assert version == 2
+
+def test_pagina_del_reporte(tmp_path, monkeypatch):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_path}/test.db"
+    monkeypatch.setattr(analytics, "programar", lambda *a: None)
+    app = create_app()
+    c = app.test_client()
+    c.post("/login", data={"username": "admin@example.com", "password": "admin123"})
+    analytics.refresh(str(tmp_path / "test.db"), "app")
+    html = c.get("/reportes/inventario?clase=A").get_data(as_text=True)
+    assert "Análisis de inventario" in html and "Stock muerto" in html
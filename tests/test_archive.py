@@ -0,0 +1,66 @@
+# tests/test_archive.py
+import sqlite3
+from datetime import date
+
+from app import archive, reports, report_engine
+from app.db import connect_readonly
+from app.migrations import migrate, MIGRACIONES_INVENTARIO
+
+HOY = date(2025, 3, 1)
+
+def _base(tmp_path):
+    ruta = str(tmp_path / "inv.db")
+    conn = sqlite3.connect(ruta)
+    migrate(conn, MIGRACIONES_INVENTARIO)
+    conn.execute("INSERT INTO productos (id, nombre) VALUES (1, 'Arroz')")
+    conn.executemany("INSERT INTO ventas (fecha, producto, cantidad, total, producto_id) VALUES (?,?,?,?,1)", [
+        ("2022-01-15 10:00:00", "Arroz", 1, 10.0),
+        ("2022-12-31 23:59:00", "Arroz", 2, 20.0),
+        ("2025-02-01", "Arroz", 4, 40.0),
+    ])
+    conn.execute("INSERT INTO gastos (fecha, motivo, monto) VALUES ('2022-06-01', 'Luz', 7.0)")
+    conn.execute("INSERT INTO ventas_enc (id, fecha, total) VALUES (1, '2022-03-03', 5.0)")
+    conn.execute("""INSERT INTO venta_items (venta_id, producto_id, cantidad, unidades, precio_unit, subtotal)
+                    VALUES (1, 1, 1, 1, 5.0, 5.0)""")
+    conn.commit()
+    return ruta, conn
+
+def test_archiva_un_anio_y_los_reportes_lo_siguen_viendo(tmp_path, monkeypatch):
+    monkeypatch.setenv("REPORT_PROCESSES", "0")
+    ruta, conn = _base(tmp_path)
+    assert archive.archivar(ruta, 2022, hoy=HOY) == {"venta_items": 1, "ventas": 2, "gastos": 1, "ventas_enc": 1}
+    # La base caliente queda con el año en curso y los resúmenes
+    assert conn.execute("SELECT COUNT(*) FROM ventas").fetchone()[0] == 1
+    assert ("2022", "ventas", 2, 30.0) in [(str(a), t, f, v) for a, t, f, v in archive.resumen(conn)]
+
+    ro = connect_readonly(ruta)
+    assert reports.totales(ro, date(2022, 1, 1), date(2022, 12, 31))["ventas"] == 0   # sin rango()
+    with archive.rango(ro, ruta, date(2022, 1, 1), date(2022, 12, 31)):
+        t = reports.totales(ro, date(2022, 1, 1), date(2022, 12, 31))
+        assert (t["ventas"], t["gastos"], t["n_ventas"]) == (30.0, 7.0, 2)
+        assert ro.execute("SELECT COUNT(*) FROM venta_items").fetchone()[0] == 1
+    # Al salir se sueltan las vistas y los archivos
+    assert ro.execute("SELECT COUNT(*) FROM ventas").fetchone()[0] == 1
+    assert [r[1] for r in ro.execute("PRAGMA database_list")] in (["main"], ["main", "temp"])
+    assert ro.execute("PRAGMA query_only").fetchone()[0] == 1
+    ro.close()
+    res = report_engine.resumen(ruta, date(2022, 1, 1), date(2025, 2, 28), hoy=HOY)
+    assert res["totales"]["ventas"] == 70.0
+
+def test_lote_sin_registrar_se_ignora_y_se_limpia(tmp_path):
+    ruta, conn = _base(tmp_path)
+    archive.archivar(ruta, 2022, hoy=HOY)
+    # Corte entre la copia y el borrado: filas en el archivo con un lote que
+    # la base caliente nunca registró
+    arch = sqlite3.connect(archive.directorio(ruta) / archive.nombre_archivo(ruta, 2022))
+    arch.execute("INSERT INTO ventas (fecha, total, _lote) VALUES ('2022-05-05', 999.0, 99)")
+    arch.commit()
+    ro = connect_readonly(ruta)
+    with archive.rango(ro, ruta, "2022-01-01", "2022-12-31"):
+        assert ro.execute("SELECT SUM(total) FROM ventas WHERE fecha < '2023'").fetchone()[0] == 30.0
+    ro.close()
+    # Un dato cargado tarde en el año archivado se muda en otra corrida
+    conn.execute("INSERT INTO ventas (fecha, producto, cantidad, total) VALUES ('2022-05-05', 'Arroz', 1, 1.0)")
+    conn.commit()
+    assert archive.archivar(ruta, 2022, hoy=HOY)["ventas"] == 1
+    assert arch.execute("SELECT COUNT(*), SUM(total) FROM ventas").fetchone() == (3, 31.0)
@@ -0,0 +1,54 @@
+# tests/test_backup.py
+import sqlite3
+import time
+from types import SimpleNamespace
+
+from app import backup
+from app.db import tune_connection
+
+def _base(tmp_path, filas=2000):
+    ruta = str(tmp_path / "inv.db")
+    conn = tune_connection(sqlite3.connect(ruta))
+    conn.execute("CREATE TABLE ventas (id INTEGER PRIMARY KEY, dato BLOB)")
+    conn.executemany("INSERT INTO ventas (dato) VALUES (randomblob(1000))", [()] * filas)
+    conn.commit()
+    return ruta, conn
+
+def _filas(ruta_gz, tmp_path):
+    import gzip
+    plano = tmp_path / "leido.db"
+    plano.write_bytes(gzip.open(ruta_gz).read())
+    conn = sqlite3.connect(plano)
+    n = conn.execute("SELECT COUNT(*) FROM ventas").fetchone()[0]
+    conn.close()
+    return n
+
+def test_backup_termina_con_ventas_entrando(tmp_path, monkeypatch):
+    monkeypatch.setenv("BACKUP_PAGINAS", "20")
+    monkeypatch.setenv("BACKUP_MB_S", "0.001")   # fuerza una pausa por tanda
+    ruta, escritor = _base(tmp_path)
+
+    def vender(_segundos):
+        # En cada pausa entra una venta: sin la foto fija la copia recomenzaría siempre
+        escritor.execute("INSERT INTO ventas (dato) VALUES (randomblob(1000))")
+        escritor.commit()
+    monkeypatch.setattr(backup, "time", SimpleNamespace(
+        monotonic=time.monotonic, perf_counter=time.perf_counter, sleep=vender))
+    gz = backup.hacer_backup(ruta)
+    assert gz.name.endswith(".db.gz") and _filas(gz, tmp_path) == 2000   # la foto del inicio
+    assert escritor.execute("SELECT COUNT(*) FROM ventas").fetchone()[0] > 2000
+
+def test_rotacion_y_restauracion(tmp_path, monkeypatch):
+    monkeypatch.setenv("BACKUP_CONSERVAR", "2")
+    ruta, conn = _base(tmp_path, filas=10)
+    primero = backup.hacer_backup(ruta)
+    for i in range(3):
+        backup.hacer_backup(ruta, sufijo=f"-{i}")
+    assert len(backup.backups(ruta)) == 2 and not primero.exists()
+
+    conn.execute("DELETE FROM ventas")
+    conn.commit()
+    backup.restaurar(backup.backups(ruta)[-1], ruta)
+    assert conn.execute("SELECT COUNT(*) FROM ventas").fetchone()[0] == 10
+    # Antes de restaurar quedó un backup de lo que había
+    assert any(p.name.endswith("-previo.db.gz") for p in backup.backups(ruta))
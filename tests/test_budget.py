@@ -0,0 +1,46 @@
+# tests/test_budget.py
+import socket
+import sqlite3
+
+from flask import Flask
+
+from app import metrics
+from app.budget import attach, query_budget
+
+LENTA = """WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n)
+           SELECT count(*) FROM n"""
+
+def _app(monkeypatch):
+    monkeypatch.setenv("QUERY_BUDGET_HEAVY", "0.05")
+    app = Flask(__name__)
+
+    @app.route("/export/lento.csv")
+    @query_budget("heavy")
+    def lento():
+        conn = attach(sqlite3.connect(":memory:"))
+        return str(conn.execute(LENTA).fetchone()[0])
+
+    @app.route("/rapido")
+    @query_budget("heavy")
+    def rapido():
+        return str(attach(sqlite3.connect(":memory:")).execute("SELECT 42").fetchone()[0])
+    return app
+
+def test_consulta_fuera_de_presupuesto_responde_acotar_rango(monkeypatch):
+    antes = metrics.snapshot()["contadores"].get("presupuesto_excedido", 0)
+    c = _app(monkeypatch).test_client()
+    r = c.get("/export/lento.csv")
+    assert r.status_code == 503 and "Acote el rango" in r.get_data(as_text=True)
+    assert metrics.snapshot()["contadores"]["presupuesto_excedido"] == antes + 1
+    assert c.get("/rapido").get_data(as_text=True) == "42"
+
+def test_cliente_desconectado_cancela_la_consulta(monkeypatch):
+    app = _app(monkeypatch)
+    monkeypatch.setenv("QUERY_BUDGET_HEAVY", "30")   # sólo el corte del cliente
+    servidor, cliente = socket.socketpair()
+    cliente.close()
+    try:
+        r = app.test_client().get("/export/lento.csv", environ_base={"werkzeug.socket": servidor})
+    finally:
+        servidor.close()
+    assert r.status_code == 499
@@ -0,0 +1,68 @@
+# tests/test_compress.py
+import gzip
+import zlib
+from app.compress import Compress
+
+def _app(body, ctype="text/html; charset=utf-8", extra=(), stream=False):
+    def wsgi(environ, start_response):
+        headers = [("Content-Type", ctype), *extra]
+        if not stream:
+            headers.append(("Content-Length", str(len(body))))
+        start_response("200 OK", headers)
+        return [body[i:i + 100] for i in range(0, len(body), 100)] if stream else [body]
+    return wsgi
+
+def _call(app, accept="gzip"):
+    out = {}
+    def start_response(status, headers, exc_info=None):
+        out["status"], out["headers"] = status, dict(headers)
+    body = b"".join(app({"REQUEST_METHOD": "GET", "PATH_INFO": "/", "HTTP_ACCEPT_ENCODING": accept}, start_response))
+    return out["headers"], body
+
+def test_comprime_html_grande_y_respeta_umbral():
+    grande = b"<tr><td>Arroz</td></tr>" * 200
+    h, body = _call(Compress(_app(grande), min_size=1024))
+    assert h["Content-Encoding"] == "gzip" and "Accept-Encoding" in h["Vary"]
+    assert gzip.decompress(body) == grande and int(h["Content-Length"]) == len(body)
+
+    h, body = _call(Compress(_app(b"<p>hola</p>"), min_size=1024))
+    assert "Content-Encoding" not in h and body == b"<p>hola</p>"
+
+def test_no_toca_tipos_binarios_ni_clientes_sin_gzip():
+    data = b"\x89PNG" * 1000
+    h, _ = _call(Compress(_app(data, ctype="image/png"), min_size=10))
+    assert "Content-Encoding" not in h
+    h, _ = _call(Compress(_app(b"a" * 5000), min_size=10), accept="identity")
+    assert "Content-Encoding" not in h
+
+def test_q_cero_y_cuerpo_vacio_sin_start_response():
+    grande = b"a" * 5000
+    h, _ = _call(Compress(_app(grande), min_size=10), accept="gzip;q=0, br;q=0")
+    assert "Content-Encoding" not in h
+    h, _ = _call(Compress(_app(grande), min_size=10), accept="*;q=0.5, identity")
+    assert h["Content-Encoding"] in ("gzip", "br")
+    h, _ = _call(Compress(_app(grande), min_size=10), accept="br;q=0, gzip;q=0.8")
+    assert h["Content-Encoding"] == "gzip"
+
+    cerrado = []
+    class Vacio(list):
+        def close(self):
+            cerrado.append(1)
+    mw = Compress(lambda environ, start_response: Vacio(), min_size=10)
+    assert list(mw({"REQUEST_METHOD": "GET", "HTTP_ACCEPT_ENCODING": "gzip"}, None)) == [] and cerrado
+
+def test_streaming_se_comprime_por_trozos():
+    csv = b"fecha,producto,total\n" + b"2024-01-01,Arroz,10\n" * 500
+    h, body = _call(Compress(_app(csv, ctype="text/csv", stream=True), min_size=10))
+    assert h["Content-Encoding"] == "gzip" and "Content-Length" not in h
+    assert zlib.decompress(body, 16 + zlib.MAX_WBITS) == csv
+
+def test_cachea_cuerpo_comprimido_por_etag():
+    llamadas = []
+    base = _app(b"x" * 4000, extra=[("ETag", 'W/"abc"')])
+    def contar(environ, start_response):
+        llamadas.append(1)
+        return base(environ, start_response)
+    mw = Compress(contar, min_size=10)
+    _call(mw); _call(mw)
+    assert len(mw.cache) == 1
@@ -0,0 +1,27 @@
+# tests/test_events.py
+from app.events import Broker
+
+def test_publica_a_todos_los_suscriptores():
+    b = Broker(max_queue=10)
+    q1, q2 = b.subscribe(), b.subscribe()
+    b.publish("venta", {"total": 12.5})
+    assert q1.get_nowait() == q2.get_nowait() == ("venta", '{"total":12.5}')
+    b.unsubscribe(q1)
+    assert len(b) == 1
+
+def test_cola_llena_se_reemplaza_por_resync():
+    b = Broker(max_queue=2)
+    q = b.subscribe()
+    for i in range(5):
+        b.publish("gasto", {"monto": i})
+    assert q.get_nowait()[0] == "resync"
+
+def test_stream_emite_frames_y_se_desuscribe_al_cerrar():
+    b = Broker()
+    gen = b.stream(heartbeat=0.01)
+    assert next(gen).startswith("retry:")
+    assert next(gen) == ": ping\n\n"
+    b.publish("venta", {"total": 1})
+    assert next(gen) == 'event: venta\ndata: {"total":1}\n\n'
+    gen.close()
+    assert len(b) == 0
@@ -0,0 +1,61 @@
+# tests/test_forecast.py
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+
+from app import forecast
+from app.migrations import migrate, MIGRACIONES_INVENTARIO
+
+HOY = date(2024, 6, 30)
+
+def _base(tmp_path):
+    conn = sqlite3.connect(tmp_path / "inv.db")
+    migrate(conn, MIGRACIONES_INVENTARIO)
+    conn.executemany("""INSERT INTO productos (id, nombre, cantidad_stock, proveedor, unidades_por_paquete)
+                        VALUES (?,?,?,?,?)""", [
+        (1, "Arroz", 5, "Molinos", 12),
+        (2, "Fideos", 500, "Molinos", None),
+        (3, "Velas", 1, None, None),
+    ])
+    # Arroz y Fideos venden 4 por día los últimos 60 días; Velas nunca
+    filas = []
+    for d in range(1, 61):
+        dia = (HOY - timedelta(days=d)).isoformat()
+        filas += [(dia, 1, "venta", -4, None), (dia, 2, "venta", -4, None)]
+    filas.append(("2024-01-01", 1, "reposicion", 100, 2.5))
+    conn.executemany("""INSERT INTO stock_movimientos (fecha, producto_id, tipo, cantidad_unidades, costo_unit)
+                        VALUES (?,?,?,?,?)""", filas)
+    conn.commit()
+    return conn
+
+def test_ewma_vectorizado():
+    m = np.array([[4.0] * 30, [0.0] * 29 + [10.0]])
+    nivel, desvio = forecast.ajustar(m, 0.3)
+    assert nivel[0] == 4.0 and desvio[0] == 0.0
+    assert nivel[1] == 3.0   # un pico de 10 con alfa 0.3
+
+def test_borrador_por_proveedor_redondeado_a_paquetes(tmp_path, monkeypatch):
+    monkeypatch.setenv("FORECAST_DIAS", "30")
+    conn = _base(tmp_path)
+    res = forecast.ejecutar(conn, hoy=HOY)
+    assert res == {"reajustados": 3, "borradores": 1}
+    compra_id, estado, proveedor = conn.execute(
+        "SELECT c.id, c.estado, p.nombre FROM compras c JOIN proveedores p ON p.id = c.proveedor_id").fetchone()
+    assert (estado, proveedor) == ("borrador", "Molinos")
+    # Arroz: 4/día * (7 + 7) - 5 en stock = 51 -> 5 paquetes de 12; Fideos alcanza
+    items = conn.execute("SELECT producto_id, cantidad, costo_unit FROM compra_items WHERE compra_id=?",
+                         (compra_id,)).fetchall()
+    assert items == [(1, 60, 2.5)]
+    # El borrador no mueve stock
+    assert conn.execute("SELECT cantidad_stock FROM productos WHERE id=1").fetchone()[0] == 5
+
+def test_incremental_solo_reajusta_lo_que_se_movio(tmp_path, monkeypatch):
+    monkeypatch.setenv("FORECAST_DIAS", "30")
+    conn = _base(tmp_path)
+    forecast.ejecutar(conn, hoy=HOY)
+    assert forecast.ejecutar(conn, hoy=HOY) == {"reajustados": 0, "borradores": None}
+    conn.execute("""INSERT INTO stock_movimientos (fecha, producto_id, tipo, cantidad_unidades)
+                    VALUES ('2024-06-29 18:00:00', 2, 'venta', -3)""")
+    conn.commit()
+    assert forecast.ejecutar(conn, hoy=HOY)["reajustados"] == 1
@@ -0,0 +1,44 @@
+# tests/test_http_cache.py
+import os
+import pytest
+from app import create_app
+from app.db import get_db
+
+@pytest.fixture
+def app(tmp_path):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_path}/test.db"
+    os.environ["SECRET_KEY"] = "test"
+    app = create_app()
+    app.config["TESTING"] = True
+    return app
+
+@pytest.fixture
+def client(app):
+    c = app.test_client()
+    c.post("/login", data={"username": "admin@example.com", "password": "admin123"})
+    return c
+
+def test_inventario_responde_304_si_no_cambio_nada(client):
+    r1 = client.get("/inventario")
+    assert r1.status_code == 200
+    etag = r1.headers["ETag"]
+
+    r2 = client.get("/inventario", headers={"If-None-Match": etag})
+    assert r2.status_code == 304
+    assert r2.data == b""
+
+def test_escritura_invalida_la_etag(app, client):
+    etag = client.get("/inventario").headers["ETag"]
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO productos (nombre, cantidad) VALUES ('Jabón', 2)")
+        db.commit()
+
+    r = client.get("/inventario", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+
+def test_parametros_distintos_no_comparten_etag(client):
+    a = client.get("/export/ventas.csv?desde=2024-01-01").headers["ETag"]
+    b = client.get("/export/ventas.csv?desde=2024-02-01").headers["ETag"]
+    assert a != b
@@ -0,0 +1,40 @@
+# tests/test_low_stock.py
+import os
+import sqlite3
+
+from app import create_app
+from app.migrations import migrate, MIGRACIONES_INVENTARIO
+
+def _bajo(conn):
+    ids = [r[0] for r in conn.execute("SELECT producto_id FROM productos_bajo_stock ORDER BY 1")]
+    n = conn.execute("SELECT valor FROM contadores WHERE nombre='bajo_stock'").fetchone()[0]
+    assert n == len(ids)
+    return ids
+
+def test_triggers_siguen_stock_y_umbral(tmp_path):
+    conn = sqlite3.connect(tmp_path / "inv.db")
+    migrate(conn, MIGRACIONES_INVENTARIO)
+    conn.executemany("INSERT INTO productos (id, nombre, cantidad_stock) VALUES (?,?,?)",
+                     [(1, "Arroz", 3), (2, "Fideos", 20), (3, "Velas", None)])
+    assert _bajo(conn) == [1, 3]
+    conn.execute("UPDATE productos SET cantidad_stock = 4 WHERE id = 2")
+    conn.execute("UPDATE productos SET cantidad_stock = 50 WHERE id = 1")
+    assert _bajo(conn) == [2, 3]
+    # Cambiar el umbral recalcula todo el conjunto
+    conn.execute("INSERT OR REPLACE INTO config (clave, valor) VALUES ('umbral_bajo_stock', '60')")
+    assert _bajo(conn) == [1, 2, 3]
+    conn.execute("DELETE FROM productos WHERE id = 3")
+    assert _bajo(conn) == [1, 2]
+
+def test_umbral_de_create_app_persistido(tmp_path):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_path}/test.db"
+    app = create_app()
+    c = app.test_client()
+    c.post("/login", data={"username": "admin@example.com", "password": "admin123"})
+    conn = sqlite3.connect(tmp_path / "test.db")
+    conn.executemany("INSERT INTO productos (nombre, cantidad) VALUES (?,?)", [("Pan", 2), ("Leche", 8)])
+    conn.commit()
+    assert "1 producto con bajo stock" in c.get("/inventario").get_data(as_text=True)
+    c.post("/actualizar-umbral", data={"umbral": "10"})
+    html = c.get("/inventario?solo_bajo=1").get_data(as_text=True)
+    assert "2 productos con bajo stock" in html and "Leche" in html
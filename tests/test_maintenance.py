@@ -0,0 +1,47 @@
+# tests/test_maintenance.py
+import os
+import sqlite3
+import time
+
+from app import maintenance
+from app.db import tune_connection
+
+def _base(tmp_path):
+    ruta = str(tmp_path / "inv.db")
+    conn = tune_connection(sqlite3.connect(ruta))
+    conn.execute("CREATE TABLE config (clave TEXT PRIMARY KEY, valor TEXT)")
+    conn.execute("CREATE TABLE ventas (id INTEGER PRIMARY KEY, producto_id INTEGER, dato BLOB)")
+    conn.execute("CREATE INDEX idx_ventas_producto ON ventas(producto_id)")
+    conn.executemany("INSERT INTO ventas (producto_id, dato) VALUES (?, randomblob(500))",
+                     [(i % 50,) for i in range(5000)])
+    conn.commit()
+    return ruta, conn
+
+def test_vuelta_tranquila_analiza_libera_y_trunca(tmp_path, monkeypatch):
+    ruta, conn = _base(tmp_path)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2   # base nueva: incremental
+    conn.execute("DELETE FROM ventas WHERE id > 500")
+    conn.commit()
+    costos = maintenance.ejecutar(ruta, forzar=True)
+    assert costos["estadisticas"]["analyze"] is True
+    assert costos["vacuum"]["paginas"] > 0
+    assert costos["checkpoint"]["ocupado"] == 0 and os.path.getsize(ruta + "-wal") == 0
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1 WHERE idx = 'idx_ventas_producto'").fetchone()[0] == 1
+    # Dentro de MAINT_ANALYZE_HORAS no vuelve a analizar
+    monkeypatch.setattr(maintenance, "tranquilo", lambda db_path: True)
+    assert maintenance.ejecutar(ruta)["estadisticas"]["analyze"] is False
+
+def test_con_movimiento_solo_checkpoint_pasivo(tmp_path, monkeypatch):
+    monkeypatch.setenv("MAINT_QUIET_RPM", "5")
+    ruta, _conn = _base(tmp_path)
+    for _ in range(10):
+        maintenance.registrar_pedido()
+    assert not maintenance.tranquilo(ruta)
+    assert list(maintenance.ejecutar(ruta)) == ["checkpoint"]
+    # Sin pedidos pero con una escritura reciente tampoco está tranquilo
+    monkeypatch.setattr(maintenance, "pedidos_por_minuto", lambda ventana=60.0: 0.0)
+    assert not maintenance.tranquilo(ruta)
+    viejo = time.time() - 3600
+    for r in (ruta, ruta + "-wal"):
+        os.utime(r, (viejo, viejo))
+    assert maintenance.tranquilo(ruta)
@@ -0,0 +1,37 @@
+# tests/test_migrations.py
+import sqlite3
+
+from app.migrations import (
+    migrate, schema_version, column_exists,
+    MIGRACIONES_INVENTARIO, MIGRACIONES_APP,
+)
+
+def test_base_nueva_queda_en_ultima_version(tmp_path):
+    conn = sqlite3.connect(tmp_path / "inv.db")
+    v = migrate(conn, MIGRACIONES_INVENTARIO)
+    assert v == MIGRACIONES_INVENTARIO[-1][0]
+    assert schema_version(conn) == v
+    assert column_exists(conn, "ventas", "producto_id")
+    admin = conn.execute("SELECT COUNT(*) FROM usuarios WHERE username='admin'").fetchone()[0]
+    assert admin == 1
+
+def test_base_antigua_sin_version_se_migra(tmp_path):
+    """Una base creada antes del runner (user_version=0) no debe romperse."""
+    conn = sqlite3.connect(tmp_path / "inv.db")
+    conn.execute("CREATE TABLE productos (id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT NOT NULL, "
+                 "categoria TEXT, precio_unitario REAL, cantidad_stock INTEGER, proveedor TEXT, "
+                 "fecha_registro TEXT, codigo_barras TEXT UNIQUE, precio_paquete REAL)")
+    conn.execute("INSERT INTO productos (nombre, cantidad_stock) VALUES ('Jabón', 3)")
+    conn.commit()
+
+    migrate(conn, MIGRACIONES_INVENTARIO)
+    assert column_exists(conn, "productos", "unidades_por_paquete")
+    assert conn.execute("SELECT nombre FROM productos").fetchone()[0] == "Jabón"
+
+def test_arranque_en_caliente_no_reaplica(tmp_path):
+    conn = sqlite3.connect(tmp_path / "app.db")
+    migrate(conn, MIGRACIONES_APP)
+    ejecutados = []
+    conn.set_trace_callback(ejecutados.append)
+    migrate(conn, MIGRACIONES_APP)
+    assert ejecutados == ["PRAGMA user_version"]
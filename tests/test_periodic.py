@@ -0,0 +1,21 @@
+# tests/test_periodic.py
+import time
+
+from app.periodic import Periodico
+
+def test_una_falla_no_mata_el_hilo(tmp_path):
+    vueltas = []
+
+    def tarea():
+        vueltas.append(1)
+        if len(vueltas) == 1:
+            raise KeyError("columna")   # no es OSError/sqlite3.Error: antes mataba el hilo
+        return True
+
+    prog = Periodico("prueba", tarea, 0.01, str(tmp_path / "prueba.lock"), espera=0.01)
+    prog.start()
+    limite = time.time() + 2
+    while len(vueltas) < 2 and time.time() < limite:
+        time.sleep(0.01)
+    assert len(vueltas) >= 2
+    assert prog._hilo.is_alive()
@@ -0,0 +1,46 @@
+# tests/test_producto_id.py
+import sqlite3
+from datetime import date
+
+from app import reports, report_engine
+from app.migrations import backfill_producto_id, migrate, MIGRACIONES_INVENTARIO
+
+def _base(tmp_path):
+    ruta = str(tmp_path / "inv.db")
+    conn = sqlite3.connect(ruta)
+    migrate(conn, MIGRACIONES_INVENTARIO)
+    conn.executemany("INSERT INTO productos (id, nombre) VALUES (?,?)", [(1, "Arroz"), (2, "Fideos")])
+    conn.executemany("INSERT INTO ventas (fecha, producto, cantidad, total) VALUES (?,?,?,?)", [
+        ("2024-01-10", "Arroz", 3, 30.0),
+        ("2024-02-10", "Fideos", 2, 8.0),
+        ("2024-02-11", "Fideos", 1, 4.0),
+        ("2024-02-12", "Velas", 5, 5.0),     # producto borrado: queda por nombre
+    ])
+    conn.commit()
+    return ruta, conn
+
+def test_trigger_y_backfill_por_tandas(tmp_path):
+    _, conn = _base(tmp_path)
+    # El trigger completa el id de los INSERT que sólo traen el nombre
+    assert conn.execute("SELECT producto_id FROM ventas ORDER BY rowid").fetchall() == [(1,), (2,), (2,), (None,)]
+    # Filas de antes de la migración: el backfill las completa de a 2
+    conn.execute("UPDATE ventas SET producto_id = NULL")
+    conn.commit()
+    assert backfill_producto_id(conn, tanda=2) == 3
+    assert conn.execute("SELECT COUNT(*) FROM ventas WHERE producto_id IS NULL").fetchone()[0] == 1
+    # Terminado una vez, no vuelve a recorrer la venta de "Velas"
+    conn.execute("UPDATE ventas SET producto_id = NULL WHERE producto = 'Arroz'")
+    conn.commit()
+    assert backfill_producto_id(conn, tanda=2) == 0
+    assert conn.execute("SELECT valor FROM config WHERE clave = 'backfill_producto_id'").fetchone() == ("hecho",)
+
+def test_top_agrupa_por_id_y_sobrevive_renombres(tmp_path, monkeypatch):
+    monkeypatch.setenv("REPORT_PROCESSES", "0")
+    ruta, conn = _base(tmp_path)
+    conn.execute("UPDATE productos SET nombre = 'Fideos largos' WHERE id = 2")
+    conn.execute("INSERT INTO ventas (fecha, producto, cantidad, total) VALUES ('2024-02-13', 'Fideos largos', 4, 16.0)")
+    conn.commit()
+    top = reports.top_productos(conn, date(2024, 2, 1), date(2024, 2, 29))
+    assert top == {"labels": ["Fideos largos", "Velas"], "values": [7.0, 5.0]}
+    res = report_engine.resumen(ruta, date(2024, 1, 1), date(2024, 2, 29), hoy=date(2024, 6, 1))
+    assert res["top"] == {"labels": ["Fideos largos", "Velas", "Arroz"], "values": [7.0, 5.0, 3.0]}
@@ -0,0 +1,68 @@
+# tests/test_report_copy.py
+import sqlite3
+
+import pytest
+
+from app.db import connect_readonly, tune_connection
+from app.report_copy import ReportCopy
+
+@pytest.fixture
+def base(tmp_path):
+    ruta = str(tmp_path / "inv.db")
+    conn = tune_connection(sqlite3.connect(ruta))
+    conn.execute("CREATE TABLE ventas (fecha TEXT, total REAL)")
+    conn.execute("INSERT INTO ventas VALUES ('2024-01-01', 10)")
+    conn.commit()
+    yield ruta, conn
+    conn.close()
+
+def test_conexion_de_reportes_no_puede_escribir(base):
+    ruta, _ = base
+    ro = connect_readonly(ruta)
+    with pytest.raises(sqlite3.OperationalError):
+        ro.execute("INSERT INTO ventas VALUES ('2024-01-02', 1)")
+    assert ro.execute("SELECT COUNT(*) FROM ventas").fetchone()[0] == 1
+    ro.close()
+
+def test_lectura_abierta_no_bloquea_al_escritor(base):
+    ruta, escritor = base
+    ro = connect_readonly(ruta)
+    ro.execute("BEGIN")
+    ro.execute("SELECT * FROM ventas").fetchall()       # foto abierta
+    escritor.execute("INSERT INTO ventas VALUES ('2024-01-02', 5)")
+    escritor.commit()                                    # no espera al lector
+    assert ro.execute("SELECT COUNT(*) FROM ventas").fetchone()[0] == 1
+    ro.close()
+
+def test_copia_de_reportes_con_backup(base, monkeypatch):
+    ruta, escritor = base
+    copia = ReportCopy(ruta, intervalo=60)
+    assert copia.refresh() is True
+    assert copia.refresh() is False           # vigente: no se rehace
+    escritor.execute("INSERT INTO ventas VALUES ('2024-01-03', 7)")
+    escritor.commit()
+
+    monkeypatch.setenv("REPORT_COPY", "1")
+    monkeypatch.setattr("app.report_copy._copias", {ruta: copia})
+    monkeypatch.setattr(copia, "path", copia.actual)
+    ro = connect_readonly(ruta, copia=True)
+    assert ro.execute("SELECT COUNT(*) FROM ventas").fetchone()[0] == 1   # foto de la copia
+    ro.close()
+
+def test_copia_nueva_sin_pisar_la_abierta(base):
+    ruta, escritor = base
+    copia = ReportCopy(ruta, intervalo=60)
+    assert copia.refresh() is True
+    vieja = copia.actual()
+    lector = sqlite3.connect(f"file:{vieja}?mode=ro&immutable=1", uri=True)
+
+    escritor.execute("INSERT INTO ventas VALUES ('2024-01-03', 7)")
+    escritor.commit()
+    copia.intervalo = 0                        # vencida: se rehace
+    assert copia.refresh() is True
+    assert copia.actual() != vieja             # otro archivo: la abierta no se reemplaza
+    assert lector.execute("SELECT COUNT(*) FROM ventas").fetchone()[0] == 1
+    lector.close()
+
+    assert copia.refresh() is True
+    assert len(copia._publicadas()) == ReportCopy.CONSERVAR   # las viejas se borran
@@ -0,0 +1,84 @@
+# tests/test_report_engine.py
+import sqlite3
+from datetime import date
+
+from app import report_engine
+from app.migrations import data_version_steps, month_version_steps, ventas_producto_id_steps
+
+def _base(tmp_path):
+    ruta = str(tmp_path / "motor.db")
+    conn = sqlite3.connect(ruta)
+    conn.execute("CREATE TABLE ventas (fecha TEXT, producto TEXT, cantidad INTEGER, precio_unit REAL, total REAL)")
+    conn.execute("CREATE TABLE gastos (fecha TEXT, motivo TEXT, monto REAL)")
+    conn.execute("CREATE TABLE reposiciones (fecha TEXT, producto TEXT, cantidad INTEGER, costo_unit REAL)")
+    conn.execute("CREATE TABLE productos (id INTEGER PRIMARY KEY, nombre TEXT)")
+    for sql in month_version_steps("ventas", "gastos", "reposiciones") + data_version_steps("productos"):
+        conn.execute(sql)
+    ventas_producto_id_steps(indice_nombre=True)(conn)
+    conn.executemany("INSERT INTO productos VALUES (?,?)", [(1, "Arroz"), (2, "Fideos")])
+    conn.executemany("INSERT INTO ventas (fecha, producto, cantidad, total) VALUES (?,?,?,?)", [
+        ("2024-01-31 20:00:00", "Arroz", 3, 30.0),
+        ("2024-02-01", "Fideos", 2, 8.0),
+        ("2024-03-15", "Fideos", 2, 8.0),
+    ])
+    conn.execute("INSERT INTO gastos VALUES ('2024-02-10', 'Luz', 5.0)")
+    conn.execute("INSERT INTO reposiciones VALUES ('2024-03-01', 'Arroz', 10, 2.5)")
+    conn.commit()
+    return ruta, conn
+
+def test_particiones_por_mes_recortadas_al_rango():
+    assert report_engine.particionar(date(2023, 12, 20), date(2024, 2, 3)) == [
+        (date(2023, 12, 20), date(2023, 12, 31)),
+        (date(2024, 1, 1), date(2024, 1, 31)),
+        (date(2024, 2, 1), date(2024, 2, 3)),
+    ]
+
+def test_resumen_fusiona_meses(tmp_path, monkeypatch):
+    monkeypatch.setenv("REPORT_PROCESSES", "0")
+    ruta, _ = _base(tmp_path)
+    res = report_engine.resumen(ruta, date(2024, 1, 1), date(2024, 3, 31), hoy=date(2024, 6, 1))
+    assert res["totales"] == {"ventas": 46.0, "gastos": 5.0, "neta": 41.0, "n_ventas": 3, "n_gastos": 1}
+    assert res["por_dia"]["labels"] == ["2024-01-31", "2024-02-01", "2024-03-15"]
+    # El top se arma después de sumar los meses: Fideos suma 4 entre febrero y marzo
+    assert res["top"] == {"labels": ["Fideos", "Arroz"], "values": [4.0, 3.0]}
+    assert res["reposiciones"] == {"unidades": 10.0, "valor": 25.0}
+
+def test_mes_cerrado_cacheado_hasta_que_cambia(tmp_path, monkeypatch):
+    monkeypatch.setenv("REPORT_PROCESSES", "0")
+    ruta, conn = _base(tmp_path)
+    llamadas = []
+    original = report_engine.calcular_parcial
+    monkeypatch.setattr(report_engine, "calcular_parcial",
+                        lambda *a: llamadas.append(a[1]) or original(*a))
+    rango = (ruta, date(2024, 1, 1), date(2024, 2, 29))
+    report_engine.resumen(*rango, hoy=date(2024, 6, 1))
+    report_engine.resumen(*rango, hoy=date(2024, 6, 1))
+    assert llamadas == ["2024-01-01", "2024-02-01"]
+
+    # Una venta cargada con fecha de enero sube la versión del mes: sólo se recalcula enero
+    conn.execute("INSERT INTO ventas (fecha, producto, cantidad, total) VALUES ('2024-01-05', 'Arroz', 1, 10.0)")
+    conn.commit()
+    res = report_engine.resumen(*rango, hoy=date(2024, 6, 1))
+    assert llamadas[2:] == ["2024-01-01"]
+    assert res["totales"]["ventas"] == 48.0
+
+def test_meses_fuera_del_request_respetan_el_presupuesto(tmp_path, monkeypatch):
+    from flask import Flask
+    from app.budget import query_budget
+    monkeypatch.setenv("REPORT_PROCESSES", "0")
+    monkeypatch.setenv("QUERY_BUDGET_HEAVY", "0.2")
+    ruta, conn = _base(tmp_path)
+    # Un mes que no termina nunca: sólo lo corta el límite que viaja con el parcial
+    conn.execute("ALTER TABLE ventas RENAME TO ventas_reales")
+    conn.execute("""CREATE VIEW ventas AS WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n)
+                    SELECT '2024-01-02' AS fecha, 'Arroz' AS producto, 1 AS cantidad, 1.0 AS total,
+                           1 AS producto_id FROM n""")
+    conn.commit()
+    app = Flask(__name__)
+
+    @app.route("/anual")
+    @query_budget("heavy")
+    def anual():
+        return report_engine.resumen(ruta, date(2024, 1, 1), date(2024, 3, 31), hoy=date(2024, 6, 1))["totales"]
+
+    assert app.test_client().get("/anual").status_code == 503
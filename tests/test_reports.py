@@ -0,0 +1,55 @@
+# tests/test_reports.py
+import os
+import sqlite3
+from datetime import date
+
+import pytest
+from app import create_app
+from app.db import get_db
+from app.reports import rango_fechas, totales, ventas_por_dia
+
+def _conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE ventas (fecha TEXT, producto TEXT, cantidad INTEGER, precio_unit REAL, total REAL)")
+    conn.execute("CREATE TABLE gastos (fecha TEXT, motivo TEXT, monto REAL)")
+    return conn
+
+def test_rango_incluye_ventas_con_hora_del_ultimo_dia():
+    conn = _conn()
+    conn.executemany("INSERT INTO ventas (fecha, producto, cantidad, total) VALUES (?,?,?,?)", [
+        ("2024-05-01", "Arroz", 1, 10.0),
+        ("2024-05-31 18:20:00", "Arroz", 1, 5.0),
+        ("2024-06-01 00:00:00", "Arroz", 1, 99.0),
+    ])
+    conn.execute("INSERT INTO gastos VALUES ('2024-05-10', 'Luz', 4.0)")
+    d, h, _ = rango_fechas("personalizado", "2024-05-01", "2024-05-31")
+    assert totales(conn, d, h) == {"ventas": 15.0, "gastos": 4.0, "neta": 11.0, "n_ventas": 2, "n_gastos": 1}
+    assert ventas_por_dia(conn, d, h) == {"labels": ["2024-05-01", "2024-05-31"], "values": [10.0, 5.0]}
+
+def test_rango_invertido_y_por_defecto():
+    hoy = date(2024, 5, 20)
+    assert rango_fechas("personalizado", "2024-05-10", "2024-05-01", hoy)[:2] == (date(2024, 5, 1), date(2024, 5, 10))
+    assert rango_fechas("mes", hoy=hoy)[:2] == (date(2024, 5, 1), hoy)
+
+@pytest.fixture
+def client(tmp_path):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_path}/test.db"
+    app = create_app()
+    app.config["TESTING"] = True
+    c = app.test_client()
+    c.post("/login", data={"username": "admin@example.com", "password": "admin123"})
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO ventas (fecha, producto, cantidad, precio_unit, total) VALUES (date('now'), 'Pan', 3, 2, 6)")
+        db.commit()
+    return c
+
+def test_api_devuelve_arrays_columnares(client):
+    r = client.get("/api/finanzas/top-productos?r=hoy")
+    assert r.status_code == 200
+    assert r.json["labels"] == ["Pan"] and r.json["values"] == [3.0]
+    assert client.get("/api/finanzas/totales?r=hoy").json["ventas"] == 6.0
+
+def test_panel_sale_sin_datos_y_apunta_a_la_api(client):
+    html = client.get("/fin?r=semana").get_data(as_text=True)
+    assert "/api/finanzas/ventas-por-dia?" in html and 'data-widget="torta"' in html
@@ -0,0 +1,52 @@
+# tests/test_sales_backfill.py
+import sqlite3
+from datetime import date
+
+from app import reports, sales_backfill
+from app.migrations import migrate, MIGRACIONES_INVENTARIO
+
+DESDE, HASTA = date(2024, 1, 1), date(2024, 1, 31)
+
+def _base(tmp_path):
+    conn = sqlite3.connect(tmp_path / "inv.db")
+    migrate(conn, MIGRACIONES_INVENTARIO)
+    conn.executemany("INSERT INTO productos (id, nombre, unidades_por_paquete) VALUES (?,?,?)",
+                     [(1, "Arroz", 12), (2, "Fideos", None)])
+    conn.executemany("""INSERT INTO ventas (fecha, producto, cantidad, precio_unit, total, modo, producto_id)
+                        VALUES (?,?,?,?,?,?,?)""", [
+        ("2024-01-10 10:00:00", "Arroz", 2, 50.0, 100.0, "paquete", 1),
+        ("2024-01-11", "Fideos", 3, 4.0, 12.0, "unidad", 2),
+        ("2024-01-12", "Velas", 1, 5.0, 5.0, "unidad", None),    # producto borrado
+        ("2024-01-13", "Fideos", 1, 4.0, 4.0, "unidad", 2),
+    ])
+    conn.commit()
+    return conn
+
+def test_copia_por_tandas_retomable_y_sin_duplicar(tmp_path):
+    conn = _base(tmp_path)
+    assert sales_backfill.copiar_tanda(conn, 3) == 3
+    assert sales_backfill.estado(conn)["hasta"] == 3
+    # Una venta ya escrita en los dos modelos (registrar_venta) no se copia otra vez
+    conn.execute("INSERT INTO ventas_enc (fecha, total, origen_venta_id) VALUES ('2024-01-13', 4.0, 4)")
+    conn.commit()
+    res = sales_backfill.ejecutar(conn, tanda=3)
+    assert res["copiadas"] == 1 and res["pendientes"] == 0 and res["fuente"] == "detalle"
+    assert conn.execute("SELECT COUNT(*) FROM ventas_enc").fetchone()[0] == 4
+    # Paquetes -> unidades; la venta sin producto queda sólo como encabezado
+    assert conn.execute("SELECT producto_id, unidades FROM venta_items ORDER BY id").fetchall() == [(1, 24), (2, 3)]
+
+def test_reportes_cambian_al_detalle_con_los_mismos_totales(tmp_path):
+    conn = _base(tmp_path)
+    antes = reports.totales(conn, DESDE, HASTA)
+    sales_backfill.ejecutar(conn, tanda=2)
+    # Una venta cargada sólo con detalle ahora también cuenta
+    conn.execute("INSERT INTO ventas_enc (id, fecha, total) VALUES (100, '2024-01-20', 8.0)")
+    conn.execute("""INSERT INTO venta_items (venta_id, producto_id, cantidad, unidades, precio_unit, subtotal)
+                    VALUES (100, 2, 2, 2, 4.0, 8.0)""")
+    conn.commit()
+    despues = reports.totales(conn, DESDE, HASTA)
+    assert despues["ventas"] == antes["ventas"] + 8.0 and despues["n_ventas"] == antes["n_ventas"] + 1
+    assert reports.top_productos(conn, DESDE, HASTA) == {"labels": ["Fideos", "Arroz"], "values": [6.0, 2.0]}
+    plan = " ".join(r[3] for r in conn.execute(
+        "EXPLAIN QUERY PLAN " + reports.SQL_TOP_DETALLE, ("2024-01-01", "2024-02-01", 5)))
+    assert "COVERING INDEX idx_ventas_enc_fecha" in plan and "COVERING INDEX idx_venta_items_reporte" in plan
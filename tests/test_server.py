@@ -0,0 +1,31 @@
+# tests/test_server.py
+import threading
+
+from app import db
+from app.server import server_options
+
+def test_opciones_desde_el_entorno(monkeypatch):
+    monkeypatch.setenv("WORKERS", "3")
+    monkeypatch.setenv("THREADS", "2")
+    monkeypatch.setenv("PORT", "8080")
+    o = server_options()
+    assert (o["workers"], o["threads"], o["worker_class"]) == (3, 2, "gthread")
+    assert o["bind"].endswith(":8080") and o["preload_app"] is False
+
+def test_sse_arranca_con_un_worker(monkeypatch):
+    monkeypatch.delenv("WORKERS", raising=False)
+    monkeypatch.delenv("THREADS", raising=False)
+    o = server_options(sse=True)
+    assert (o["workers"], o["threads"]) == (1, 16)
+    monkeypatch.setenv("WORKERS", "4")
+    assert server_options(sse=True)["workers"] == 4
+
+def test_conexion_por_hilo_en_wal(monkeypatch, tmp_path):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/t.db")
+    principal = db.get_db()
+    otra = []
+    t = threading.Thread(target=lambda: (otra.append(db.get_db()), db.close_db()))
+    t.start(); t.join()
+    assert otra[0] is not principal
+    assert principal.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    db.close_db()
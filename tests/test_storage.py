@@ -0,0 +1,41 @@
+# tests/test_storage.py
+import sqlite3
+
+import pytest
+
+from app import storage
+from app.db import tune_connection, connect_readonly
+
+def _pragma(conn, nombre):
+    return conn.execute(f"PRAGMA {nombre}").fetchone()[0]
+
+def test_perfil_por_rol_desde_env(tmp_path, monkeypatch):
+    ruta = str(tmp_path / "inv.db")
+    monkeypatch.setenv("SQLITE_PERFIL", "pos-safe")
+    monkeypatch.setenv("SQLITE_PERFIL_LECTURA", "reporting")
+    escritura = tune_connection(sqlite3.connect(ruta))
+    assert (_pragma(escritura, "journal_mode"), _pragma(escritura, "synchronous")) == ("wal", 2)
+    assert _pragma(escritura, "cache_size") == -8192 and _pragma(escritura, "busy_timeout") == 10000
+    escritura.execute("CREATE TABLE t (x)")
+    escritura.commit()
+    lectura = connect_readonly(ruta)
+    assert _pragma(lectura, "cache_size") == -65536 and _pragma(lectura, "temp_store") == 2
+    # Sin configurar: lo de siempre
+    monkeypatch.delenv("SQLITE_PERFIL")
+    assert _pragma(tune_connection(sqlite3.connect(ruta)), "synchronous") == 1
+    monkeypatch.setenv("SQLITE_PERFIL_TAREAS", "turbo")
+    with pytest.raises(ValueError):
+        tune_connection(sqlite3.connect(ruta), "tareas")
+
+def test_tuner_mide_sobre_una_copia(tmp_path):
+    ruta = str(tmp_path / "inv.db")
+    conn = sqlite3.connect(ruta)
+    conn.execute("CREATE TABLE ventas (id INTEGER PRIMARY KEY, total REAL)")
+    conn.executemany("INSERT INTO ventas (total) VALUES (?)", [(i,) for i in range(1000)])
+    conn.commit()
+    res = storage.medir(ruta, ["base", "throughput"], escrituras=20, repeticiones=1)
+    assert set(res) == {"base", "throughput"}
+    assert all(r["escrituras_s"] > 0 and r["lectura_ms"] > 0 for r in res.values())
+    assert set(storage.recomendar(res).values()) <= {"base", "throughput"}
+    # La base original no se tocó
+    assert [r[0] for r in conn.execute("SELECT name FROM sqlite_master")] == ["ventas"]
@@ -0,0 +1,43 @@
+# tests/test_stores.py
+import sqlite3
+
+import pytest
+from app import create_app
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/central.db")
+    monkeypatch.setenv("TIENDAS", f"centro={tmp_path}/centro.db,norte={tmp_path}/norte.db")
+    app = create_app()
+    app.config["TESTING"] = True
+    for tienda, filas in (("centro", [("Pan", 3, 6.0), ("Leche", 1, 4.0)]), ("norte", [("Pan", 5, 10.0)])):
+        conn = sqlite3.connect(tmp_path / f"{tienda}.db")
+        conn.executemany("INSERT INTO productos (nombre, cantidad, precio) VALUES (?, 10, 2)",
+                         [(n,) for n, _, _ in filas])
+        conn.executemany("""INSERT INTO ventas (fecha, producto, cantidad, total, producto_id)
+                            VALUES (date('now'), ?, ?, ?, (SELECT id FROM productos WHERE nombre = ?))""",
+                         [(n, c, t, n) for n, c, t in filas])
+        conn.commit()
+        conn.close()
+    c = app.test_client()
+    c.post("/login", data={"username": "admin@example.com", "password": "admin123"})
+    return c
+
+def test_cada_request_va_a_su_tienda(client):
+    assert client.get("/api/finanzas/totales?r=hoy").json["ventas"] == 10.0     # la primera: centro
+    assert client.get("/api/finanzas/totales?r=hoy&tienda=norte").json["ventas"] == 10.0
+    # La elección queda en la sesión; el header la cambia sólo para ese request
+    assert client.get("/api/finanzas/top-productos?r=hoy").json["values"] == [5.0]
+    r = client.get("/api/finanzas/top-productos?r=hoy", headers={"X-Tienda": "centro"})
+    assert r.json["labels"] == ["Pan", "Leche"]
+    assert client.get("/api/finanzas/totales?tienda=oeste").status_code == 404
+
+def test_consolidado_suma_las_tiendas(client):
+    datos = client.get("/reportes/consolidado.json?r=hoy").json
+    fin = datos["finanzas"]
+    assert fin["totales"]["ventas"] == 20.0 and fin["totales"]["n_ventas"] == 3
+    # Pan tiene ids distintos en cada tienda: se junta por nombre
+    assert fin["top"] == {"labels": ["Pan", "Leche"], "values": [8.0, 1.0]}
+    assert {t: f["ventas"] for t, f in fin["tiendas"].items()} == {"centro": 10.0, "norte": 10.0}
+    assert datos["inventario"]["totales"]["unidades"] == 30
+    assert "Consolidado de tiendas" in client.get("/reportes/consolidado?r=hoy").get_data(as_text=True)
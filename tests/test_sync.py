@@ -0,0 +1,49 @@
+# tests/test_sync.py
+import sqlite3
+
+from app import sync
+from app.migrations import migrate, MIGRACIONES_INVENTARIO
+
+def _base(tmp_path):
+    conn = sqlite3.connect(tmp_path / "inv.db")
+    migrate(conn, MIGRACIONES_INVENTARIO)
+    conn.executemany("""INSERT INTO productos (id, nombre, precio_unitario, cantidad_stock, precio_paquete, unidades_por_paquete)
+                        VALUES (?,?,?,?,?,?)""", [(1, "Arroz", 100, 10, 1100, 12), (2, "Velas", 50, 1, None, None)])
+    conn.commit()
+    return conn
+
+LOTE = [
+    {"clave": "c1-1", "tipo": "venta", "fecha": "2024-06-01T10:00:00", "producto_id": 1, "cantidad": 4},
+    {"clave": "c1-2", "tipo": "venta", "producto_id": 1, "cantidad": 1, "modo": "paquete"},   # 12 > 6 en stock
+    {"clave": "c1-3", "tipo": "reposicion", "producto_id": 1, "cantidad": 24, "costo_unit": 80},
+    {"clave": "c1-4", "tipo": "venta", "producto_id": 1, "cantidad": 1, "modo": "paquete"},   # ahora sí
+    {"clave": "c1-5", "tipo": "gasto", "motivo": "Hielo", "monto": 300},
+    {"clave": "c1-5", "tipo": "gasto", "motivo": "Hielo", "monto": 300},                     # repetida en el lote
+    {"clave": "c1-6", "tipo": "venta", "producto_id": 99, "cantidad": 1},
+]
+
+def test_lote_en_orden_con_stock_por_conjunto(tmp_path):
+    conn = _base(tmp_path)
+    res = sync.aplicar_lote(conn, LOTE, terminal="caja-1")
+    assert [r["estado"] for r in res] == ["ok", "error", "ok", "ok", "ok", "duplicado", "error"]
+    assert res[1]["error"] == "no hay suficiente stock" and res[6]["error"] == "producto no encontrado"
+    # 10 - 4 + 24 - 12
+    assert conn.execute("SELECT cantidad_stock FROM productos WHERE id = 1").fetchone()[0] == 18
+    venta_id = res[0]["id"]
+    assert conn.execute("SELECT fecha, total FROM ventas WHERE id = ?", (venta_id,)).fetchone() == \
+        ("2024-06-01 10:00:00", 400.0)
+    assert conn.execute("SELECT referencia, cantidad_unidades FROM stock_movimientos ORDER BY id").fetchall() == \
+        [(f"venta:{venta_id}", -4), (f"repo:{res[2]['id']}", 24), (f"venta:{res[3]['id']}", -12)]
+    assert conn.execute("""SELECT i.unidades FROM ventas_enc e JOIN venta_items i ON i.venta_id = e.id
+                           WHERE e.origen_venta_id = ?""", (res[3]["id"],)).fetchone() == (12,)
+    assert conn.execute("SELECT monto FROM gastos WHERE id = ?", (res[4]["id"],)).fetchone() == (300.0,)
+
+def test_reintento_no_duplica(tmp_path):
+    conn = _base(tmp_path)
+    primero = sync.aplicar_lote(conn, LOTE[:1])
+    otra_vez = sync.aplicar_lote(conn, LOTE[:1])
+    assert otra_vez == [{**primero[0], "estado": "duplicado"}]
+    assert conn.execute("SELECT COUNT(*) FROM ventas").fetchone()[0] == 1
+    assert conn.execute("SELECT cantidad_stock FROM productos WHERE id = 1").fetchone()[0] == 6
+    # El formulario de venta usa la misma tabla de claves
+    assert sync.reclamar_clave(conn, "form-1", "venta") and not sync.reclamar_clave(conn, "form-1", "venta")
@@ -0,0 +1,36 @@
+# tests/test_templating.py
+from flask import Flask, render_template_string
+
+from app.templating import configure_jinja, LazyRows
+
+TPL = '{% cache "sel", version %}{% for n in productos %}<option>{{ n }}</option>{% endfor %}{% endcache %}'
+
+def _app(tmp_path):
+    app = Flask(__name__)
+    configure_jinja(app, tmp_path / "jinja_cache")
+    return app
+
+def test_fragmento_se_reutiliza_hasta_que_cambia_la_version(tmp_path):
+    app = _app(tmp_path)
+    cargas = []
+    def loader(nombres):
+        def _f():
+            cargas.append(1)
+            return nombres
+        return _f
+
+    with app.app_context():
+        html1 = render_template_string(TPL, version=1, productos=LazyRows(loader(["A", "B"])))
+        html2 = render_template_string(TPL, version=1, productos=LazyRows(loader(["X"])))
+        html3 = render_template_string(TPL, version=2, productos=LazyRows(loader(["X"])))
+
+    assert html1 == html2 == "<option>A</option><option>B</option>"
+    assert html3 == "<option>X</option>"
+    assert len(cargas) == 2  # el segundo render no consultó el catálogo
+
+def test_sin_version_no_se_cachea(tmp_path):
+    app = _app(tmp_path)
+    with app.app_context():
+        a = render_template_string(TPL, productos=["A"])
+        b = render_template_string(TPL, productos=["B"])
+    assert (a, b) == ("<option>A</option>", "<option>B</option>")
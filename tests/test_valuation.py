@@ -0,0 +1,109 @@
+# tests/test_valuation.py
+import sqlite3
+
+from app import valuation
+from app.migrations import migrate, MIGRACIONES_INVENTARIO
+
+def _base(tmp_path):
+    conn = sqlite3.connect(tmp_path / "inv.db")
+    migrate(conn, MIGRACIONES_INVENTARIO)
+    conn.executemany("INSERT INTO productos (id, nombre, precio_unitario, cantidad_stock) VALUES (?,?,?,?)",
+                     [(1, "Arroz", 100, 0), (2, "Velas", 50, 0)])
+    conn.commit()
+    return conn
+
+def _mov(conn, fecha, pid, tipo, q, precio=None, costo=None, ref=None):
+    # Como las vistas: kardex y stock juntos
+    conn.execute("""INSERT INTO stock_movimientos
+                      (fecha, producto_id, tipo, referencia, cantidad_unidades, precio_unit, costo_unit)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)""", (fecha, pid, tipo, ref, q, precio, costo))
+    conn.execute("UPDATE productos SET cantidad_stock = cantidad_stock + ? WHERE id = ?", (q, pid))
+
+def _cuadra(conn):
+    return conn.execute("""SELECT COUNT(*) FROM productos p LEFT JOIN valuacion v ON v.producto_id = p.id
+                           WHERE COALESCE(v.unidades, 0) != p.cantidad_stock""").fetchone()[0] == 0
+
+def test_promedio_fifo_y_margen_por_mes(tmp_path):
+    conn = _base(tmp_path)
+    _mov(conn, "2024-05-02 09:00:00", 1, "reposicion", 10, costo=50)
+    _mov(conn, "2024-05-03 09:00:00", 1, "reposicion", 10, costo=70)
+    _mov(conn, "2024-05-10 12:00:00", 1, "venta", -15, precio=100)
+    assert valuation.aplicar(conn) == 3
+    # Promedio 60: 15 vendidas a 60; FIFO: 10 a 50 y 5 a 70
+    assert conn.execute("SELECT unidades, valor, costo_promedio, valor_fifo FROM valuacion WHERE producto_id = 1"
+                        ).fetchone() == (5, 300.0, 60.0, 350.0)
+    assert conn.execute("SELECT producto_id, restantes, costo_unit FROM valuacion_capas").fetchall() == [(1, 5.0, 70.0)]
+
+    # Junio: entrada sin costo (al promedio), merma y venta con total de la venta
+    conn.execute("INSERT INTO ventas (id, fecha, producto, cantidad, total) VALUES (7, '2024-06-02', 'Arroz', 4, 390)")
+    _mov(conn, "2024-06-01 09:00:00", 1, "reposicion", 5)
+    _mov(conn, "2024-06-01 10:00:00", 1, "ajuste", -1)
+    _mov(conn, "2024-06-02 10:00:00", 1, "venta", -4, precio=100, ref="venta:7")
+    assert valuation.aplicar(conn) == 3
+    assert valuation.aplicar(conn) == 0
+
+    mayo = valuation.margen(conn, "2024-05", "2024-05")
+    assert mayo["totales"] == {"ingresos": 1500.0, "costo": 900.0, "margen": 600.0, "margen_pct": 40.0,
+                               "costo_fifo": 850.0, "ajustes": 0.0}
+    junio = valuation.margen(conn, "2024-06", "2024-06")["productos"][0]
+    assert (junio["nombre"], junio["unidades"], junio["ingresos"], junio["costo"], junio["ajustes"]) == \
+        ("Arroz", 4, 390.0, 240.0, 60.0)
+    # La merma se lleva 1 de la capa de 70 y la venta las otras 4; queda la de 60
+    assert junio["costo_fifo"] == 4 * 70
+    stock = valuation.inventario(conn)
+    assert (stock["valor"], stock["valor_fifo"]) == (300.0, 300.0)
+    assert _cuadra(conn)
+
+def test_incremental_igual_a_rehacer(tmp_path):
+    conn = _base(tmp_path)
+    for dia in range(1, 21):
+        _mov(conn, f"2024-07-{dia:02d} 09:00:00", 1 + dia % 2, "reposicion", 6, costo=10 + dia)
+        _mov(conn, f"2024-07-{dia:02d} 18:00:00", 1 + dia % 2, "venta", -4, precio=40)
+        if dia % 3 == 0:
+            valuation.aplicar(conn)   # como las ventas: de a poco
+    conn.commit()
+    ruta = tmp_path / "inv.db"
+    assert valuation.run(str(ruta)) == 4   # los días 19 y 20
+    incremental = conn.execute("SELECT * FROM valuacion_mensual ORDER BY producto_id").fetchall()
+    valores = conn.execute("SELECT unidades, valor, valor_fifo FROM valuacion ORDER BY producto_id").fetchall()
+    version = conn.execute("SELECT version FROM data_versions WHERE tabla = 'valuacion'").fetchone()[0]
+    assert version > 0
+
+    assert valuation.run(str(ruta), rehacer=True, tanda=7) == 40
+    assert conn.execute("SELECT * FROM valuacion_mensual ORDER BY producto_id").fetchall() == incremental
+    assert conn.execute("SELECT unidades, valor, valor_fifo FROM valuacion ORDER BY producto_id").fetchall() == valores
+    assert _cuadra(conn)
+
+def test_apertura_con_stock_de_antes_del_kardex(tmp_path):
+    conn = _base(tmp_path)
+    # 10 unidades cargadas antes del kardex (o sin movimiento de alta)
+    conn.execute("INSERT INTO productos (id, nombre, precio_unitario, cantidad_stock) VALUES (3, 'Yerba', 20, 10)")
+    _mov(conn, "2024-08-01 10:00:00", 3, "venta", -2, precio=20)
+    _mov(conn, "2024-08-02 10:00:00", 3, "reposicion", 5, costo=1.0)
+    assert valuation.aplicar(conn) == 2
+    # Apertura de 10 al primer costo conocido (1.0): 10 - 2 + 5
+    assert conn.execute("SELECT unidades, valor, valor_fifo FROM valuacion WHERE producto_id = 3"
+                        ).fetchone() == (13, 13.0, 13.0)
+    assert _cuadra(conn)
+    conn.commit()
+
+    assert valuation.run(str(tmp_path / "inv.db"), rehacer=True) == 2
+    assert conn.execute("SELECT unidades, valor, valor_fifo FROM valuacion WHERE producto_id = 3"
+                        ).fetchone() == (13, 13.0, 13.0)
+    assert _cuadra(conn)
+
+def test_venta_sin_stock_deja_faltante_fifo(tmp_path):
+    conn = _base(tmp_path)
+    _mov(conn, "2024-09-01 10:00:00", 2, "venta", -4, precio=50)
+    assert valuation.aplicar(conn) == 1
+    assert conn.execute("SELECT restantes FROM valuacion_capas WHERE producto_id = 2").fetchall() == [(-4.0,)]
+    # La primera entrada sólo salda 2 del faltante; la segunda abre capa con lo que sobra
+    _mov(conn, "2024-09-02 10:00:00", 2, "reposicion", 2, costo=1.0)
+    assert valuation.aplicar(conn) == 1
+    _mov(conn, "2024-09-03 10:00:00", 2, "reposicion", 5, costo=2.0)
+    assert valuation.aplicar(conn) == 1
+    assert conn.execute("SELECT restantes, costo_unit FROM valuacion_capas WHERE producto_id = 2").fetchall() == \
+        [(3.0, 2.0)]
+    assert conn.execute("SELECT unidades, valor, valor_fifo FROM valuacion WHERE producto_id = 2").fetchone() == \
+        (3, 6.0, 6.0)
+    assert _cuadra(conn)
@@ -0,0 +1,57 @@
+# tests/test_wsgi_ventas.py
+import importlib
+import sqlite3
+
+import pytest
+
+@pytest.fixture
+def caja(tmp_path, monkeypatch):
+    """wsgi.py (la app de inventario.db) sobre una base temporal, con sesión iniciada."""
+    ruta = str(tmp_path / "inventario.db")
+    monkeypatch.setenv("INVENTARIO_DB", ruta)
+    wsgi = importlib.import_module("wsgi")   # la primera vez ya crea la base de INVENTARIO_DB
+    monkeypatch.setattr(wsgi, "DB_PATH", ruta)
+    wsgi.crear_base_datos()
+    conn = sqlite3.connect(ruta)
+    conn.execute("INSERT INTO productos (id, nombre, precio_unitario, cantidad_stock) VALUES (1, 'Arroz', 100, 3)")
+    conn.commit()
+    cliente = wsgi.app.test_client()
+    with cliente.session_transaction() as s:
+        s["user_id"] = 1
+    yield cliente, conn
+    conn.close()
+
+def _stock(conn):
+    return conn.execute("SELECT cantidad_stock FROM productos WHERE id = 1").fetchone()[0]
+
+def test_reenvio_con_las_ultimas_unidades_no_es_sin_stock(caja):
+    cliente, conn = caja
+    form = {"producto_id": "1", "cantidad": "3", "idem": "form-1"}
+    assert cliente.post("/registrar_venta", data=form).status_code == 302
+    assert _stock(conn) == 0
+    # El reenvío (doble clic, F5) es un duplicado: redirige igual, sin vender ni "sin stock"
+    r = cliente.post("/registrar_venta", data=form)
+    assert r.status_code == 302 and _stock(conn) == 0
+    assert conn.execute("SELECT COUNT(*) FROM ventas").fetchone()[0] == 1
+
+def test_venta_rechazada_no_gasta_la_clave(caja):
+    cliente, conn = caja
+    r = cliente.post("/registrar_venta", data={"producto_id": "1", "cantidad": "5", "idem": "form-2"})
+    assert "No hay suficiente stock" in r.get_data(as_text=True)
+    assert conn.execute("SELECT COUNT(*) FROM sync_claves").fetchone()[0] == 0
+    # Corregida la cantidad, el mismo formulario (misma clave) vende
+    assert cliente.post("/registrar_venta", data={"producto_id": "1", "cantidad": "2", "idem": "form-2"}).status_code == 302
+    assert _stock(conn) == 1
+
+def test_alta_y_edicion_pasan_por_el_kardex(caja):
+    cliente, conn = caja
+    form = {"nombre": "Yerba", "categoria": "", "precio": "20", "cantidad": "10", "proveedor": "",
+            "codigo": "Y-1", "costo_unit": "12"}
+    assert cliente.post("/agregar", data=form).status_code == 302
+    pid = conn.execute("SELECT id FROM productos WHERE nombre = 'Yerba'").fetchone()[0]
+    assert cliente.post("/registrar_venta", data={"producto_id": str(pid), "cantidad": "2"}).status_code == 302
+    assert cliente.post(f"/producto/{pid}/editar", data={**form, "cantidad": "7"}).status_code == 302
+    # Todo lo que hay en productos está valuado (Arroz: stock anterior al kardex)
+    assert conn.execute("""SELECT p.id, p.cantidad_stock, v.unidades, v.costo_promedio FROM productos p
+                           JOIN valuacion v ON v.producto_id = p.id ORDER BY p.id""").fetchall() == \
+        [(1, 3, 3, 0.0), (pid, 7, 7, 12.0)]
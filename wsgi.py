@@ -1,22 +1,58 @@
 import os
 import sqlite3, io, csv, re
 from datetime import datetime, timedelta, date
-from flask import Flask, render_template, request, redirect, url_for, Response, session, flash
+from flask import Flask, render_template, request, redirect, url_for, Response, session, flash, jsonify
 from functools import wraps
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.migrations import migrate, backfill_producto_id, MIGRACIONES_INVENTARIO
+from app.db import data_version, tune_connection, connect_readonly
+from app.templating import configure_jinja, LazyRows
+from app.assets import init_assets
+from app.http_cache import conditional
+from app.compress import Compress
+from app.admission import Admission
+from app.budget import attach, query_budget
+from app import metrics
+from app import analytics, archive, backup, forecast, maintenance, reports, report_engine, sync, valuation
+from app.events import broker, sse_response
 
 # -------------------- App & Config --------------------
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-change-me')  # cámbiala en prod
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DB_PATH  = os.path.join(BASE_DIR, 'inventario.db')
+DB_PATH  = os.environ.get('INVENTARIO_DB') or os.path.join(BASE_DIR, 'inventario.db')
+
+# Bytecode de plantillas persistente + etiqueta {% cache %} (ver app/templating.py)
+configure_jinja(app, os.path.join(os.path.dirname(DB_PATH), 'jinja_cache'))
+# Estáticos con huella servidos desde app/static (/assets/...)
+init_assets(app)
+# Compresión gzip/br de HTML, JSON y CSV
+app.wsgi_app = Compress(app.wsgi_app)
+# Control de admisión: las ventas no esperan detrás de los reportes pesados
+app.wsgi_app = Admission(app.wsgi_app)
+metrics.registrar_fuente('admision', app.wsgi_app.stats)
 
 def get_conn():
     # ¡OJO! NO LLAMAR get_conn() aquí dentro. Debe ser sqlite3.connect(DB_PATH).
     conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA foreign_keys = ON")
-    return conn
+    # WAL + busy_timeout + foreign_keys, y el presupuesto de tiempo del request
+    return attach(tune_connection(conn))
+
+def get_ro_conn():
+    # Lecturas de tableros/listas: mode=ro sobre WAL, nunca bloquea a la caja
+    return connect_readonly(DB_PATH)
+
+def get_report_conn():
+    # Reportes pesados y exportaciones: la copia de REPORT_COPY si está activa
+    return connect_readonly(DB_PATH, copia=True)
+
+def etag(*tablas):
+    """GET condicional según la versión de `tablas` (ver app/http_cache.py)."""
+    return conditional(*tablas, connect=get_ro_conn)
+
+def report_etag(*tablas):
+    """Como etag(), pero con la misma base que lee el reporte (puede ser la copia)."""
+    return conditional(*tablas, connect=get_report_conn)
 
 # -------------------- Login helpers --------------------
 def login_required(view):
@@ -27,10 +63,18 @@ def login_required(view):
         return view(*args, **kwargs)
     return wrapped
 
+# API JSON de los tableros (/api/finanzas/*, ver app/reports.py)
+app.register_blueprint(reports.api_blueprint(get_ro_conn, login_required, db_path=lambda: DB_PATH))
+
+@app.before_request
+def _contar_pedido():
+    # Tasa de pedidos: el mantenimiento espera a que baje (ver app/maintenance.py)
+    maintenance.registrar_pedido()
+
 @app.before_request
 def _require_login():
     # Endpoints permitidos sin login
-    open_endpoints = {'login', 'static'}
+    open_endpoints = {'login', 'static', 'assets.file'}
     if (request.endpoint is None) or request.endpoint.startswith('static'):
         return
     if request.endpoint in open_endpoints:
@@ -56,204 +100,61 @@ ALLOWED_TABLES = {
     'stock_movimientos': ['id','fecha','producto_id','tipo','referencia','cantidad_unidades','precio_unit','costo_unit'],
     'reposiciones': ['id','fecha','producto_id','cantidad','costo_unit','proveedor'],
     'proveedores': ['id','nombre','telefono','email'],
-    'compras': ['id','fecha','proveedor_id','total'],
+    'compras': ['id','fecha','proveedor_id','total','estado'],
     'compra_items': ['id','compra_id','producto_id','cantidad','costo_unit','subtotal'],
-    'ventas_enc': ['id','fecha','total'],
+    'ventas_enc': ['id','fecha','total','origen_venta_id'],
     'venta_items': ['id','venta_id','producto_id','modo','cantidad','unidades','precio_unit','subtotal'],
 }
 
 PREFIX_CB = "PROD"
 PAD_CB = 4
 
-# -------------------- DB bootstrap (crea todo) --------------------
+# -------------------- DB bootstrap (migraciones versionadas) --------------------
 def crear_base_datos():
-    conn = get_conn(); c = conn.cursor()
-
-    # --- Base mínima ---
-    c.execute('''CREATE TABLE IF NOT EXISTS productos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nombre TEXT NOT NULL,
-        categoria TEXT,
-        precio_unitario REAL,
-        cantidad_stock INTEGER,
-        proveedor TEXT,
-        fecha_registro TEXT,
-        codigo_barras TEXT UNIQUE
-    )''')
-    c.execute("""CREATE INDEX IF NOT EXISTS idx_productos_busqueda
-                 ON productos (nombre, categoria, codigo_barras)""")
-
-    c.execute('''CREATE TABLE IF NOT EXISTS ventas (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        fecha TEXT,
-        producto TEXT,
-        cantidad INTEGER,
-        precio_unit REAL,
-        total REAL,
-        modo TEXT
-    )''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS gastos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        fecha TEXT,
-        motivo TEXT,
-        monto REAL
-    )''')
-
-    c.execute("""CREATE TABLE IF NOT EXISTS config (
-        clave TEXT PRIMARY KEY,
-        valor TEXT
-    )""")
-
-    # --- Migraciones suaves productos ---
-    try: c.execute("ALTER TABLE productos ADD COLUMN precio_paquete REAL")
-    except sqlite3.OperationalError: pass
-    try: c.execute("ALTER TABLE productos ADD COLUMN unidades_por_paquete INTEGER")
-    except sqlite3.OperationalError: pass
-
-    # --- Migraciones suaves ventas ---
-    try: c.execute("ALTER TABLE ventas ADD COLUMN producto_id INTEGER")
-    except sqlite3.OperationalError: pass
-    try: c.execute("CREATE INDEX IF NOT EXISTS idx_ventas_producto_id ON ventas(producto_id)")
-    except sqlite3.OperationalError: pass
-
-    # --- Umbral por defecto ---
-    c.execute("""INSERT OR IGNORE INTO config (clave, valor) VALUES ('umbral_bajo_stock', '5')""")
-
-    # --- Kardex / Movimientos de stock ---
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS stock_movimientos (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      fecha TEXT NOT NULL,
-      producto_id INTEGER NOT NULL,
-      tipo TEXT NOT NULL CHECK (tipo IN ('venta','reposicion','ajuste')),
-      referencia TEXT,
-      cantidad_unidades INTEGER NOT NULL,
-      precio_unit REAL,
-      costo_unit REAL,
-      FOREIGN KEY(producto_id) REFERENCES productos(id)
-    )""")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_mov_productofecha ON stock_movimientos(producto_id, fecha)")
-
-    # --- Reposiciones (registro simple) ---
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS reposiciones (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      fecha TEXT NOT NULL,
-      producto_id INTEGER NOT NULL,
-      cantidad INTEGER NOT NULL,
-      costo_unit REAL,
-      proveedor TEXT,
-      FOREIGN KEY(producto_id) REFERENCES productos(id)
-    )""")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_repo_productofecha ON reposiciones(producto_id, fecha)")
-
-    # --- Proveedores / Compras / Detalle ---
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS proveedores (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      nombre TEXT NOT NULL,
-      telefono TEXT, email TEXT
-    )""")
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS compras (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      fecha TEXT NOT NULL,
-      proveedor_id INTEGER,
-      total REAL,
-      FOREIGN KEY(proveedor_id) REFERENCES proveedores(id)
-    )""")
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS compra_items (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      compra_id INTEGER NOT NULL,
-      producto_id INTEGER NOT NULL,
-      cantidad INTEGER NOT NULL,
-      costo_unit REAL NOT NULL,
-      subtotal REAL NOT NULL,
-      FOREIGN KEY(compra_id) REFERENCES compras(id),
-      FOREIGN KEY(producto_id) REFERENCES productos(id)
-    )""")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_compra_items_compra ON compra_items(compra_id)")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_compra_items_producto ON compra_items(producto_id)")
-
-    # --- Ventas con detalle (encabezado+items) ---
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS ventas_enc (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      fecha TEXT NOT NULL,
-      total REAL NOT NULL
-    )""")
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS venta_items (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      venta_id INTEGER NOT NULL,
-      producto_id INTEGER NOT NULL,
-      modo TEXT,
-      cantidad INTEGER NOT NULL,
-      unidades INTEGER NOT NULL,
-      precio_unit REAL NOT NULL,
-      subtotal REAL NOT NULL,
-      FOREIGN KEY(venta_id) REFERENCES ventas_enc(id),
-      FOREIGN KEY(producto_id) REFERENCES productos(id)
-    )""")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_venta_items_venta ON venta_items(venta_id)")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_venta_items_producto ON venta_items(producto_id)")
-
-    conn.commit(); conn.close()
-
-def ensure_login_tables():
-    conn = get_conn(); c = conn.cursor()
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS usuarios (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      username TEXT UNIQUE NOT NULL,
-      password_hash TEXT NOT NULL,
-      rol TEXT NOT NULL DEFAULT 'admin',
-      activo INTEGER NOT NULL DEFAULT 1,
-      creado_en TEXT NOT NULL
-    )""")
-    # Admin por defecto
-    c.execute("SELECT COUNT(*) FROM usuarios WHERE username='admin'")
-    if c.fetchone()[0] == 0:
-        pw_hash = generate_password_hash("admin123")
-        c.execute("""INSERT INTO usuarios (username, password_hash, rol, activo, creado_en)
-                     VALUES ('admin', ?, 'admin', 1, datetime('now'))""", (pw_hash,))
-    conn.commit(); conn.close()
+    """Aplica app/migrations.py; en caliente es una sola lectura de PRAGMA user_version."""
+    conn = get_conn()
+    try:
+        migrate(conn, MIGRACIONES_INVENTARIO)
+        # Fuera de la transacción de migrate(): por tandas y retomable
+        backfill_producto_id(conn)
+    finally:
+        conn.close()
 
 crear_base_datos()
-ensure_login_tables()
+# Backups en caliente si BACKUP_INTERVAL > 0 (un worker a la vez)
+backup.programar(DB_PATH)
+# ANALYZE/optimize, checkpoints y vacuum incremental en los ratos tranquilos
+maintenance.programar(DB_PATH)
+# Analítica de inventario y pronóstico de compras: al arrancar y no desde las
+# vistas, que con un 304 (ETag) ni siquiera corren
+analytics.programar(DB_PATH, 'inventario')
+forecast.programar(DB_PATH)
+# Costo de lo que quedó sin valuar (base nueva, kardex importado): en su hilo,
+# las ventas ya valúan lo suyo al guardar
+valuation.programar(DB_PATH)
 
 # -------------------- Helpers varios --------------------
 def _query_all(tabla, cols):
-    conn = get_conn(); c = conn.cursor()
-    c.execute(f"SELECT {', '.join(cols)} FROM {tabla}")
-    rows = c.fetchall()
+    conn = get_report_conn(); c = conn.cursor()
+    with archive.rango(conn, DB_PATH):   # exportación completa: todos los años
+        c.execute(f"SELECT {', '.join(cols)} FROM {tabla}")
+        rows = c.fetchall()
     conn.close()
     return rows
 
 def _query_all_filtered(tabla, cols, desde_str, hasta_str):
-    conn = get_conn(); c = conn.cursor()
-    c.execute(f"SELECT {', '.join(cols)} FROM {tabla} WHERE date(fecha) BETWEEN ? AND ? ORDER BY fecha DESC",
-              (desde_str, hasta_str))
-    rows = c.fetchall(); conn.close()
+    # Rango inclusivo sobre el índice de fecha (date(fecha) no lo puede usar)
+    hasta_sig = (datetime.strptime(hasta_str, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    conn = get_report_conn(); c = conn.cursor()
+    with archive.rango(conn, DB_PATH, desde_str, hasta_str):
+        c.execute(f"SELECT {', '.join(cols)} FROM {tabla} WHERE fecha >= ? AND fecha < ? ORDER BY fecha DESC",
+                  (desde_str, hasta_sig))
+        rows = c.fetchall()
+    conn.close()
     return rows
 
 def _rango_fechas(r, desde_arg, hasta_arg):
-    hoy = date.today()
-    if r == 'hoy':   return hoy, hoy, 'Hoy'
-    if r == 'semana':return hoy - timedelta(days=6), hoy, 'Últimos 7 días'
-    if r == 'mes':   return hoy.replace(day=1), hoy, 'Mes actual'
-    try:
-        d = datetime.strptime(desde_arg, '%Y-%m-%d').date()
-        h = datetime.strptime(hasta_arg, '%Y-%m-%d').date()
-        if d > h: d, h = h, d
-        return d, h, 'Personalizado'
-    except Exception:
-        return hoy.replace(day=1), hoy, 'Mes actual'
+    return reports.rango_fechas(r, desde_arg, hasta_arg)
 
 def get_umbral_bajo_stock():
     conn = get_conn(); c = conn.cursor()
@@ -262,6 +163,7 @@ def get_umbral_bajo_stock():
     return int(fila[0]) if fila and str(fila[0]).isdigit() else 5
 
 def set_umbral_bajo_stock(nuevo):
+    # Los triggers de config recalculan productos_bajo_stock en la misma transacción
     conn = get_conn(); c = conn.cursor()
     c.execute("INSERT OR REPLACE INTO config (clave, valor) VALUES ('umbral_bajo_stock', ?)", (str(nuevo),))
     conn.commit(); conn.close()
@@ -300,6 +202,7 @@ def login():
             flash("Usuario inactivo", "error")
             return render_template('login.html'), 403
 
+        from werkzeug.security import check_password_hash  # diferido: no pesa en el arranque
         if not check_password_hash(phash, password):
             flash("Usuario o contraseña incorrectos", "error")
             return render_template('login.html'), 401
@@ -326,53 +229,71 @@ def root_redirect():
 @app.route('/inicio')
 @login_required
 def inicio():
-    ctx = _finanzas_data('mes', '', '')
-    return render_template('inicio.html', **ctx)
+    # Esqueleto: los KPIs se piden a /api/finanzas/totales desde el navegador
+    desde_d, hasta_d, rango_label = _rango_fechas('mes', '', '')
+    return render_template('inicio.html', r='mes', desde=desde_d.isoformat(),
+                           hasta=hasta_d.isoformat(), rango_label=rango_label)
 
 # -------------------- Finanzas: datos comunes --------------------
+def _productos_para_formularios():
+    conn = get_ro_conn(); c = conn.cursor()
+    c.execute("""SELECT nombre, precio_unitario, cantidad_stock, precio_paquete, unidades_por_paquete, id
+                 FROM productos""")
+    rows = c.fetchall(); conn.close()
+    return rows
+
+def _producto_del_form(c, columnas, campo_nombre='producto'):
+    """
+    Fila de productos elegida en un formulario. Los <select> mandan
+    producto_id; por nombre sólo si llega de un formulario viejo.
+    """
+    pid = (request.form.get('producto_id') or '').strip()
+    if pid.isdigit():
+        c.execute(f"SELECT {columnas} FROM productos WHERE id = ?", (int(pid),))
+    else:
+        c.execute(f"SELECT {columnas} FROM productos WHERE nombre = ?", (request.form.get(campo_nombre, ''),))
+    return c.fetchone()
+
 def _finanzas_data(r, desde_arg, hasta_arg):
     desde_d, hasta_d, rango_label = _rango_fechas(r, desde_arg, hasta_arg)
     desde_str = desde_d.strftime('%Y-%m-%d'); hasta_str = hasta_d.strftime('%Y-%m-%d')
 
-    conn = get_conn(); c = conn.cursor()
-
-    c.execute("SELECT nombre, precio_unitario, cantidad_stock, precio_paquete, unidades_por_paquete FROM productos")
-    productos = c.fetchall()
-
-    c.execute("""SELECT fecha, producto, cantidad, precio_unit, total
-                 FROM ventas WHERE date(fecha) BETWEEN ? AND ? ORDER BY fecha DESC""",
-              (desde_str, hasta_str))
-    ventas = c.fetchall()
-
-    c.execute("""SELECT fecha, motivo, monto
-                 FROM gastos WHERE date(fecha) BETWEEN ? AND ? ORDER BY fecha DESC""",
-              (desde_str, hasta_str))
-    gastos = c.fetchall()
-
-    total_ventas = sum(v[4] for v in ventas) if ventas else 0
-    total_gastos = sum(g[2] for g in gastos) if gastos else 0
-    ganancia_neta = total_ventas - total_gastos
-
-    c.execute("""SELECT date(fecha) f, SUM(total) monto
-                 FROM ventas WHERE date(fecha) BETWEEN ? AND ?
-                 GROUP BY f ORDER BY f""", (desde_str, hasta_str))
-    ventas_por_dia = c.fetchall()
-    ventas_labels = [row[0] for row in ventas_por_dia]
-    ventas_values = [row[1] for row in ventas_por_dia]
-
-    c.execute("""SELECT producto, SUM(cantidad) cant
-                 FROM ventas WHERE date(fecha) BETWEEN ? AND ?
-                 GROUP BY producto ORDER BY cant DESC LIMIT 5""",
-              (desde_str, hasta_str))
-    top_rows = c.fetchall()
-    top_labels = [row[0] for row in top_rows]
-    top_values = [row[1] for row in top_rows]
+    conn = get_ro_conn(); c = conn.cursor()
+
+    # Los <select> de productos van en {% cache %}: sólo se consulta el catálogo
+    # si el fragmento de esta versión no está ya renderizado.
+    productos_version = data_version(conn, 'productos')
+    productos = LazyRows(_productos_para_formularios)
+
+    # fecha >= desde AND fecha < hasta+1: usa idx_ventas_fecha / idx_gastos_fecha
+    limites = (desde_str, (hasta_d + timedelta(days=1)).strftime('%Y-%m-%d'))
+    # Si el rango llega a años archivados, ventas/gastos incluyen sus archivos
+    with archive.rango(conn, DB_PATH, desde_d, hasta_d):
+        c.execute("""SELECT fecha, producto, cantidad, precio_unit, total
+                     FROM ventas WHERE fecha >= ? AND fecha < ? ORDER BY fecha DESC""", limites)
+        ventas = c.fetchall()
+
+        c.execute("""SELECT fecha, motivo, monto
+                     FROM gastos WHERE fecha >= ? AND fecha < ? ORDER BY fecha DESC""", limites)
+        gastos = c.fetchall()
+
+        if len(report_engine.particionar(desde_d, hasta_d)) > 1:
+            # Varios meses: parciales por mes en paralelo, meses cerrados cacheados
+            res = report_engine.resumen(DB_PATH, desde_d, hasta_d)
+            tot, por_dia, top = res['totales'], res['por_dia'], res['top']
+        else:
+            tot = reports.totales(conn, desde_d, hasta_d)
+            por_dia = reports.ventas_por_dia(conn, desde_d, hasta_d)
+            top = reports.top_productos(conn, desde_d, hasta_d)
+    total_ventas, total_gastos, ganancia_neta = tot['ventas'], tot['gastos'], tot['neta']
+    ventas_labels, ventas_values = por_dia['labels'], por_dia['values']
+    top_labels, top_values = top['labels'], top['values']
 
     conn.close()
 
     return {
         'r': r, 'desde': desde_str, 'hasta': hasta_str, 'rango_label': rango_label,
-        'productos': productos,
+        'productos': productos, 'productos_version': productos_version,
         'ventas': ventas, 'gastos': gastos,
         'total_ventas': total_ventas, 'total_gastos': total_gastos, 'ganancia_neta': ganancia_neta,
         'ventas_labels': ventas_labels, 'ventas_values': ventas_values,
@@ -382,27 +303,32 @@ def _finanzas_data(r, desde_arg, hasta_arg):
 # -------------------- Inventario --------------------
 @app.route('/inventario', methods=['GET'])
 @login_required
+@query_budget('interactive')
+@etag('productos', 'config')
 def inventario():
     q = request.args.get('q', '').strip()
     solo_bajo = request.args.get('solo_bajo', '0') == '1'
     umbral = get_umbral_bajo_stock()
 
-    conn = get_conn(); c = conn.cursor()
-    base_sql = "SELECT * FROM productos"
+    conn = get_ro_conn(); c = conn.cursor()
+    # productos_bajo_stock lo mantienen triggers (migración 12): "sólo bajo
+    # stock" recorre sólo esos productos y el badge es una lectura por clave
+    if solo_bajo:
+        base_sql = """SELECT p.* FROM productos_bajo_stock b
+                      JOIN productos p ON p.id = b.producto_id"""
+    else:
+        base_sql = "SELECT p.* FROM productos p"
     where, params = [], []
     if q:
-        where.append("(nombre LIKE ? OR categoria LIKE ? OR codigo_barras LIKE ?)")
+        where.append("(p.nombre LIKE ? OR p.categoria LIKE ? OR p.codigo_barras LIKE ?)")
         patron = f"%{q}%"
         params += [patron, patron, patron]
-    if solo_bajo:
-        where.append("cantidad_stock <= ?")
-        params.append(umbral)
     if where:
         base_sql += " WHERE " + " AND ".join(where)
-    base_sql += " ORDER BY id DESC"
+    base_sql += " ORDER BY p.id DESC"
     c.execute(base_sql, params)
     productos = c.fetchall()
-    c.execute("SELECT COUNT(*) FROM productos WHERE cantidad_stock <= ?", (umbral,))
+    c.execute("SELECT valor FROM contadores WHERE nombre = 'bajo_stock'")
     low_count = c.fetchone()[0]
     conn.close()
 
@@ -419,12 +345,29 @@ def finanzas_redirect():
 @app.route('/finanzas/panel')
 @login_required
 def fin_panel():
-    r = request.args.get('r', 'mes'); desde = request.args.get('desde', ''); hasta = request.args.get('hasta', '')
-    ctx = _finanzas_data(r, desde, hasta)
-    return render_template('fin_panel.html', **ctx)
+    # Esqueleto: tarjetas y gráficos se cargan en paralelo desde /api/finanzas/*
+    r = request.args.get('r', 'mes')
+    desde_d, hasta_d, rango_label = _rango_fechas(r, request.args.get('desde', ''), request.args.get('hasta', ''))
+    return render_template('fin_panel.html', r=r, desde=desde_d.isoformat(),
+                           hasta=hasta_d.isoformat(), rango_label=rango_label,
+                           stream_url=url_for('fin_stream'))
+
+@app.route('/metrics')
+@login_required
+def metrics_view():
+    # Contadores del worker: presupuestos excedidos, rechazos de admisión...
+    return metrics.snapshot()
+
+@app.route('/finanzas/stream')
+@login_required
+def fin_stream():
+    # SSE: deltas de ventas/gastos/reposiciones; no consulta la base
+    return sse_response()
 
 @app.route('/finanzas/ventas')
 @login_required
+@query_budget('interactive')
+@etag('productos', 'ventas', 'ventas_enc', 'gastos')
 def fin_ventas():
     r = request.args.get('r', 'mes'); desde = request.args.get('desde', ''); hasta = request.args.get('hasta', '')
     ctx = _finanzas_data(r, desde, hasta)
@@ -432,6 +375,8 @@ def fin_ventas():
 
 @app.route('/finanzas/gastos')
 @login_required
+@query_budget('interactive')
+@etag('productos', 'ventas', 'ventas_enc', 'gastos')
 def fin_gastos():
     r = request.args.get('r', 'mes'); desde = request.args.get('desde', ''); hasta = request.args.get('hasta', '')
     ctx = _finanzas_data(r, desde, hasta)
@@ -439,6 +384,8 @@ def fin_gastos():
 
 @app.route('/finanzas/venta/nueva')
 @login_required
+@query_budget('interactive')
+@etag('productos', 'ventas', 'ventas_enc', 'gastos')
 def fin_venta_nueva():
     r = request.args.get('r', 'mes'); desde = request.args.get('desde', ''); hasta = request.args.get('hasta', '')
     ctx = _finanzas_data(r, desde, hasta)
@@ -446,6 +393,8 @@ def fin_venta_nueva():
 
 @app.route('/finanzas/gasto/nuevo')
 @login_required
+@query_budget('interactive')
+@etag('productos', 'ventas', 'ventas_enc', 'gastos')
 def fin_gasto_nuevo():
     r = request.args.get('r', 'mes'); desde = request.args.get('desde', ''); hasta = request.args.get('hasta', '')
     ctx = _finanzas_data(r, desde, hasta)
@@ -453,6 +402,8 @@ def fin_gasto_nuevo():
 
 @app.route('/finanzas/reposicion')
 @login_required
+@query_budget('interactive')
+@etag('productos', 'ventas', 'ventas_enc', 'gastos')
 def fin_reposicion():
     r = request.args.get('r', 'mes'); desde = request.args.get('desde', ''); hasta = request.args.get('hasta', '')
     ctx = _finanzas_data(r, desde, hasta)
@@ -472,6 +423,8 @@ def agregar():
     unidades_paquete = request.form.get('unidades_por_paquete', '').strip()
     precio_paquete = float(precio_paquete) if precio_paquete else None
     unidades_paquete = int(unidades_paquete) if unidades_paquete else None
+    costo_unit = request.form.get('costo_unit', '').strip()
+    costo_unit = float(costo_unit) if costo_unit else None
     if not codigo:
         codigo = generar_siguiente_codigo()
     fecha = datetime.now().strftime('%Y-%m-%d')
@@ -481,23 +434,36 @@ def agregar():
         (nombre, categoria, precio_unitario, cantidad_stock, proveedor, fecha_registro, codigo_barras, precio_paquete, unidades_por_paquete)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
         (nombre, categoria, precio, cantidad, proveedor, fecha, codigo, precio_paquete, unidades_paquete))
+    if cantidad:
+        # Stock inicial al kardex, con su costo: si no, la valuación no lo ve
+        c.execute("""INSERT INTO stock_movimientos
+                        (fecha, producto_id, tipo, referencia, cantidad_unidades, precio_unit, costo_unit)
+                     VALUES (?, ?, 'ajuste', ?, ?, NULL, ?)""",
+                  (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), c.lastrowid, f'alta:{c.lastrowid}', cantidad, costo_unit))
+        valuation.aplicar(conn)
     conn.commit(); conn.close()
     return redirect(url_for('inventario'))
 
 @app.route('/registrar_venta', methods=['POST'])
 @login_required
 def registrar_venta():
-    producto = request.form['producto']
     modo = request.form.get('modo', 'unidad')
     cantidad = int(request.form['cantidad'])
 
     conn = get_conn(); c = conn.cursor()
-    c.execute("""SELECT id, precio_unitario, cantidad_stock, precio_paquete, unidades_por_paquete
-                 FROM productos WHERE nombre = ?""", (producto,))
-    row = c.fetchone()
+    # Clave del formulario (la pone el navegador al cargarlo): un reenvío no vende dos
+    # veces. Va antes de mirar el stock, como en sync.aplicar_lote: si el primer envío
+    # se llevó las últimas unidades, el reenvío es un duplicado y no un "sin stock".
+    # Los errores de abajo cierran sin commit, así que la clave no queda gastada.
+    idem = (request.form.get('idem') or '').strip()
+    if idem and not sync.reclamar_clave(conn, idem, 'venta'):
+        conn.rollback(); conn.close()
+        return redirect(url_for('fin_ventas'))
+
+    row = _producto_del_form(c, "id, nombre, precio_unitario, cantidad_stock, precio_paquete, unidades_por_paquete")
     if not row: conn.close(); return "❌ Error: producto no encontrado", 400
 
-    pid, precio_unitario, stock_actual, precio_paquete, unidades_por_paquete = row
+    pid, producto, precio_unitario, stock_actual, precio_paquete, unidades_por_paquete = row
 
     if modo == 'paquete':
         if not precio_paquete or not unidades_por_paquete:
@@ -511,6 +477,14 @@ def registrar_venta():
     if stock_actual < unidades_necesarias:
         conn.close(); return "❌ Error: No hay suficiente stock para esta venta"
 
+    # Descuento relativo y condicionado: con varios workers otra venta pudo
+    # llevarse unidades entre la lectura de arriba y esta escritura
+    c.execute("UPDATE productos SET cantidad_stock = cantidad_stock - ? WHERE id = ? AND cantidad_stock >= ?",
+              (unidades_necesarias, pid, unidades_necesarias))
+    if c.rowcount == 0:
+        conn.rollback(); conn.close(); return "❌ Error: No hay suficiente stock para esta venta"
+    stock_nuevo = c.execute("SELECT cantidad_stock FROM productos WHERE id = ?", (pid,)).fetchone()[0]
+
     total = round(precio_usado * cantidad, 2)
     fecha = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
@@ -519,14 +493,25 @@ def registrar_venta():
               (fecha, producto, cantidad, precio_usado, total, modo, pid))
     venta_id = c.lastrowid
 
-    c.execute("UPDATE productos SET cantidad_stock = ? WHERE id = ?", (stock_actual - unidades_necesarias, pid))
+    # Doble escritura en encabezado/detalle (ver app/sales_backfill.py)
+    c.execute("INSERT INTO ventas_enc (fecha, total, origen_venta_id) VALUES (?, ?, ?)", (fecha, total, venta_id))
+    c.execute("""INSERT INTO venta_items (venta_id, producto_id, modo, cantidad, unidades, precio_unit, subtotal)
+                 VALUES (?, ?, ?, ?, ?, ?, ?)""",
+              (c.lastrowid, pid, modo, cantidad, unidades_necesarias, precio_usado, total))
 
     c.execute("""INSERT INTO stock_movimientos
                     (fecha, producto_id, tipo, referencia, cantidad_unidades, precio_unit, costo_unit)
                  VALUES (?, ?, 'venta', ?, ?, ?, NULL)""",
               (fecha, pid, f'venta:{venta_id}', -unidades_necesarias, precio_usado))
+    valuation.aplicar(conn)
 
     conn.commit(); conn.close()
+
+    # Deltas para los tableros abiertos (SSE)
+    broker.publish('venta', {'fecha': fecha, 'producto': producto, 'cantidad': cantidad, 'total': total})
+    umbral = get_umbral_bajo_stock()
+    if stock_nuevo <= umbral:
+        broker.publish('stock_bajo', {'producto': producto, 'stock': stock_nuevo, 'umbral': umbral})
     return redirect(url_for('fin_ventas'))
 
 @app.route('/registrar_gasto', methods=['POST'])
@@ -539,12 +524,12 @@ def registrar_gasto():
     conn = get_conn(); c = conn.cursor()
     c.execute("INSERT INTO gastos (fecha, motivo, monto) VALUES (?, ?, ?)", (fecha, motivo, monto))
     conn.commit(); conn.close()
+    broker.publish('gasto', {'fecha': fecha, 'motivo': motivo, 'monto': monto})
     return redirect(url_for('fin_gastos'))
 
 @app.route('/reposicion', methods=['POST'])
 @login_required
 def reposicion():
-    producto = request.form['producto_repos']
     cantidad = int(request.form['cantidad_repos'])
 
     costo_unit_str = request.form.get('costo_unit', '').strip()
@@ -554,10 +539,9 @@ def reposicion():
     fecha = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
     conn = get_conn(); c = conn.cursor()
-    c.execute("SELECT id FROM productos WHERE nombre = ?", (producto,))
-    row = c.fetchone()
+    row = _producto_del_form(c, "id, nombre", campo_nombre='producto_repos')
     if not row: conn.close(); return "❌ Error: producto no encontrado", 400
-    pid = row[0]
+    pid, producto = row
 
     c.execute("UPDATE productos SET cantidad_stock = cantidad_stock + ? WHERE id = ?", (cantidad, pid))
 
@@ -569,16 +553,54 @@ def reposicion():
                     (fecha, producto_id, tipo, referencia, cantidad_unidades, precio_unit, costo_unit)
                  VALUES (?, ?, 'reposicion', ?, ?, NULL, ?)""",
               (fecha, pid, f'repo:{repo_id}', cantidad, costo_unit))
+    valuation.aplicar(conn)
 
     conn.commit(); conn.close()
+    broker.publish('reposicion', {'fecha': fecha, 'producto': producto, 'cantidad': cantidad})
     return redirect(url_for('fin_reposicion'))
 
+# -------------------- Sincronización de cajas sin red --------------------
+@app.route('/api/sync', methods=['POST'])
+@login_required
+def api_sync():
+    """Lote de ventas/gastos/reposiciones encoladas en una terminal (ver app/sync.py)."""
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict):
+        return jsonify({'error': 'se esperaba un objeto JSON'}), 400
+    conn = get_conn()
+    try:
+        resultados = sync.aplicar_lote(conn, datos.get('operaciones'), datos.get('terminal'))
+        aplicadas = conn.execute("""SELECT l.tipo, l.fecha, l.producto, l.cantidad, l.total, l.motivo,
+                                           p.cantidad_stock
+                                    FROM sync_lote l LEFT JOIN productos p ON p.id = l.producto_id
+                                    ORDER BY l.n""").fetchall()
+    except sync.LoteInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        conn.close()
+
+    # Deltas para los tableros abiertos (SSE), como los formularios
+    umbral = get_umbral_bajo_stock()
+    bajos = {}
+    for tipo, fecha, producto, cantidad, total, motivo, stock in aplicadas:
+        if tipo == 'venta':
+            broker.publish('venta', {'fecha': fecha, 'producto': producto, 'cantidad': cantidad, 'total': total})
+            if stock is not None and stock <= umbral:
+                bajos[producto] = stock
+        elif tipo == 'gasto':
+            broker.publish('gasto', {'fecha': fecha, 'motivo': motivo, 'monto': total})
+        else:
+            broker.publish('reposicion', {'fecha': fecha, 'producto': producto, 'cantidad': cantidad})
+    for producto, stock in bajos.items():
+        broker.publish('stock_bajo', {'producto': producto, 'stock': stock, 'umbral': umbral})
+    return jsonify({'resultados': resultados})
+
 # -------------------- Compras (simple 1 ítem) --------------------
 @app.route('/compras/nueva', methods=['GET', 'POST'])
 @login_required
+@etag('productos')
 def compras_nueva():
     if request.method == 'POST':
-        producto_nombre = request.form['producto']
         cantidad = int(request.form['cantidad'])
         costo_unit = float(request.form['costo_unit'])
         proveedor_txt = request.form.get('proveedor', '').strip() or None
@@ -596,8 +618,7 @@ def compras_nueva():
                 c.execute("INSERT INTO proveedores (nombre) VALUES (?)", (proveedor_txt,))
                 proveedor_id = c.lastrowid
 
-        c.execute("SELECT id FROM productos WHERE nombre = ?", (producto_nombre,))
-        prod = c.fetchone()
+        prod = _producto_del_form(c, "id")
         if not prod: conn.close(); return "❌ Producto no encontrado", 400
         producto_id = prod[0]
 
@@ -615,19 +636,93 @@ def compras_nueva():
                         (fecha, producto_id, tipo, referencia, cantidad_unidades, precio_unit, costo_unit)
                      VALUES (?, ?, 'reposicion', ?, ?, NULL, ?)""",
                   (fecha, producto_id, f'compra:{compra_id}', cantidad, costo_unit))
+        valuation.aplicar(conn)
 
         conn.commit(); conn.close()
         return redirect(url_for('fin_reposicion'))
 
-    conn = get_conn(); c = conn.cursor()
-    c.execute("SELECT nombre FROM productos ORDER BY nombre ASC")
-    productos = [r[0] for r in c.fetchall()]
+    conn = get_conn()
+    productos_version = data_version(conn, 'productos')
     conn.close()
-    return render_template('compras_form.html', productos=productos)
+
+    def _nombres():
+        conn = get_conn(); c = conn.cursor()
+        c.execute("SELECT id, nombre FROM productos ORDER BY nombre ASC")
+        nombres = c.fetchall()
+        conn.close()
+        return nombres
+
+    return render_template('compras_form.html', productos=LazyRows(_nombres),
+                           productos_version=productos_version)
+
+# -------------------- Compras sugeridas (ver app/forecast.py) --------------------
+@app.route('/compras/sugeridas')
+@login_required
+@query_budget('interactive')
+@etag('compras', 'compra_items', 'productos')
+def compras_sugeridas():
+    conn = connect_readonly(DB_PATH, row_factory=sqlite3.Row); c = conn.cursor()
+    c.execute("""SELECT c.id, c.fecha, c.total, COALESCE(pr.nombre, 'Sin proveedor') AS proveedor
+                 FROM compras c LEFT JOIN proveedores pr ON pr.id = c.proveedor_id
+                 WHERE c.estado = 'borrador' ORDER BY proveedor""")
+    compras = c.fetchall()
+    c.execute("""SELECT i.compra_id, p.nombre, p.cantidad_stock, i.cantidad, i.costo_unit, i.subtotal,
+                        f.nivel, f.punto_pedido
+                 FROM compra_items i
+                 JOIN compras c ON c.id = i.compra_id AND c.estado = 'borrador'
+                 JOIN productos p ON p.id = i.producto_id
+                 LEFT JOIN pronosticos f ON f.producto_id = i.producto_id
+                 ORDER BY p.nombre""")
+    items = {}
+    for row in c.fetchall():
+        items.setdefault(row['compra_id'], []).append(row)
+    conn.close()
+    return render_template('compras_sugeridas.html', compras=compras, items=items)
+
+@app.route('/compras/sugeridas/recalcular', methods=['POST'])
+@login_required
+def compras_sugeridas_recalcular():
+    forecast.run(DB_PATH, forzar=request.form.get('todo') == '1')
+    return redirect(url_for('compras_sugeridas'))
+
+@app.route('/compras/<int:compra_id>/confirmar', methods=['POST'])
+@login_required
+def compra_confirmar(compra_id):
+    """Un borrador pasa a compra real: entra el stock y queda en el kardex."""
+    fecha = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    conn = get_conn(); c = conn.cursor()
+    c.execute("UPDATE compras SET estado = 'confirmada', fecha = ? WHERE id = ? AND estado = 'borrador'",
+              (fecha, compra_id))
+    if c.rowcount == 0:
+        conn.close(); return "❌ Compra no encontrada o ya confirmada", 404
+    c.execute("""UPDATE productos SET cantidad_stock = cantidad_stock + (
+                   SELECT SUM(i.cantidad) FROM compra_items i
+                   WHERE i.compra_id = ? AND i.producto_id = productos.id)
+                 WHERE id IN (SELECT producto_id FROM compra_items WHERE compra_id = ?)""",
+              (compra_id, compra_id))
+    c.execute("""INSERT INTO stock_movimientos
+                    (fecha, producto_id, tipo, referencia, cantidad_unidades, precio_unit, costo_unit)
+                 SELECT ?, producto_id, 'reposicion', ?, cantidad, NULL, costo_unit
+                 FROM compra_items WHERE compra_id = ?""",
+              (fecha, f'compra:{compra_id}', compra_id))
+    valuation.aplicar(conn)
+    conn.commit(); conn.close()
+    return redirect(url_for('compras_sugeridas'))
+
+@app.route('/compras/<int:compra_id>/descartar', methods=['POST'])
+@login_required
+def compra_descartar(compra_id):
+    conn = get_conn(); c = conn.cursor()
+    c.execute("""DELETE FROM compra_items WHERE compra_id IN
+                 (SELECT id FROM compras WHERE id = ? AND estado = 'borrador')""", (compra_id,))
+    c.execute("DELETE FROM compras WHERE id = ? AND estado = 'borrador'", (compra_id,))
+    conn.commit(); conn.close()
+    return redirect(url_for('compras_sugeridas'))
 
 # -------------------- Admin --------------------
 @app.route('/admin')
 @login_required
+@etag(*ALLOWED_TABLES)
 def admin():
     tablas = list(ALLOWED_TABLES.keys())
     tabla = request.args.get('tabla', 'productos').lower()
@@ -638,7 +733,7 @@ def admin():
     except: page = 1
     page_size = 20; offset = (page - 1) * page_size
     cols = ALLOWED_TABLES[tabla]
-    conn = get_conn(); c = conn.cursor()
+    conn = get_ro_conn(); c = conn.cursor()
     c.execute(f"SELECT COUNT(*) FROM {tabla}"); total = c.fetchone()[0]
     order_by = "id DESC" if "id" in cols else f"{cols[0]} ASC"
     c.execute(f"SELECT {', '.join(cols)} FROM {tabla} ORDER BY {order_by} LIMIT ? OFFSET ?", (page_size, offset))
@@ -650,6 +745,8 @@ def admin():
 # -------------------- Export CSV --------------------
 @app.route('/export/<tabla>.csv')
 @login_required
+@query_budget('heavy')
+@report_etag(lambda tabla: [tabla.lower()] if tabla.lower() in ALLOWED_TABLES else [])
 def export_csv(tabla):
     tabla = tabla.lower()
     if tabla not in ALLOWED_TABLES:
@@ -664,13 +761,15 @@ def export_csv(tabla):
 
 @app.route('/export/ventas_filtrado.csv')
 @login_required
+@query_budget('heavy')
+@report_etag('ventas')
 def export_ventas_filtrado():
     r = request.args.get('r', 'mes'); desde = request.args.get('desde', ''); hasta = request.args.get('hasta', '')
-    ctx = _finanzas_data(r, desde, hasta)
+    desde_d, hasta_d, _ = _rango_fechas(r, desde, hasta)
     cols = ALLOWED_TABLES['ventas']
     si = io.StringIO(); writer = csv.writer(si)
     writer.writerow(cols)
-    for row in _query_all_filtered('ventas', cols, ctx['desde'], ctx['hasta']):
+    for row in _query_all_filtered('ventas', cols, desde_d.isoformat(), hasta_d.isoformat()):
         writer.writerow(row)
     output = si.getvalue(); si.close()
     return Response(output, mimetype='text/csv',
@@ -678,13 +777,15 @@ def export_ventas_filtrado():
 
 @app.route('/export/gastos_filtrado.csv')
 @login_required
+@query_budget('heavy')
+@report_etag('gastos')
 def export_gastos_filtrado():
     r = request.args.get('r', 'mes'); desde = request.args.get('desde', ''); hasta = request.args.get('hasta', '')
-    ctx = _finanzas_data(r, desde, hasta)
+    desde_d, hasta_d, _ = _rango_fechas(r, desde, hasta)
     cols = ALLOWED_TABLES['gastos']
     si = io.StringIO(); writer = csv.writer(si)
     writer.writerow(cols)
-    for row in _query_all_filtered('gastos', cols, ctx['desde'], ctx['hasta']):
+    for row in _query_all_filtered('gastos', cols, desde_d.isoformat(), hasta_d.isoformat()):
         writer.writerow(row)
     output = si.getvalue(); si.close()
     return Response(output, mimetype='text/csv',
@@ -693,6 +794,7 @@ def export_gastos_filtrado():
 # -------------------- Editar / Eliminar producto --------------------
 @app.route('/producto/<int:pid>/editar', methods=['GET','POST'])
 @login_required
+@etag('productos')
 def editar_producto(pid):
     conn = get_conn(); c = conn.cursor()
     if request.method == 'POST':
@@ -702,9 +804,16 @@ def editar_producto(pid):
         proveedor = request.form['proveedor'].strip()
         codigo = request.form['codigo'].strip()
         try:
+            # La diferencia de stock va al kardex como ajuste (al costo promedio)
+            c.execute("""INSERT INTO stock_movimientos
+                            (fecha, producto_id, tipo, referencia, cantidad_unidades, precio_unit, costo_unit)
+                         SELECT ?, id, 'ajuste', ?, ? - cantidad_stock, NULL, NULL
+                         FROM productos WHERE id = ? AND cantidad_stock != ?""",
+                      (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), f'edicion:{pid}', cantidad, pid, cantidad))
             c.execute("""UPDATE productos
                          SET nombre=?, categoria=?, precio_unitario=?, cantidad_stock=?, proveedor=?, codigo_barras=?
                          WHERE id=?""", (nombre, categoria, precio, cantidad, proveedor, codigo, pid))
+            valuation.aplicar(conn)
             conn.commit()
         finally:
             conn.close()
@@ -745,9 +854,10 @@ def actualizar_umbral():
 # -------------------- Ventas detalle (test 1 ítem) --------------------
 @app.route('/ventas/detalle/test', methods=['GET'])
 @login_required
+@etag('productos')
 def venta_detalle_test():
     conn = get_conn(); c = conn.cursor()
-    c.execute("SELECT nombre, precio_unitario, precio_paquete, unidades_por_paquete FROM productos ORDER BY nombre")
+    c.execute("SELECT nombre, precio_unitario, precio_paquete, unidades_por_paquete, id FROM productos ORDER BY nombre")
     productos = c.fetchall()
     conn.close()
     return render_template('ventas_detalle_test.html', productos=productos)
@@ -755,15 +865,12 @@ def venta_detalle_test():
 @app.route('/ventas/detalle/nueva', methods=['POST'])
 @login_required
 def venta_detalle_nueva():
-    producto = request.form['producto']
     modo = request.form.get('modo', 'unidad')
     cantidad = int(request.form['cantidad'])
     precio_unit = float(request.form['precio_unit'])
 
     conn = get_conn(); c = conn.cursor()
-    c.execute("""SELECT id, cantidad_stock, precio_paquete, unidades_por_paquete, precio_unitario
-                 FROM productos WHERE nombre=?""", (producto,))
-    row = c.fetchone()
+    row = _producto_del_form(c, "id, cantidad_stock, precio_paquete, unidades_por_paquete, precio_unitario")
     if not row: conn.close(); return "Producto no encontrado", 400
     pid, stock, precio_pack, u_pack, precio_unid = row
 
@@ -776,6 +883,11 @@ def venta_detalle_nueva():
 
     if stock < unidades:
         conn.close(); return "Stock insuficiente", 400
+    # Condicionado, como en registrar_venta: otra caja pudo vender entre medio
+    c.execute("UPDATE productos SET cantidad_stock = cantidad_stock - ? WHERE id = ? AND cantidad_stock >= ?",
+              (unidades, pid, unidades))
+    if c.rowcount == 0:
+        conn.rollback(); conn.close(); return "Stock insuficiente", 400
 
     subtotal = round(precio_unit * cantidad, 2)
     fecha = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -788,12 +900,11 @@ def venta_detalle_nueva():
                  VALUES (?, ?, ?, ?, ?, ?, ?)""",
               (venta_id, pid, modo, cantidad, unidades, precio_unit, subtotal))
 
-    c.execute("UPDATE productos SET cantidad_stock = cantidad_stock - ? WHERE id = ?", (unidades, pid))
-
     c.execute("""INSERT INTO stock_movimientos
                  (fecha, producto_id, tipo, referencia, cantidad_unidades, precio_unit, costo_unit)
                  VALUES (?, ?, 'venta', ?, ?, ?, NULL)""",
               (fecha, pid, f'venta_enc:{venta_id}', -unidades, precio_unit))
+    valuation.aplicar(conn)
 
     conn.commit(); conn.close()
     return "OK"
@@ -801,6 +912,8 @@ def venta_detalle_nueva():
 # -------------------- Reporte de Reposiciones --------------------
 @app.route('/reportes/reposiciones')
 @login_required
+@query_budget('heavy')
+@report_etag('stock_movimientos', 'productos')
 def reportes_reposiciones():
     r = request.args.get('r', 'mes')
     desde = request.args.get('desde', '')
@@ -811,7 +924,7 @@ def reportes_reposiciones():
     desde_d, hasta_d, rango_label = _rango_fechas(r, desde, hasta)
     desde_str = desde_d.strftime('%Y-%m-%d'); hasta_str = hasta_d.strftime('%Y-%m-%d')
 
-    conn = get_conn(); c = conn.cursor()
+    conn = get_report_conn(); c = conn.cursor()
 
     c.execute("SELECT id, nombre FROM productos ORDER BY nombre")
     productos = c.fetchall()
@@ -822,9 +935,9 @@ def reportes_reposiciones():
       FROM stock_movimientos m
       JOIN productos p ON p.id = m.producto_id
       WHERE m.tipo = 'reposicion'
-        AND date(m.fecha) BETWEEN ? AND ?
+        AND m.fecha >= ? AND m.fecha < ?
     """
-    params = [desde_str, hasta_str]
+    params = [desde_str, (hasta_d + timedelta(days=1)).strftime('%Y-%m-%d')]
 
     if producto_id:
         base += " AND m.producto_id = ?"
@@ -837,8 +950,10 @@ def reportes_reposiciones():
 
     base += " ORDER BY m.fecha DESC"
 
-    c.execute(base, params)
-    rows = c.fetchall(); conn.close()
+    with archive.rango(conn, DB_PATH, desde_d, hasta_d):
+        c.execute(base, params)
+        rows = c.fetchall()
+    conn.close()
 
     total_unidades = sum(rw[4] for rw in rows) if rows else 0
     total_valor = sum((rw[4] * (rw[5] or 0)) for rw in rows) if rows else 0.0
@@ -849,8 +964,47 @@ def reportes_reposiciones():
                            origen=origen, rows=rows,
                            total_unidades=total_unidades, total_valor=round(total_valor, 2))
 
+# -------------------- Margen y valuación del stock --------------------
+@app.route('/reportes/margen')
+@login_required
+@query_budget('heavy')
+@report_etag('valuacion')
+def reportes_margen():
+    # Lee lo materializado por app/valuation.py: no recorre el kardex
+    r = request.args.get('r', 'mes')
+    desde_d, hasta_d, rango_label = _rango_fechas(r, request.args.get('desde', ''), request.args.get('hasta', ''))
+    desde_mes, hasta_mes = desde_d.strftime('%Y-%m'), hasta_d.strftime('%Y-%m')
+    conn = get_report_conn()
+    margen = valuation.margen(conn, desde_mes, hasta_mes)
+    stock = valuation.inventario(conn)
+    conn.close()
+    if request.args.get('formato') == 'json':
+        return jsonify({'desde': desde_mes, 'hasta': hasta_mes, **margen,
+                        'stock': {'valor': stock['valor'], 'valor_fifo': stock['valor_fifo']}})
+    return render_template('reportes_margen.html', r=r, rango_label=rango_label,
+                           desde=desde_mes, hasta=hasta_mes, margen=margen, stock=stock)
+
+# -------------------- Análisis de inventario (ABC, rotación, cobertura) --------------------
+@app.route('/reportes/inventario')
+@login_required
+@query_budget('heavy')
+@report_etag('analitica_inventario')
+def reportes_inventario():
+    # El cálculo (pandas) corre en su hilo periódico (ver crear_base_datos); acá sólo se lee el resultado
+    clase = request.args.get('clase', '').strip().upper()
+    solo_muertos = request.args.get('muertos') == '1'
+    conn = connect_readonly(DB_PATH, row_factory=sqlite3.Row, copia=True)
+    resumen = analytics.resumen_clases(conn)
+    rows = analytics.filas(conn, clase, solo_muertos)
+    conn.close()
+    return render_template('reportes_inventario.html',
+                           resumen=resumen, rows=rows, clase=clase, solo_muertos=solo_muertos,
+                           dias=analytics.dias_ventana())
+
 @app.route('/export/reposiciones_filtrado.csv')
 @login_required
+@query_budget('heavy')
+@report_etag('stock_movimientos', 'productos')
 def export_reposiciones_filtrado():
     r = request.args.get('r', 'mes')
     desde = request.args.get('desde', '')
@@ -861,16 +1015,16 @@ def export_reposiciones_filtrado():
     desde_d, hasta_d, _ = _rango_fechas(r, desde, hasta)
     desde_str = desde_d.strftime('%Y-%m-%d'); hasta_str = hasta_d.strftime('%Y-%m-%d')
 
-    conn = get_conn(); c = conn.cursor()
+    conn = get_report_conn(); c = conn.cursor()
     base = """
       SELECT m.fecha, p.nombre, p.codigo_barras, p.categoria,
              m.cantidad_unidades, m.costo_unit, m.referencia
       FROM stock_movimientos m
       JOIN productos p ON p.id = m.producto_id
       WHERE m.tipo = 'reposicion'
-        AND date(m.fecha) BETWEEN ? AND ?
+        AND m.fecha >= ? AND m.fecha < ?
     """
-    params = [desde_str, hasta_str]
+    params = [desde_str, (hasta_d + timedelta(days=1)).strftime('%Y-%m-%d')]
 
     if producto_id:
         base += " AND m.producto_id = ?"
@@ -883,8 +1037,10 @@ def export_reposiciones_filtrado():
 
     base += " ORDER BY m.fecha DESC"
 
-    c.execute(base, params)
-    rows = c.fetchall(); conn.close()
+    with archive.rango(conn, DB_PATH, desde_d, hasta_d):
+        c.execute(base, params)
+        rows = c.fetchall()
+    conn.close()
 
     si = io.StringIO(); writer = csv.writer(si)
     writer.writerow(['fecha', 'producto', 'codigo_barras', 'categoria',